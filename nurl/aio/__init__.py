@@ -0,0 +1,20 @@
+"""Modo de execução baseado em `asyncio`.
+
+Neste modo, cada processo multiplexa milhares de requisições simultâneas em
+um único *event loop*, de maneira que verificações de conectividade lentas
+não ocupam as threads do servidor. Os módulos deste pacote espelham os do
+pacote :mod:`nurl`:
+
+* :mod:`nurl.aio.datastores` -- :class:`AsyncDataStore` e implementações;
+* :mod:`nurl.aio.trackers` -- :class:`AsyncTracker` e implementações;
+* :mod:`nurl.aio.pingers` -- verificações de conectividade assíncronas;
+* :mod:`nurl.aio.shortener` -- :class:`AsyncNurl`;
+* :mod:`nurl.aio.app` -- aplicação ASGI com as mesmas rotas de
+  :mod:`nurl.webapp`.
+
+A aplicação utiliza as mesmas configurações do arquivo .ini e das variáveis
+de ambiente, e pode ser servida por qualquer servidor ASGI, p.ex.::
+
+    $ pip install nurl[asyncio]
+    $ NURL_CONFIG=production.ini uvicorn --factory nurl.aio.app:create_app
+"""
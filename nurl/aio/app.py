@@ -0,0 +1,598 @@
+"""Aplicação ASGI que expõe as mesmas rotas de :mod:`nurl.webapp`, servidas
+por uma instância de :class:`nurl.aio.shortener.AsyncNurl` configurada de
+acordo com os parâmetros ``nurl.*`` do arquivo .ini e das variáveis de
+ambiente.
+
+Com o *backend* ``mongodb``, os dados são acessados por meio do `motor`.
+Com o *backend* ``sqlite``, as implementações síncronas, incluindo as
+camadas de instantâneo, de filtro de Bloom e de cache, são executadas em um
+*pool* de threads.
+"""
+import os
+import json
+import asyncio
+import mimetypes
+import urllib.parse
+import logging
+import types
+import time
+from datetime import datetime
+
+from chameleon import PageTemplateFile
+from pyramid.renderers import JSONP_VALID_CALLBACK
+from pyramid.settings import asbool
+
+from .. import (
+        datastores as sync_datastores,
+        trackers as sync_trackers,
+        pingers as sync_pingers,
+        idgenerators,
+        metrics,
+        mongodb,
+        precompression,
+        sqlite,
+        snapshot,
+        whitelists,
+        pyramid_nurl,
+        )
+from ..shortener import URLError, NotExists
+from ..trackers import Access
+from . import datastores, trackers, pingers, shortener
+
+
+__all__ = ['Application', 'build_nurl', 'create_app']
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+WEBAPP_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'webapp')
+STATIC_DIR = os.path.join(WEBAPP_DIR, 'static')
+STATIC_PREFIX = '/static/'
+STATIC_CACHE_MAX_AGE = 3600
+# em produção, o bundle é gerado previamente por `webassets`.
+CSS_PATHS = ['/static/bundle.min.css']
+# tamanho máximo, em bytes, do corpo das requisições.
+MAX_BODY_SIZE = 4 * 1024 * 1024
+# caracteres mantidos ao codificar a URL de destino no cabeçalho `Location`.
+LOCATION_SAFE_CHARS = "!#$%&'()*+,-./:;=?@[]_~"
+
+REASONS = {200: 'OK', 301: 'Moved Permanently', 302: 'Found',
+           400: 'Bad Request',
+           404: 'Not Found', 413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, detail=None):
+        super().__init__(status, detail)
+        self.status = status
+        self.detail = detail
+
+
+class Request:
+    """Requisição HTTP, construída a partir do `scope` ASGI.
+    """
+    def __init__(self, scope, body=b''):
+        self.scope = scope
+        self.method = scope['method']
+        self.path = scope['path']
+        self.body = body
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                        for name, value in scope.get('headers', [])}
+        self.GET = urllib.parse.parse_qs(
+                scope.get('query_string', b'').decode('utf-8', 'replace'),
+                keep_blank_values=True)
+
+        self.params = dict(self.GET)
+        content_type = self.headers.get('content-type', '')
+        if content_type.startswith('application/x-www-form-urlencoded'):
+            for name, values in urllib.parse.parse_qs(
+                    body.decode('utf-8', 'replace'),
+                    keep_blank_values=True).items():
+                self.params.setdefault(name, []).extend(values)
+
+    def param(self, name, default=None):
+        values = self.params.get(name)
+        return values[0] if values else default
+
+    @property
+    def referrer(self):
+        return self.headers.get('referer')
+
+    @property
+    def json_body(self):
+        return json.loads(self.body.decode('utf-8'))
+
+    @property
+    def application_url(self):
+        host = self.headers.get('host')
+        if host is None:
+            server = self.scope.get('server') or ('localhost', None)
+            host = server[0] if server[1] is None else '%s:%s' % server
+        return '%s://%s%s' % (self.scope.get('scheme', 'http'), host,
+                              self.scope.get('root_path', ''))
+
+    def short_url(self, short_ref):
+        return '%s/%s' % (self.application_url, short_ref)
+
+
+class TemplateRequest:
+    """Subconjunto da interface de `pyramid.request.Request` utilizado pelo
+    template ``home.pt``.
+    """
+    def __init__(self, settings):
+        self.registry = types.SimpleNamespace(settings=settings)
+
+    def static_path(self, spec):
+        return STATIC_PREFIX + spec.split(':static/', 1)[1]
+
+
+class Response:
+    def __init__(self, status=200, body=b'',
+            content_type='text/plain; charset=UTF-8', headers=None):
+        self.status = status
+        self.body = body
+        self.headers = [('content-type', content_type)]
+        self.headers.extend(headers or [])
+
+    async def send(self, send, method):
+        headers = [(name.encode('latin-1'), value.encode('latin-1'))
+                   for name, value in self.headers]
+        headers.append((b'content-length', str(len(self.body)).encode()))
+        await send({'type': 'http.response.start', 'status': self.status,
+                    'headers': headers})
+        await send({'type': 'http.response.body',
+                    'body': b'' if method == 'HEAD' else self.body})
+
+
+def error_response(status, detail=None):
+    body = '%s %s' % (status, REASONS.get(status, ''))
+    if detail:
+        body += '\n\n%s' % detail
+    return Response(status, body.encode('utf-8'))
+
+
+def json_response(request, value, jsonp=False):
+    body = json.dumps(value)
+    content_type = 'application/json; charset=UTF-8'
+    if jsonp:
+        callback = request.GET.get('callback')
+        if callback is not None:
+            callback = callback[0]
+            if not JSONP_VALID_CALLBACK.match(callback):
+                raise HTTPError(400, 'Invalid JSONP callback function name.')
+            content_type = 'application/javascript; charset=UTF-8'
+            body = '/**/%s(%s);' % (callback, body)
+    return Response(200, body.encode('utf-8'), content_type)
+
+
+class Application:
+    """Aplicação ASGI do encurtador.
+
+    A instância de :class:`nurl.aio.shortener.AsyncNurl` é construída por
+    :func:`build_nurl` no evento ``lifespan.startup`` ou, caso o servidor
+    não o suporte, na primeira requisição, de maneira que os clientes das
+    bases de dados são associados ao *event loop* do processo.
+
+    :param settings: configurações produzidas por
+                     :func:`nurl.pyramid_nurl.parse_settings`.
+    :param nurl: (opcional) instância de
+                 :class:`nurl.aio.shortener.AsyncNurl` já construída.
+    """
+    def __init__(self, settings, nurl=None):
+        self.settings = settings
+        self.nurl = nurl
+        self.startup_lock = None
+        self.template = PageTemplateFile(
+                os.path.join(WEBAPP_DIR, 'templates', 'home.pt'))
+        self.instrumentation = pyramid_nurl.get_instrumentation(settings)
+        self.redirect_status = settings['nurl.redirect.status']
+        self.redirect_headers = [('cache-control',
+                pyramid_nurl.get_redirect_cache_control(settings))]
+        self.static_encodings = precompression.parse_encodings(
+                settings['nurl.static.encodings'])
+        # os nomes das rotas são os mesmos de `nurl.webapp`.
+        self.routes = {
+                '/': ('home', None, self.home),
+                '/api/v1/shorten': ('shortener_v1', None, self.url_shortener),
+                '/api/v1/shorten/batch': ('batch_shortener_v1', ('POST',),
+                                          self.batch_url_shortener),
+                '/api/v1/resolve': ('resolver_v1', ('GET', 'POST'),
+                                    self.batch_short_ref_resolver),
+                '/api/v1/stats': ('stats_v1', None, self.stats),
+                '/api/v1/metrics': ('metrics_v1', None, self.metrics),
+                }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self.handle(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as exc:
+                    LOGGER.exception('could not start the application')
+                    await send({'type': 'lifespan.startup.failed',
+                                'message': str(exc)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def startup(self):
+        if self.nurl is not None:
+            return
+        if self.startup_lock is None:
+            self.startup_lock = asyncio.Lock()
+        async with self.startup_lock:
+            if self.nurl is None:
+                self.nurl = await build_nurl(self.settings)
+
+    async def shutdown(self):
+        if self.nurl is not None:
+            await self.nurl.close()
+
+    async def handle(self, scope, receive, send):
+        await self.startup()
+        start = time.perf_counter()
+        route_name, view = self.match(scope['method'], scope['path'])
+        try:
+            body = await self.read_body(receive)
+            response = await view(Request(scope, body))
+        except HTTPError as exc:
+            response = error_response(exc.status, exc.detail)
+        except Exception:
+            LOGGER.exception('could not handle the request to "%s"',
+                    scope.get('path'))
+            response = error_response(500)
+        await response.send(send, scope['method'])
+
+        if self.instrumentation is not None:
+            self.instrumentation.observe_request(route_name, response.status,
+                    time.perf_counter() - start)
+
+    async def read_body(self, receive):
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_BODY_SIZE:
+                raise HTTPError(413)
+            chunks.append(chunk)
+            if not message.get('more_body', False):
+                break
+        return b''.join(chunks)
+
+    def match(self, method, path):
+        """Obtém o nome da rota e a view correspondentes à requisição.
+        """
+        route = self.routes.get(path)
+        if route is not None:
+            name, methods, view = route
+            if methods is None or method in methods:
+                return name, view
+        elif path.startswith(STATIC_PREFIX):
+            return '__static/', self.static
+        elif path.count('/') == 1 and len(path) > 1:
+            return 'shortened', self.short_ref_resolver
+        return 'notfound', self.not_found
+
+    async def not_found(self, request):
+        raise HTTPError(404)
+
+    async def home(self, request):
+        values = {'project': 'nurl', 'css_paths': CSS_PATHS,
+                  'request': TemplateRequest(self.settings)}
+
+        if request.param('url') is not None:
+            try:
+                values['short_url'] = await self.shorten(request)
+            except HTTPError:
+                values['errors'] = [('Invalid URL',
+                    "Maybe this hostname is not allowed or you've typed "
+                    "something wrong.")]
+
+        body = self.template(**values)
+        return Response(200, body.encode('utf-8'), 'text/html; charset=UTF-8')
+
+    async def shorten(self, request):
+        incoming_url = request.param('url')
+        if not incoming_url:
+            raise HTTPError(400)
+
+        try:
+            short_ref = await self.nurl.shorten(incoming_url)
+        except URLError:
+            raise HTTPError(400) from None
+
+        return request.short_url(short_ref)
+
+    async def url_shortener(self, request):
+        return json_response(request, await self.shorten(request),
+                jsonp=True)
+
+    async def batch_url_shortener(self, request):
+        try:
+            payload = request.json_body
+        except ValueError:
+            raise HTTPError(400, 'invalid JSON payload') from None
+
+        incoming_urls = payload.get('urls') if isinstance(payload, dict) \
+                else None
+        if not isinstance(incoming_urls, list) or not all(
+                isinstance(url, str) for url in incoming_urls):
+            raise HTTPError(400, '"urls" must be a list of strings')
+
+        max_size = self.settings['nurl.batch.max_size']
+        if len(incoming_urls) > max_size:
+            raise HTTPError(400,
+                    'at most %s URLs are accepted per request' % max_size)
+
+        results = []
+        for result in await self.nurl.shorten_many(incoming_urls):
+            if result.error:
+                results.append({'url': result.url, 'error': result.error})
+            else:
+                results.append({'url': result.url,
+                                'short_url': request.short_url(
+                                    result.short_ref)})
+
+        return json_response(request, {'results': results})
+
+    async def batch_short_ref_resolver(self, request):
+        if request.method == 'POST':
+            try:
+                payload = request.json_body
+            except ValueError:
+                raise HTTPError(400, 'invalid JSON payload') from None
+            if not isinstance(payload, dict):
+                raise HTTPError(400, 'invalid JSON payload')
+            short_refs = payload.get('refs')
+            track = asbool(payload.get('track', False))
+        else:
+            short_refs = request.GET.get('ref')
+            track = asbool(request.param('track', False))
+
+        if not short_refs or not isinstance(short_refs, list) or not all(
+                isinstance(ref, str) for ref in short_refs):
+            raise HTTPError(400, '"refs" must be a list of strings')
+
+        max_size = self.settings['nurl.batch.max_size']
+        if len(short_refs) > max_size:
+            raise HTTPError(400,
+                    'at most %s refs are accepted per request' % max_size)
+
+        access = None
+        if track:
+            access = Access(utctime=datetime.utcnow(),
+                    referrer=request.referrer)
+
+        urls = await self.nurl.resolve_many(short_refs, access=access)
+        missing = [ref for ref in dict.fromkeys(short_refs) if ref not in urls]
+
+        return json_response(request, {'urls': urls, 'missing': missing},
+                jsonp=True)
+
+    async def stats(self, request):
+        response_dict = {'shortener': self.nurl.stats()}
+        for name, obj in [('store', self.nurl.store),
+                          ('tracker', self.nurl.tracker),
+                          ('pinger', self.nurl.pinger)]:
+            obj_stats = getattr(obj, 'stats', None)
+            if obj_stats is not None:
+                response_dict[name] = obj_stats()
+
+        return json_response(request, response_dict)
+
+    async def metrics(self, request):
+        if self.instrumentation is None:
+            raise HTTPError(404)
+        return Response(200,
+                self.instrumentation.registry.exposition().encode('utf-8'),
+                metrics.CONTENT_TYPE)
+
+    async def short_ref_resolver(self, request):
+        short_ref = request.path[1:]
+        access = Access(utctime=datetime.utcnow(), referrer=request.referrer)
+        try:
+            plain_url = await self.nurl.resolve(short_ref, access=access)
+        except NotExists:
+            raise HTTPError(404) from None
+
+        location = urllib.parse.quote(plain_url, safe=LOCATION_SAFE_CHARS)
+        return Response(self.redirect_status,
+                headers=[('location', location)] + self.redirect_headers)
+
+    async def static(self, request):
+        relpath = request.path[len(STATIC_PREFIX):]
+        path = os.path.normpath(os.path.join(STATIC_DIR, relpath))
+        if not path.startswith(STATIC_DIR + os.sep):
+            raise HTTPError(404)
+
+        accept_encoding = request.headers.get('accept-encoding')
+
+        def read():
+            # a variante pré-comprimida é preferida, quando existente e
+            # aceita pelo cliente.
+            variants = [encoding for encoding in self.static_encodings
+                        if os.path.isfile(
+                            path + precompression.ENCODINGS[encoding])]
+            encoding = precompression.choose_encoding(accept_encoding,
+                    variants)
+            filepath = path if encoding is None else \
+                    path + precompression.ENCODINGS[encoding]
+            with open(filepath, 'rb') as f:
+                return f.read(), encoding, variants
+
+        loop = asyncio.get_event_loop()
+        try:
+            body, encoding, variants = await loop.run_in_executor(None, read)
+        except OSError:
+            raise HTTPError(404) from None
+
+        content_type = mimetypes.guess_type(path)[0] or \
+                'application/octet-stream'
+        headers = [('cache-control', 'max-age=%s' % STATIC_CACHE_MAX_AGE)]
+        if variants:
+            headers.append(('vary', 'Accept-Encoding'))
+        if encoding is not None:
+            headers.append(('content-encoding', encoding))
+        return Response(200, body, content_type, headers=headers)
+
+
+async def build_nurl(settings):
+    """Constrói a instância de :class:`nurl.aio.shortener.AsyncNurl` de
+    acordo com as configurações `settings`, produzidas por
+    :func:`nurl.pyramid_nurl.parse_settings`.
+    """
+    backend = settings['nurl.backend']
+    if backend == 'mongodb':
+        try:
+            import motor.motor_asyncio
+        except ImportError:
+            raise ValueError('the asyncio mode requires "motor" with the '
+                    '"mongodb" backend') from None
+
+        mongodb_uri = settings['nurl.mongodb.uri']
+        mongodb_name = settings['nurl.mongodb.db']
+        client_options = mongodb.get_client_options(settings)
+        # os índices são criados por meio de `nurl-manage create-indexes`.
+        client = motor.motor_asyncio.AsyncIOMotorClient(mongodb_uri,
+                **client_options)
+        database = client[mongodb_name]
+        LOGGER.info('connecting to MongoDB database "%s"', mongodb_name)
+
+        datastore = datastores.AsyncMongoDBDataStore(
+                database[settings['nurl.mongodb.data_col']])
+        access_tracker = trackers.AsyncMongoDBTracker(
+                database[settings['nurl.mongodb.tracker_col']])
+        # os blocos de IDs são obtidos raramente, por meio do `pymongo`.
+        sync_database = mongodb.LazyDatabase(mongodb_uri, mongodb_name,
+                client_options)
+        sequence_factory = lambda: idgenerators.MongoDBSequence(
+                sync_database[settings['nurl.mongodb.sequences_col']])
+
+        if settings['nurl.snapshot.path'] or settings['nurl.bloom.enabled']:
+            LOGGER.warning('the snapshot and the bloom filter are not used '
+                    'by the "mongodb" backend in asyncio mode')
+        if settings['nurl.cache.enabled']:
+            datastore = datastores.AsyncCachingDataStore(datastore,
+                    maxsize=settings['nurl.cache.maxsize'],
+                    ttl=settings['nurl.cache.ttl'] or None)
+    elif backend == 'sqlite':
+        sqlite_path = settings['nurl.sqlite.path']
+        sqlite_pool = sqlite.ConnectionPool(sqlite_path)
+        LOGGER.info('using the SQLite database at "%s"', sqlite_path)
+
+        datastore = datastores.ExecutorDataStore(
+                build_sync_store(settings,
+                    sync_datastores.SQLiteDataStore(sqlite_pool)))
+        access_tracker = trackers.ExecutorTracker(
+                sync_trackers.SQLiteTracker(sqlite_pool))
+        sequence_factory = lambda: idgenerators.SQLiteSequence(sqlite_pool)
+    else:
+        raise ValueError('unknown backend "%s" in asyncio mode' % backend)
+
+    if settings['nurl.tracker.storage'] != 'raw':
+        raise ValueError('only the "raw" tracker storage is supported in '
+                'asyncio mode')
+
+    tracker_mode = settings['nurl.tracker.mode']
+    if tracker_mode == 'buffered':
+        access_tracker = trackers.AsyncBufferedTracker(access_tracker,
+                max_batch=settings['nurl.tracker.max_batch'],
+                flush_interval=settings['nurl.tracker.flush_interval'],
+                max_queued=settings['nurl.tracker.max_queued'],
+                overflow=settings['nurl.tracker.overflow'])
+    elif tracker_mode != 'sync':
+        raise ValueError('unknown tracker mode "%s"' % tracker_mode)
+    LOGGER.info('tracking accesses in "%s" mode', tracker_mode)
+
+    if settings['nurl.whitelist.enabled']:
+        whitelist = whitelists.WhitelistFile(settings['nurl.whitelist.path'],
+                auto_www=settings['nurl.whitelist.auto_www'],
+                reload_interval=settings['nurl.whitelist.reload_interval'])
+        # torna a lista disponível para o template
+        settings['nurl.whitelist'] = whitelist
+    else:
+        whitelist = None
+
+    return shortener.AsyncNurl(datastore,
+            pyramid_nurl.get_idgen(settings, sequence_factory),
+            whitelist=whitelist, tracker=access_tracker,
+            timeout=settings['nurl.ping_timeout'],
+            pinger=get_pinger(settings),
+            batch_workers=settings['nurl.batch.workers'],
+            canonicalize=pyramid_nurl.get_canonicalizer(settings))
+
+
+def build_sync_store(settings, store):
+    """Envolve `store` nas camadas de instantâneo, de filtro de Bloom e de
+    cache, de acordo com as configurações.
+    """
+    if settings['nurl.snapshot.path']:
+        store = sync_datastores.SnapshotDataStore(store,
+                snapshot.Snapshot(settings['nurl.snapshot.path']))
+    if settings['nurl.bloom.enabled']:
+        store = pyramid_nurl.get_bloom_filtered_store(store,
+                path=settings['nurl.bloom.path'],
+                capacity=settings['nurl.bloom.capacity'],
+                error_rate=settings['nurl.bloom.error_rate'],
+                ref_lengths=pyramid_nurl.get_ref_lengths(settings))
+    if settings['nurl.cache.enabled']:
+        store = sync_datastores.CachingDataStore(store,
+                maxsize=settings['nurl.cache.maxsize'],
+                ttl=settings['nurl.cache.ttl'] or None)
+    return store
+
+
+def get_pinger(settings):
+    """Constrói a instância de :class:`nurl.aio.pingers.AsyncPinger` de
+    acordo com as configurações ``nurl.ping.*``.
+    """
+    strategy = settings['nurl.ping.strategy']
+    if strategy == 'http':
+        pinger = pingers.AsyncHTTPPinger(
+                max_per_host=settings['nurl.ping.max_per_host'])
+    elif strategy == 'urlopen':
+        pinger = pingers.ExecutorPinger(sync_pingers.UrlopenPinger())
+    else:
+        raise ValueError('unknown ping strategy "%s"' % strategy)
+    LOGGER.info('checking URLs with the "%s" ping strategy', strategy)
+
+    if settings['nurl.ping.cache.enabled']:
+        pinger = pingers.AsyncCachingPinger(pinger,
+                ok_ttl=settings['nurl.ping.cache.ok_ttl'],
+                fail_ttl=settings['nurl.ping.cache.fail_ttl'],
+                host_fail_ttl=settings['nurl.ping.cache.host_fail_ttl'],
+                maxsize=settings['nurl.ping.cache.maxsize'])
+    return pinger
+
+
+def create_app(config_uri=None):
+    """Constrói a aplicação a partir da seção ``[app:main]`` do arquivo de
+    configurações `config_uri` ou, por padrão, do arquivo indicado pela
+    variável de ambiente ``NURL_CONFIG``. Sem arquivo, apenas as variáveis
+    de ambiente e os valores padrão são considerados.
+    """
+    config_uri = config_uri or os.environ.get('NURL_CONFIG')
+    if config_uri:
+        from pyramid.paster import get_appsettings, setup_logging
+        setup_logging(config_uri)
+        settings = get_appsettings(config_uri)
+    else:
+        settings = {}
+    return Application(pyramid_nurl.parse_settings(settings))
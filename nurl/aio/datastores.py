@@ -0,0 +1,313 @@
+import abc
+import asyncio
+import functools
+import logging
+from datetime import datetime
+from typing import Iterable, Optional, Dict, AsyncIterator
+
+import bson
+import pymongo
+
+from ..datastores import (
+        DuplicatedKeyError,
+        DuplicatedValueError,
+        DEFAULT_CACHE_MAXSIZE,
+        MONGODB_PAIR_PROJECTION,
+        CachedPairs,
+        duplicated_value_error,
+        is_duplicated_value,
+        mongodb_bulk_failures,
+        mongodb_key_many_query,
+        mongodb_key_query,
+        mongodb_record,
+        mongodb_stored_value_query,
+        )
+
+
+__all__ = ['AsyncDataStore', 'AsyncInMemoryDataStore',
+        'AsyncMongoDBDataStore', 'AsyncCachingDataStore', 'ExecutorDataStore']
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class AsyncDataStore(metaclass=abc.ABCMeta):
+    """Armazena pares chave-valor, de maneira assíncrona.
+
+    Equivalente a :class:`nurl.datastores.DataStore`, com as mesmas
+    garantias, em que os métodos `__setitem__` e `__getitem__` correspondem
+    às corrotinas :meth:`set` e :meth:`get`.
+    """
+    @abc.abstractmethod
+    async def set(self, key: str, value: str) -> None:
+        return NotImplemented
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> str:
+        return NotImplemented
+
+    @abc.abstractmethod
+    async def key(self, url: str) -> str:
+        return NotImplemented
+
+    def keys(self, since: Optional[datetime] = None) -> AsyncIterator[str]:
+        """Produz, de maneira assíncrona, todas as chaves armazenadas ou,
+        opcionalmente, apenas as armazenadas a partir de `since` (UTC).
+        """
+        raise NotImplementedError()
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        result = {}
+        for key in keys:
+            try:
+                result[key] = await self.get(key)
+            except KeyError:
+                pass
+        return result
+
+    async def key_many(self, urls: Iterable[str]) -> Dict[str, str]:
+        result = {}
+        for url in urls:
+            try:
+                result[url] = await self.key(url)
+            except KeyError:
+                pass
+        return result
+
+    async def set_many(self, pairs: Dict[str, str]) -> Dict[str, Exception]:
+        failures = {}
+        for key, value in pairs.items():
+            try:
+                await self.set(key, value)
+            except (DuplicatedKeyError, DuplicatedValueError) as exc:
+                failures[key] = exc
+        return failures
+
+    async def close(self) -> None:
+        pass
+
+
+class AsyncInMemoryDataStore(AsyncDataStore):
+    """Armazena os pares chave-valor em dicionários. Como as operações não
+    são interrompidas por `await`, dispensa bloqueios.
+    """
+    def __init__(self, initial=None):
+        self.data = {}
+        self.revdata = {}
+
+        if initial:
+            for k, v in initial.items():
+                self._set(k, v)
+
+    def _set(self, key, value):
+        if key in self.data:
+            raise DuplicatedKeyError()
+        elif value in self.revdata:
+            raise DuplicatedValueError()
+        else:
+            self.data[key] = value
+            self.revdata[value] = key
+
+    async def set(self, key, value):
+        self._set(key, value)
+
+    async def get(self, key):
+        return self.data[key]
+
+    async def key(self, url):
+        return self.revdata[url]
+
+    async def keys(self, since=None):
+        for key in list(self.data):
+            yield key
+
+    async def get_many(self, keys):
+        return {key: self.data[key] for key in keys if key in self.data}
+
+    async def key_many(self, urls):
+        return {url: self.revdata[url] for url in urls if url in self.revdata}
+
+
+class AsyncMongoDBDataStore(AsyncDataStore):
+    """Armazena os pares chave-valor em uma coleção do MongoDB, acessada por
+    meio do `motor`. Os registros são compatíveis com os de
+    :class:`nurl.datastores.MongoDBDataStore`.
+
+    :param collection: instância de
+                       `motor.motor_asyncio.AsyncIOMotorCollection`.
+    """
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def _duplicated_value(self, value):
+        record = await self.collection.find_one(
+                mongodb_stored_value_query(value),
+                projection={'plain': True, '_id': False})
+        return duplicated_value_error(value, record and record['plain'])
+
+    async def set(self, key, value):
+        try:
+            _ = await self.collection.insert_one(mongodb_record(key, value))
+        except pymongo.errors.DuplicateKeyError as exc:
+            if is_duplicated_value(str(exc)):
+                raise await self._duplicated_value(value) from None
+            else:
+                raise DuplicatedKeyError() from None
+
+    async def get(self, key):
+        record = await self.collection.find_one({'short_ref': key})
+        if record is None:
+            raise KeyError()
+        else:
+            return record['plain']
+
+    async def key(self, url):
+        record = await self.collection.find_one(mongodb_key_query(url))
+        if record is None:
+            raise KeyError()
+        else:
+            return record['short_ref']
+
+    async def keys(self, since=None):
+        query = {}
+        if since is not None:
+            query['_id'] = {'$gte': bson.ObjectId.from_datetime(since)}
+
+        records = self.collection.find(query,
+                projection={'short_ref': True, '_id': False})
+        async for rec in records:
+            yield rec['short_ref']
+
+    async def get_many(self, keys):
+        records = self.collection.find({'short_ref': {'$in': list(keys)}},
+                projection=MONGODB_PAIR_PROJECTION)
+        return {rec['short_ref']: rec['plain'] async for rec in records}
+
+    async def key_many(self, urls):
+        urls = set(urls)
+        records = self.collection.find(mongodb_key_many_query(urls),
+                projection=MONGODB_PAIR_PROJECTION)
+        return {rec['plain']: rec['short_ref'] async for rec in records
+                if rec['plain'] in urls}
+
+    async def set_many(self, pairs):
+        keys = list(pairs)
+        if not keys:
+            return {}
+
+        try:
+            _ = await self.collection.insert_many(
+                    [mongodb_record(key, pairs[key]) for key in keys],
+                    ordered=False)
+        except pymongo.errors.BulkWriteError as exc:
+            failures, duplicated = mongodb_bulk_failures(exc, keys)
+            for key in duplicated:
+                failures[key] = await self._duplicated_value(pairs[key])
+            return failures
+        else:
+            return {}
+
+
+class AsyncCachingDataStore(CachedPairs, AsyncDataStore):
+    """Cache de leitura à frente de outra instância de
+    :class:`AsyncDataStore`.
+
+    Equivalente a :class:`nurl.datastores.CachingDataStore`, com os mesmos
+    parâmetros.
+
+    :param store: instância de :class:`AsyncDataStore` a ser envolvida.
+    """
+    def __init__(self, store, maxsize=DEFAULT_CACHE_MAXSIZE, ttl=None):
+        super().__init__(maxsize, ttl)
+        self.store = store
+
+    async def set(self, key, value):
+        await self.store.set(key, value)
+        self._remember(key, value)
+
+    async def get(self, key):
+        value = self.value_cache.get(key)
+        if value is None:
+            value = await self.store.get(key)
+            self.value_cache.set(key, value)
+        return value
+
+    async def key(self, url):
+        key = self.key_cache.get(url)
+        if key is None:
+            key = await self.store.key(url)
+            self.key_cache.set(url, key)
+        return key
+
+    def keys(self, since=None):
+        return self.store.keys(since=since)
+
+    async def get_many(self, keys):
+        result, missing = self._cached(self.value_cache, keys)
+        if missing:
+            self._fill(self.value_cache, result,
+                    await self.store.get_many(missing))
+        return result
+
+    async def key_many(self, urls):
+        result, missing = self._cached(self.key_cache, urls)
+        if missing:
+            self._fill(self.key_cache, result,
+                    await self.store.key_many(missing))
+        return result
+
+    async def set_many(self, pairs):
+        failures = await self.store.set_many(pairs)
+        self._remember_stored(pairs, failures)
+        return failures
+
+    async def close(self):
+        await self.store.close()
+
+
+class ExecutorDataStore(AsyncDataStore):
+    """Adapta uma instância de :class:`nurl.datastores.DataStore`, cujas
+    operações são executadas em um *pool* de threads, p.ex. para utilizar
+    :class:`nurl.datastores.SQLiteDataStore` ou as camadas de cache no modo
+    assíncrono.
+
+    :param store: instância de :class:`nurl.datastores.DataStore`.
+    :param executor: (opcional) instância de `concurrent.futures.Executor`.
+                     Por padrão, é utilizado o executor do *event loop*.
+    """
+    def __init__(self, store, executor=None):
+        self.store = store
+        self.executor = executor
+
+    def _run(self, func, *args):
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self.executor,
+                functools.partial(func, *args))
+
+    async def set(self, key, value):
+        await self._run(self.store.__setitem__, key, value)
+
+    async def get(self, key):
+        return await self._run(self.store.__getitem__, key)
+
+    async def key(self, url):
+        return await self._run(self.store.key, url)
+
+    async def keys(self, since=None):
+        keys = await self._run(lambda: list(self.store.keys(since)))
+        for key in keys:
+            yield key
+
+    async def get_many(self, keys):
+        return await self._run(self.store.get_many, list(keys))
+
+    async def key_many(self, urls):
+        return await self._run(self.store.key_many, list(urls))
+
+    async def set_many(self, pairs):
+        return await self._run(self.store.set_many, dict(pairs))
+
+    async def close(self):
+        close = getattr(self.store, 'close', None)
+        if close is not None:
+            await self._run(close)
@@ -0,0 +1,349 @@
+"""Estratégias assíncronas de verificação de conectividade de URLs.
+
+Cada estratégia implementa :class:`AsyncPinger` e pode ser fornecida a
+:class:`nurl.aio.shortener.AsyncNurl`.
+"""
+import abc
+import ssl
+import asyncio
+import functools
+import urllib.parse
+import logging
+
+from ..caches import LRUCache
+from ..pingers import (
+        PingResult,
+        REDIRECT_STATUSES,
+        HEAD_UNSUPPORTED_STATUSES,
+        MAX_DRAIN_SIZE,
+        url_origin,
+        request_target,
+        )
+
+
+__all__ = ['AsyncPinger', 'AsyncHTTPPinger', 'AsyncCachingPinger',
+        'ExecutorPinger']
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+# tamanho máximo da linha de status e de cada cabeçalho das respostas.
+MAX_LINE_SIZE = 8192
+NO_BODY_STATUSES = frozenset([204, 304])
+PING_ERRORS = (OSError, EOFError, ValueError, asyncio.TimeoutError,
+        asyncio.LimitOverrunError)
+
+
+class AsyncPinger(metaclass=abc.ABCMeta):
+    """Verifica, de maneira assíncrona, se uma URL alcança um servidor.
+
+    Equivalente a :class:`nurl.pingers.Pinger`.
+    """
+    @abc.abstractmethod
+    async def check(self, url: str, timeout: float) -> PingResult:
+        return NotImplemented
+
+    async def ping(self, url: str, timeout: float) -> bool:
+        result = await self.check(url, timeout)
+        return result.alive
+
+    async def close(self) -> None:
+        pass
+
+
+class ExecutorPinger(AsyncPinger):
+    """Adapta uma instância de :class:`nurl.pingers.Pinger`, cujas
+    verificações são executadas em um *pool* de threads.
+
+    :param pinger: instância de :class:`nurl.pingers.Pinger`.
+    :param executor: (opcional) instância de `concurrent.futures.Executor`.
+                     Por padrão, é utilizado o executor do *event loop*.
+    """
+    def __init__(self, pinger, executor=None):
+        self.pinger = pinger
+        self.executor = executor
+
+    async def check(self, url, timeout):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor,
+                functools.partial(self.pinger.check, url, timeout))
+
+
+class AsyncHTTPPinger(AsyncPinger):
+    """Realiza uma requisição HEAD e, caso o método não seja suportado pelo
+    servidor, uma requisição GET limitada ao primeiro byte do recurso, por
+    meio de `asyncio.open_connection`.
+
+    Equivalente a :class:`nurl.pingers.HTTPPinger`, com os mesmos
+    parâmetros: os redirecionamentos são seguidos, as conexões são mantidas
+    abertas para reuso e a quantidade de verificações simultâneas em cada
+    host é limitada a `max_per_host`. O tempo máximo `timeout` abrange cada
+    requisição, incluindo o estabelecimento da conexão.
+    """
+    def __init__(self, max_per_host=4, max_idle_per_host=2, max_redirects=5,
+            user_agent='nURL'):
+        self.max_per_host = max_per_host
+        self.max_idle_per_host = max_idle_per_host
+        self.max_redirects = max_redirects
+        self.user_agent = user_agent
+        self.ssl_context = ssl.create_default_context()
+
+        self.semaphores = {}
+        self.idle = {}
+
+    async def check(self, url, timeout):
+        for _ in range(self.max_redirects + 1):
+            parts = urllib.parse.urlsplit(url)
+            try:
+                origin = url_origin(parts)
+            except (ValueError, UnicodeError) as exc:
+                LOGGER.info('cannot check URL "%s": %s', url, str(exc))
+                return PingResult(alive=False, reachable=False)
+
+            semaphore = self._semaphore(origin)
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout)
+            except asyncio.TimeoutError:
+                LOGGER.info('too many concurrent checks on "%s"', origin[1])
+                return PingResult(alive=False, reachable=None)
+            try:
+                status, location = await asyncio.wait_for(
+                        self._request(origin, parts), timeout)
+            except PING_ERRORS as exc:
+                LOGGER.info('cannot connect to URL "%s": %r', url, exc)
+                return PingResult(alive=False, reachable=False)
+            finally:
+                semaphore.release()
+
+            if status in REDIRECT_STATUSES and location:
+                url = urllib.parse.urljoin(url, location)
+                continue
+
+            if status >= 400:
+                LOGGER.info('cannot connect to URL "%s": HTTP status %s',
+                        url, status)
+            return PingResult(alive=status < 400, reachable=True)
+
+        LOGGER.info('cannot connect to URL "%s": too many redirects', url)
+        return PingResult(alive=False, reachable=True)
+
+    async def close(self):
+        """Encerra todas as conexões ociosas.
+        """
+        idle, self.idle = self.idle, {}
+        for conns in idle.values():
+            for _, writer in conns:
+                writer.close()
+
+    def _semaphore(self, origin):
+        semaphore = self.semaphores.get(origin)
+        if semaphore is None:
+            semaphore = asyncio.BoundedSemaphore(self.max_per_host)
+            self.semaphores[origin] = semaphore
+        return semaphore
+
+    async def _request(self, origin, parts):
+        target = request_target(parts)
+        status, location = await self._send(origin, 'HEAD', target, {})
+        if status in HEAD_UNSUPPORTED_STATUSES:
+            status, location = await self._send(origin, 'GET', target,
+                    {'Range': 'bytes=0-0'})
+        return status, location
+
+    def _host_header(self, origin):
+        scheme, host, port = origin
+        if ':' in host:
+            host = '[%s]' % host
+        if port != (443 if scheme == 'https' else 80):
+            host += ':%s' % port
+        return host
+
+    async def _send(self, origin, method, target, headers):
+        headers = dict(headers, **{'Host': self._host_header(origin),
+                                   'User-Agent': self.user_agent})
+        request = ''.join(['%s %s HTTP/1.1\r\n' % (method, target)] +
+                          ['%s: %s\r\n' % item for item in headers.items()] +
+                          ['\r\n']).encode('latin-1')
+
+        conn, reused = self._get_connection(origin)
+        if conn is None:
+            conn = await self._connect(origin)
+        try:
+            try:
+                response = await self._exchange(conn, method, request)
+            except (ConnectionError, EOFError):
+                conn[1].close()
+                if not reused:
+                    raise
+                # a conexão ociosa foi encerrada pelo servidor.
+                conn = await self._connect(origin)
+                response = await self._exchange(conn, method, request)
+        except BaseException:
+            conn[1].close()
+            raise
+
+        status, location, reusable = response
+        if reusable:
+            self._put_connection(origin, conn)
+        else:
+            conn[1].close()
+        return status, location
+
+    async def _exchange(self, conn, method, request):
+        reader, writer = conn
+        writer.write(request)
+        await writer.drain()
+        return await self._read_response(reader, method)
+
+    async def _read_response(self, reader, method):
+        """Lê a resposta e consome o seu corpo. Retorna o status, o
+        cabeçalho `Location` e se a conexão pode ser reutilizada.
+        """
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('connection closed by the server')
+        version, status, _ = (status_line.decode('latin-1').split(None, 2)
+                              + ['', ''])[:3]
+        if not version.startswith('HTTP/') or not status.isdigit():
+            raise ValueError('invalid status line %r' % status_line)
+        status = int(status)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n'):
+                break
+            if not line:
+                raise EOFError('incomplete response headers')
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 100 <= status < 200:
+            return await self._read_response(reader, method)
+
+        reusable = (version == 'HTTP/1.1' and
+                    headers.get('connection', '').lower() != 'close')
+        if method == 'HEAD' or status in NO_BODY_STATUSES:
+            pass
+        elif 'chunked' in headers.get('transfer-encoding', '').lower():
+            reusable = reusable and await self._drain_chunked(reader)
+        elif 'content-length' in headers:
+            size = int(headers['content-length'])
+            if size > MAX_DRAIN_SIZE:
+                reusable = False
+            else:
+                await reader.readexactly(size)
+        else:
+            # o corpo é delimitado pelo encerramento da conexão.
+            reusable = False
+        return status, headers.get('location'), reusable
+
+    async def _drain_chunked(self, reader):
+        """Consome o corpo codificado em *chunks*. Retorna `False` caso seja
+        maior que `MAX_DRAIN_SIZE`.
+        """
+        remaining = MAX_DRAIN_SIZE
+        while True:
+            line = await reader.readline()
+            size = int(line.split(b';', 1)[0].strip(), 16)
+            if size == 0:
+                break
+            remaining -= size
+            if remaining < 0:
+                return False
+            await reader.readexactly(size + 2)
+
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n'):
+                return True
+            if not line:
+                raise EOFError('incomplete chunked response')
+
+    async def _connect(self, origin):
+        scheme, host, port = origin
+        if scheme == 'https':
+            return await asyncio.open_connection(host, port,
+                    ssl=self.ssl_context, limit=MAX_LINE_SIZE)
+        else:
+            return await asyncio.open_connection(host, port,
+                    limit=MAX_LINE_SIZE)
+
+    def _get_connection(self, origin):
+        conns = self.idle.get(origin)
+        while conns:
+            conn = conns.pop()
+            if not conn[0].at_eof():
+                return conn, True
+            conn[1].close()
+        return None, False
+
+    def _put_connection(self, origin, conn):
+        conns = self.idle.setdefault(origin, [])
+        if len(conns) < self.max_idle_per_host:
+            conns.append(conn)
+        else:
+            conn[1].close()
+
+
+class AsyncCachingPinger(AsyncPinger):
+    """Mantém em cache os resultados das verificações realizadas por outra
+    instância de :class:`AsyncPinger`.
+
+    Equivalente a :class:`nurl.pingers.CachingPinger`, com os mesmos
+    parâmetros. Adicionalmente, as verificações simultâneas de uma mesma URL
+    são realizadas uma única vez.
+
+    :param pinger: instância de :class:`AsyncPinger` a ser envolvida.
+    """
+    def __init__(self, pinger, ok_ttl=3600, fail_ttl=60, host_fail_ttl=30,
+            maxsize=10000):
+        self.pinger = pinger
+        self.ok_urls = LRUCache(maxsize, ok_ttl or None)
+        self.failed_urls = LRUCache(maxsize, fail_ttl or None)
+        self.failed_hosts = LRUCache(maxsize, host_fail_ttl or None)
+        self.in_flight = {}
+        self.coalesced = 0
+
+    async def check(self, url, timeout):
+        result = self.ok_urls.get(url) or self.failed_urls.get(url)
+        if result is not None:
+            return result
+
+        host = urllib.parse.urlsplit(url).hostname
+        if host and self.failed_hosts.get(host) is not None:
+            LOGGER.info('host of URL "%s" was recently unreachable', url)
+            return PingResult(alive=False, reachable=False)
+
+        future = self.in_flight.get(url)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(self._check(url, host, timeout))
+        self.in_flight[url] = future
+        future.add_done_callback(lambda _: self.in_flight.pop(url, None))
+        return await asyncio.shield(future)
+
+    async def _check(self, url, host, timeout):
+        result = await self.pinger.check(url, timeout)
+        if result.alive:
+            self.ok_urls.set(url, result)
+        elif result.reachable is not None:
+            self.failed_urls.set(url, result)
+            if not result.reachable and host:
+                self.failed_hosts.set(host, True)
+        return result
+
+    async def close(self):
+        await self.pinger.close()
+
+    def stats(self):
+        """Contadores de acertos, ausências e remoções de cada cache, e de
+        verificações simultâneas agrupadas.
+        """
+        return {'ok_urls': self.ok_urls.stats(),
+                'failed_urls': self.failed_urls.stats(),
+                'failed_hosts': self.failed_hosts.stats(),
+                'coalesced': self.coalesced}
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+
+from .. import trackers
+from ..shortener import (
+        BaseNurl,
+        NotExists,
+        DEFAULT_TIMEOUT,
+        DEFAULT_BATCH_WORKERS,
+        )
+
+
+__all__ = ['AsyncNurl']
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class AsyncNurl(BaseNurl):
+    """Encurtador de URLs assíncrono.
+
+    Equivalente a :class:`nurl.shortener.Nurl`, com os mesmos parâmetros e
+    métodos, definidos como corrotinas.
+
+    :param store: instância de :class:`nurl.aio.datastores.AsyncDataStore`.
+    :param idgen: executável que produz uma lista de IDs pseudo-aleatórios.
+    :param tracker: (opcional) instância de
+                    :class:`nurl.aio.trackers.AsyncTracker`.
+    :param pinger: instância de :class:`nurl.aio.pingers.AsyncPinger`
+                   utilizada na verificação de conectividade das URLs.
+    :param batch_workers: (opcional) quantidade máxima de verificações de
+                          conectividade simultâneas em `shorten_many`.
+    """
+    def __init__(self, store, idgen, whitelist=None, tracker=None,
+            timeout=DEFAULT_TIMEOUT, pinger=None,
+            batch_workers=DEFAULT_BATCH_WORKERS, canonicalize=None):
+        if pinger is None:
+            raise ValueError('a pinger is required')
+
+        super().__init__(store, idgen, whitelist=whitelist, tracker=tracker,
+                timeout=timeout, pinger=pinger, batch_workers=batch_workers,
+                canonicalize=canonicalize)
+
+    async def _run(self, steps):
+        result = error = None
+        while True:
+            try:
+                if error is None:
+                    op = steps.send(result)
+                else:
+                    op = steps.throw(error)
+            except StopIteration as stop:
+                return stop.value
+
+            try:
+                result, error = await self._perform(*op), None
+            except Exception as exc:
+                result, error = None, exc
+
+    async def _perform(self, op, arg, *args):
+        if op == 'set':
+            await self.store.set(arg, args[0])
+        elif op == 'ping':
+            return await self.pinger.ping(arg.url, self.timeout)
+        elif op == 'ping_many':
+            semaphore = asyncio.Semaphore(self.batch_workers)
+
+            async def ping(uc):
+                async with semaphore:
+                    return await self.pinger.ping(uc.url, self.timeout)
+
+            return await asyncio.gather(*[ping(uc) for uc in arg])
+        else:
+            return await getattr(self.store, op)(arg)
+
+    async def shorten(self, url):
+        return await self._run(self._shorten_steps(url))
+
+    async def shorten_many(self, urls):
+        """Encurta diversas URLs de uma só vez.
+
+        Equivalente a :meth:`nurl.shortener.Nurl.shorten_many`; a
+        conectividade das novas URLs é verificada concorrentemente, limitada
+        a `batch_workers` verificações simultâneas.
+        """
+        return await self._run(self._shorten_many_steps(urls))
+
+    async def resolve(self, shortid, access=None):
+        assert isinstance(access, (type(None), trackers.Access))
+
+        try:
+            url = await self.store.get(shortid)
+        except KeyError:
+            raise NotExists() from None
+
+        if access and self.tracker:
+            await self.tracker.add(shortid, access)
+        else:
+            LOGGER.info('could not track access to shortid "%s"', shortid)
+
+        return url
+
+    async def resolve_many(self, shortids, access=None):
+        assert isinstance(access, (type(None), trackers.Access))
+
+        urls = await self.store.get_many(shortids)
+
+        if access and self.tracker:
+            await self.tracker.add_many((shortid, access) for shortid in urls)
+
+        return urls
+
+    async def close(self):
+        """Encerra o `tracker`, o `pinger` e o `store`, nesta ordem.
+        """
+        for obj in (self.tracker, self.pinger, self.store):
+            if obj is not None:
+                await obj.close()
@@ -0,0 +1,246 @@
+import abc
+import asyncio
+import functools
+import logging
+from collections import deque
+from typing import Iterable, Tuple, List
+
+import pymongo
+
+from ..trackers import Access, OVERFLOW_POLICIES
+
+
+__all__ = ['AsyncTracker', 'AsyncInMemoryTracker', 'AsyncMongoDBTracker',
+        'AsyncBufferedTracker', 'ExecutorTracker']
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class AsyncTracker(metaclass=abc.ABCMeta):
+    """Registra acesso às URLs encurtadas, de maneira assíncrona.
+
+    Equivalente a :class:`nurl.trackers.Tracker`.
+    """
+    @abc.abstractmethod
+    async def add(self, short_ref: str, access: Access) -> None:
+        return NotImplemented
+
+    @abc.abstractmethod
+    async def get(self, short_ref: str) -> List[Access]:
+        return NotImplemented
+
+    async def add_many(self, items: Iterable[Tuple[str, Access]]) -> int:
+        """Registra diversos acessos de uma só vez.
+
+        Retorna a quantidade de acessos registrados com sucesso.
+        """
+        count = 0
+        for short_ref, access in items:
+            await self.add(short_ref, access)
+            count += 1
+        return count
+
+    async def close(self) -> None:
+        pass
+
+
+class AsyncInMemoryTracker(AsyncTracker):
+    def __init__(self):
+        self.data = {}
+
+    async def add(self, short_ref, access):
+        short_ref_rec = self.data.setdefault(short_ref, [])
+        short_ref_rec.append(access)
+
+    async def get(self, short_ref):
+        return list(self.data.get(short_ref, []))
+
+
+class AsyncMongoDBTracker(AsyncTracker):
+    """Registra os acessos em uma coleção do MongoDB, acessada por meio do
+    `motor`. Os registros são compatíveis com os de
+    :class:`nurl.trackers.MongoDBTracker`.
+
+    :param collection: instância de
+                       `motor.motor_asyncio.AsyncIOMotorCollection`.
+    """
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def add(self, short_ref, access):
+        await self.add_many([(short_ref, access)])
+
+    async def add_many(self, items):
+        records = []
+        for short_ref, access in items:
+            record = access._asdict()
+            record['short_ref'] = short_ref
+            records.append(record)
+
+        if not records:
+            return 0
+
+        try:
+            r = await self.collection.insert_many(records, ordered=False)
+        except pymongo.errors.BulkWriteError as exc:
+            inserted = exc.details.get('nInserted', 0)
+            LOGGER.error('could not save %s of %s access records: %s',
+                    len(records) - inserted, len(records), str(exc))
+            return inserted
+        else:
+            LOGGER.info('%s access records were successfully saved',
+                    len(r.inserted_ids))
+            return len(r.inserted_ids)
+
+    async def get(self, short_ref):
+        records = self.collection.find({'short_ref': short_ref})
+        return [Access(utctime=rec['utctime'], referrer=rec['referrer'])
+                async for rec in records]
+
+
+class ExecutorTracker(AsyncTracker):
+    """Adapta uma instância de :class:`nurl.trackers.Tracker`, cujas
+    operações são executadas em um *pool* de threads.
+
+    :param tracker: instância de :class:`nurl.trackers.Tracker`.
+    :param executor: (opcional) instância de `concurrent.futures.Executor`.
+                     Por padrão, é utilizado o executor do *event loop*.
+    """
+    def __init__(self, tracker, executor=None):
+        self.tracker = tracker
+        self.executor = executor
+
+    def _run(self, func, *args):
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self.executor,
+                functools.partial(func, *args))
+
+    async def add(self, short_ref, access):
+        await self._run(self.tracker.add, short_ref, access)
+
+    async def add_many(self, items):
+        return await self._run(self.tracker.add_many, list(items))
+
+    async def get(self, short_ref):
+        return await self._run(lambda: list(self.tracker.get(short_ref)))
+
+    async def close(self):
+        close = getattr(self.tracker, 'close', None)
+        if close is not None:
+            await self._run(close)
+
+
+class AsyncBufferedTracker(AsyncTracker):
+    """Enfileira os acessos em memória e os registra em lotes, a partir de
+    uma *task* em segundo plano, por meio de `tracker.add_many`.
+
+    Equivalente a :class:`nurl.trackers.BufferedTracker`, com os mesmos
+    parâmetros. A *task* é iniciada no primeiro acesso, no *event loop*
+    corrente, e os acessos pendentes são registrados por :meth:`close`.
+
+    :param tracker: instância de :class:`AsyncTracker` a ser envolvida.
+    """
+    def __init__(self, tracker, max_batch=500, flush_interval=1.0,
+            max_queued=10000, overflow='drop_new'):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('unknown overflow policy "%s"' % overflow)
+
+        self.tracker = tracker
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_queued = max_queued
+        self.overflow = overflow
+
+        self.queue = deque()
+        self.flusher = None
+        self.wakeup = None
+        self.flush_lock = None
+        self.closed = False
+
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0
+
+    async def add(self, short_ref, access):
+        if self.closed:
+            await self.tracker.add(short_ref, access)
+            return
+
+        self._ensure_flusher()
+        if len(self.queue) >= self.max_queued:
+            self.dropped += 1
+            if self.overflow == 'drop_new':
+                LOGGER.warning('tracker queue is full, dropping access '
+                        'to "%s"', short_ref)
+                return
+            self.queue.popleft()
+            LOGGER.warning('tracker queue is full, dropping the oldest '
+                    'access')
+
+        self.queue.append((short_ref, access))
+        self.queued += 1
+        if len(self.queue) >= self.max_batch:
+            self.wakeup.set()
+
+    async def get(self, short_ref):
+        await self.flush()
+        return await self.tracker.get(short_ref)
+
+    async def flush(self):
+        """Registra imediatamente todos os acessos enfileirados.
+        """
+        if self.flush_lock is None:
+            self.flush_lock = asyncio.Lock()
+
+        async with self.flush_lock:
+            while self.queue:
+                size = min(len(self.queue), self.max_batch)
+                batch = [self.queue.popleft() for _ in range(size)]
+                try:
+                    count = await self.tracker.add_many(batch)
+                except Exception:
+                    LOGGER.exception('could not save %s access records',
+                            len(batch))
+                    count = 0
+
+                self.flushed += count
+                self.dropped += len(batch) - count
+
+    async def close(self):
+        """Interrompe a *task* em segundo plano e registra os acessos
+        pendentes. Acessos posteriores são registrados diretamente.
+        """
+        self.closed = True
+        flusher = self.flusher
+        if flusher is not None:
+            # a task é interrompida após o envio do lote corrente.
+            self.wakeup.set()
+            await flusher
+
+        await self.flush()
+        await self.tracker.close()
+
+    def stats(self):
+        """Contadores de acessos enfileirados, registrados e descartados.
+        """
+        return {'queued': self.queued, 'flushed': self.flushed,
+                'dropped': self.dropped, 'pending': len(self.queue)}
+
+    def _ensure_flusher(self):
+        if self.flusher is not None:
+            return
+
+        self.wakeup = asyncio.Event()
+        self.flusher = asyncio.ensure_future(self._run())
+        LOGGER.debug('started the tracker flusher task')
+
+    async def _run(self):
+        while not self.closed:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(),
+                        self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
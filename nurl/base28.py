@@ -1,8 +1,16 @@
+import os
 import string
+import random
 from random import randrange
 
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
 
-__all__ = ['generate_id', 'igenerate_id']
+
+__all__ = ['generate_id', 'igenerate_id', 'generate_ids', 'encode', 'decode',
+        'encode_many', 'decode_many', 'is_valid_ref', 'pack_ref', 'unpack_ref']
 
 
 BASE36 = string.digits + string.ascii_lowercase
@@ -10,25 +18,208 @@ BASE36 = string.digits + string.ascii_lowercase
 # sem 1l0, para evitar confusões na leitura
 BASE28 = ''.join(d for d in BASE36 if d not in '1l0aeiou')
 
+_DIGIT_SETS = {BASE28: frozenset(BASE28)}
+_INT_TRANSLATIONS = {}
+# maior comprimento cujos valores podem ser representados em `numpy.uint64`.
+_MAX_VECTORIZED_LENGTH = 13
+# tamanho máximo de cada lote de IDs produzidos por `igenerate_id`.
+_MAX_GENERATION_BATCH = 1024
+# os inteiros produzidos por `pack_ref` armazenam o comprimento da referência
+# nos bits mais significativos, para distinguir, por exemplo, '2' de '22'.
+_PACK_LENGTH_SHIFT = 59
+_PACK_VALUE_MASK = (1 << _PACK_LENGTH_SHIFT) - 1
+
+
+def _digit_set(digits):
+    try:
+        return _DIGIT_SETS[digits]
+    except KeyError:
+        return _DIGIT_SETS.setdefault(digits, frozenset(digits))
+
 
 def encode(n, digits):
     base = len(digits)
     s = []
     while n:
         n, d = divmod(n, base)
-        s.insert(0, digits[d])
+        s.append(digits[d])
     if s:
-        return ''.join(s)
+        return ''.join(reversed(s))
     else:
         return digits[0]
 
 
+def _int_translation(digits):
+    try:
+        return _INT_TRANSLATIONS[digits]
+    except KeyError:
+        table = str.maketrans(digits, BASE36[:len(digits)])
+        return _INT_TRANSLATIONS.setdefault(digits, table)
+
+
+def decode(s, digits=BASE28):
+    """Obtém o valor inteiro representado por `s`.
+    """
+    base = len(digits)
+    if 1 < base <= len(BASE36) and s and _digit_set(digits).issuperset(s):
+        # os dígitos são traduzidos para os aceitos por `int`.
+        return int(s.translate(_int_translation(digits)), base)
+
+    n = 0
+    for c in s:
+        d = digits.find(c)
+        if d < 0:
+            raise ValueError('invalid digit "%s"' % c)
+        n = n * base + d
+    return n
+
+
 def generate_id(length, digits=BASE28):
     arbitrary_value = randrange(len(digits) ** length)
     return encode(arbitrary_value, digits).rjust(length, digits[0])
 
 
 def igenerate_id(length, digits=BASE28):
+    # os IDs são produzidos em lotes crescentes, para que o custo de obter o
+    # primeiro ID permaneça baixo.
+    batch_size = 1
     while True:
-        yield generate_id(length, digits)
+        if batch_size == 1:
+            yield generate_id(length, digits)
+        else:
+            yield from generate_ids(batch_size, length, digits)
+        batch_size = min(batch_size * 2, _MAX_GENERATION_BATCH)
+
+
+def is_valid_ref(ref, length=None, digits=BASE28):
+    """Verifica se `ref` é composta apenas por dígitos de `digits` e,
+    opcionalmente, se possui o comprimento `length`.
+    """
+    if length is not None and len(ref) != length:
+        return False
+    return bool(ref) and _digit_set(digits).issuperset(ref)
+
+
+def pack_ref(ref, digits=BASE28):
+    """Representa a referência `ref` por meio de um inteiro sem sinal de 64
+    bits, que preserva o seu comprimento.
+
+    Levanta :class:`ValueError` caso `ref` não seja uma referência válida ou
+    seja longa demais para ser representada.
+    """
+    if not ref or len(ref) >= 32:
+        raise ValueError('cannot pack "%s"' % ref)
+
+    value = decode(ref, digits)  # levanta ValueError para dígitos inválidos
+    if value > _PACK_VALUE_MASK:
+        raise ValueError('cannot pack "%s"' % ref)
+    return (len(ref) << _PACK_LENGTH_SHIFT) | value
+
+
+def unpack_ref(packed, digits=BASE28):
+    """Obtém a referência representada pelo inteiro `packed`.
+    """
+    length = packed >> _PACK_LENGTH_SHIFT
+    value = packed & _PACK_VALUE_MASK
+    return encode(value, digits).rjust(length, digits[0])
+
+
+_rng = None
+_rng_pid = None
+
+
+def _get_rng():
+    """Gerador de números aleatórios do NumPy, reinicializado em cada
+    processo para que workers criados por `fork` não produzam os mesmos IDs.
+    """
+    global _rng, _rng_pid
+    pid = os.getpid()
+    if _rng_pid != pid:
+        _rng = numpy.random.default_rng()
+        _rng_pid = pid
+    return _rng
+
+
+def _use_numpy(length=None):
+    return (numpy is not None and hasattr(numpy.random, 'default_rng') and
+            (length is None or 0 < length <= _MAX_VECTORIZED_LENGTH))
+
+
+def _split(text, length):
+    return [text[i:i + length] for i in range(0, len(text), length)]
+
+
+def generate_ids(n, length, digits=BASE28):
+    """Produz uma lista de `n` IDs pseudo-aleatórios de comprimento `length`.
+    """
+    if n <= 0:
+        return []
+
+    if not _use_numpy(length):
+        return [''.join(random.choices(digits, k=length)) for _ in range(n)]
+
+    alphabet = numpy.frombuffer(digits.encode('ascii'), dtype=numpy.uint8)
+    indexes = _get_rng().integers(0, len(digits), size=n * length)
+    return _split(alphabet[indexes].tobytes().decode('ascii'), length)
+
+
+def encode_many(values, length, digits=BASE28):
+    """Representa cada inteiro de `values` por meio de `digits`, completando
+    à esquerda até o comprimento `length`.
+    """
+    values = list(values)
+    base = len(digits)
+    out_of_range = ValueError('values must be in the range [0, %s)'
+            % base ** length)
+    if not values:
+        return []
+
+    if not _use_numpy(length):
+        if any(v < 0 or v >= base ** length for v in values):
+            raise out_of_range
+        return [encode(v, digits).rjust(length, digits[0]) for v in values]
+
+    try:
+        remaining = numpy.array(values, dtype=numpy.uint64)
+    except OverflowError:
+        raise out_of_range from None
+    if (remaining >= numpy.uint64(base ** length)).any():
+        raise out_of_range
+
+    alphabet = numpy.frombuffer(digits.encode('ascii'), dtype=numpy.uint8)
+    columns = numpy.empty((len(values), length), dtype=numpy.uint8)
+    for col in range(length - 1, -1, -1):
+        remaining, indexes = numpy.divmod(remaining, numpy.uint64(base))
+        columns[:, col] = alphabet[indexes]
+    return _split(columns.tobytes().decode('ascii'), length)
+
+
+def decode_many(refs, digits=BASE28):
+    """Obtém os valores inteiros representados por cada item de `refs`.
+    """
+    refs = list(refs)
+    if not refs:
+        return []
+
+    length = len(refs[0])
+    if not _use_numpy(length) or any(len(ref) != length for ref in refs):
+        return [decode(ref, digits) for ref in refs]
+
+    try:
+        raw = ''.join(refs).encode('ascii')
+    except UnicodeEncodeError:
+        raise ValueError('refs must contain only valid digits') from None
+
+    table = numpy.full(256, 255, dtype=numpy.uint8)
+    table[numpy.frombuffer(digits.encode('ascii'), dtype=numpy.uint8)] = (
+            numpy.arange(len(digits), dtype=numpy.uint8))
+    columns = table[numpy.frombuffer(raw, dtype=numpy.uint8)].reshape(
+            len(refs), length)
+    if (columns == 255).any():
+        raise ValueError('refs must contain only valid digits')
 
+    base = numpy.uint64(len(digits))
+    values = numpy.zeros(len(refs), dtype=numpy.uint64)
+    for col in range(length):
+        values = values * base + columns[:, col]
+    return values.tolist()
@@ -0,0 +1,116 @@
+"""Filtro de Bloom para testes de pertinência de referências curtas.
+
+O filtro responde se uma chave *possivelmente* pertence ao conjunto ou se
+*certamente* não pertence, permitindo descartar consultas a chaves
+inexistentes sem acessar a base de dados.
+"""
+import os
+import math
+import struct
+import hashlib
+import tempfile
+import threading
+
+
+__all__ = ['BloomFilter']
+
+
+MAGIC = b'NURLBLM1'
+HEADER = struct.Struct('<8sQQQQ')
+
+
+class BloomFilter:
+    """Filtro de Bloom dimensionado para `capacity` chaves com taxa de falsos
+    positivos `error_rate`.
+
+    As inclusões são serializadas por meio de um lock; as consultas não
+    bloqueiam.
+
+    :param capacity: quantidade de chaves prevista.
+    :param error_rate: (opcional) taxa de falsos positivos desejada.
+    """
+    def __init__(self, capacity, error_rate=0.001):
+        if capacity < 1:
+            raise ValueError('capacity must be a positive integer')
+        if not 0 < error_rate < 1:
+            raise ValueError('error_rate must be between 0 and 1')
+
+        nbits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        nhashes = max(1, round(nbits / capacity * math.log(2)))
+        self._setup(nbits, nhashes, bytearray((nbits + 7) // 8), 0, capacity)
+
+    def _setup(self, nbits, nhashes, bits, count, capacity):
+        self.nbits = nbits
+        self.nhashes = nhashes
+        self.bits = bits
+        self.count = count
+        self.capacity = capacity
+        self.lock = threading.Lock()
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = struct.unpack('<QQ', digest)
+        return [(h1 + i * h2) % self.nbits for i in range(self.nhashes)]
+
+    def add(self, key):
+        positions = self._positions(key)
+        with self.lock:
+            is_new = False
+            for pos in positions:
+                mask = 1 << (pos & 7)
+                if not self.bits[pos >> 3] & mask:
+                    self.bits[pos >> 3] |= mask
+                    is_new = True
+            if is_new:
+                self.count += 1
+
+    def update(self, keys):
+        for key in keys:
+            self.add(key)
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7))
+                   for pos in self._positions(key))
+
+    def __len__(self):
+        """Quantidade aproximada de chaves incluídas.
+        """
+        return self.count
+
+    def save(self, path):
+        """Grava o filtro em `path` de maneira atômica.
+        """
+        dirname = os.path.dirname(os.path.abspath(path))
+        with self.lock:
+            header = HEADER.pack(MAGIC, self.nbits, self.nhashes, self.count,
+                    self.capacity)
+            bits = bytes(self.bits)
+
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.bloom-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(header)
+                tmp.write(bits)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """Carrega o filtro previamente gravado em `path`.
+        """
+        with open(path, 'rb') as f:
+            magic, nbits, nhashes, count, capacity = HEADER.unpack(
+                    f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError('"%s" is not a bloom filter file' % path)
+            bits = bytearray(f.read())
+
+        if len(bits) != (nbits + 7) // 8:
+            raise ValueError('"%s" is truncated' % path)
+
+        instance = cls.__new__(cls)
+        instance._setup(nbits, nhashes, bits, count, capacity)
+        return instance
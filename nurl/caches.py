@@ -0,0 +1,73 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+__all__ = ['LRUCache']
+
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Cache LRU limitado, com tempo de vida opcional para cada entrada.
+
+    É seguro para uso por múltiplas threads.
+
+    :param maxsize: número máximo de entradas mantidas no cache.
+    :param ttl: (opcional) tempo de vida, em segundos, de cada entrada. O
+                valor `None` desliga a expiração.
+    :param clock: (opcional) função que retorna o tempo corrente em segundos.
+    """
+    def __init__(self, maxsize, ttl=None, clock=time.monotonic):
+        if maxsize < 1:
+            raise ValueError('maxsize must be a positive integer')
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= self.clock():
+                del self.data[key]
+                self.evictions += 1
+                self.misses += 1
+                return default
+
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires_at = self.clock() + self.ttl if self.ttl else None
+        with self.lock:
+            self.data[key] = (value, expires_at)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'size': len(self.data),
+                'maxsize': self.maxsize}
+
+    def __len__(self):
+        return len(self.data)
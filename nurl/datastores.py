@@ -1,17 +1,37 @@
 import abc
+import time
+import bisect
+import hashlib
+import sqlite3
 import threading
 import logging
+from array import array
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional, Dict
 
+import bson
 import pymongo
 
+from .caches import LRUCache
+from . import base28
+from .sqlite import ConnectionPool
+
 
 __all__ = ['InMemoryDataStore', 'DuplicatedKeyError', 'DuplicatedValueError',
-        'MongoDBDataStore']
+        'PlainHashCollisionError',
+        'MongoDBDataStore', 'CachingDataStore', 'BloomFilteredDataStore',
+        'CompactInMemoryDataStore', 'StripedInMemoryDataStore',
+        'SQLiteDataStore', 'SnapshotDataStore']
 
 
 LOGGER = logging.getLogger(__name__)
 
 
+DEFAULT_CACHE_MAXSIZE = 100000
+DUPLICATE_KEY_CODES = (11000, 11001)
+
+
 class DuplicatedKeyError(Exception):
     pass
 
@@ -20,6 +40,12 @@ class DuplicatedValueError(Exception):
     pass
 
 
+class PlainHashCollisionError(DuplicatedValueError):
+    """O resumo de 64 bits da URL (:func:`plain_hash`) coincide com o de
+    outra URL já armazenada, e por isso a URL não pode ser armazenada.
+    """
+
+
 class DataStore(metaclass=abc.ABCMeta):
     """Armazena pares chave-valor.
 
@@ -41,6 +67,52 @@ class DataStore(metaclass=abc.ABCMeta):
     def key(self, url: str) -> str:
         return NotImplemented
 
+    def keys(self, since: Optional[datetime] = None) -> Iterable[str]:
+        """Produz todas as chaves armazenadas ou, opcionalmente, apenas as
+        armazenadas a partir de `since` (UTC). Implementações podem produzir
+        chaves anteriores a `since`.
+        """
+        raise NotImplementedError()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Obtém os valores de diversas chaves de uma só vez. As chaves não
+        armazenadas são omitidas do resultado.
+        """
+        result = {}
+        for key in keys:
+            try:
+                result[key] = self[key]
+            except KeyError:
+                pass
+        return result
+
+    def key_many(self, urls: Iterable[str]) -> Dict[str, str]:
+        """Obtém as chaves de diversas URLs de uma só vez. As URLs não
+        armazenadas são omitidas do resultado.
+        """
+        result = {}
+        for url in urls:
+            try:
+                result[url] = self.key(url)
+            except KeyError:
+                pass
+        return result
+
+    def set_many(self, pairs: Dict[str, str]) -> Dict[str, Exception]:
+        """Armazena diversos pares chave-valor de uma só vez.
+
+        Retorna as chaves dos pares que não puderam ser armazenados,
+        associadas às respectivas exceções :class:`DuplicatedKeyError` ou
+        :class:`DuplicatedValueError`.
+        """
+        failures = {}
+        for key, value in pairs.items():
+            try:
+                self[key] = value
+            except (DuplicatedKeyError, DuplicatedValueError) as exc:
+                failures[key] = exc
+        return failures
+
 
 class InMemoryDataStore(DataStore):
     def __init__(self, initial=None):
@@ -68,21 +140,387 @@ class InMemoryDataStore(DataStore):
     def key(self, url):
         return self.revdata[url]
 
+    def keys(self, since=None):
+        return iter(list(self.data))
+
+    def get_many(self, keys):
+        return {key: self.data[key] for key in keys if key in self.data}
+
+
+DEFAULT_STRIPES = 16
+
+
+class StripedInMemoryDataStore(DataStore):
+    """Armazena os pares chave-valor em memória, com bloqueios distribuídos
+    entre `stripes` partições.
+
+    Cada chave pertence à partição definida pelo seu *hash*, e cada valor à
+    partição definida pelo *hash* do valor. A inclusão de um par bloqueia
+    apenas as partições da chave e do valor, sempre na mesma ordem, de modo
+    que a unicidade de ambos é garantida mesmo quando pertencem a partições
+    distintas. As consultas nunca bloqueiam: cada operação em `dict` é
+    atômica no CPython, e uma consulta concorrente a uma inclusão pode
+    apenas deixar de encontrar o par que está sendo incluído.
+
+    :param initial: (opcional) dicionário de pares chave-valor iniciais.
+    :param stripes: (opcional) quantidade de partições.
+    """
+    def __init__(self, initial=None, stripes=DEFAULT_STRIPES):
+        if stripes < 1:
+            raise ValueError('stripes must be greater than 0')
+
+        self.stripes = stripes
+        self.data = [{} for _ in range(stripes)]
+        self.revdata = [{} for _ in range(stripes)]
+        self.locks = [threading.Lock() for _ in range(stripes)]
+        self.contended = [0] * stripes
+
+        if initial:
+            for k, v in initial.items():
+                self[k] = v
+
+    def _stripe(self, obj):
+        return hash(obj) % self.stripes
+
+    def _acquire(self, stripe):
+        lock = self.locks[stripe]
+        if not lock.acquire(blocking=False):
+            lock.acquire()
+            self.contended[stripe] += 1
+
+    def __setitem__(self, key, value):
+        key_stripe = self._stripe(key)
+        value_stripe = self._stripe(value)
+        stripes = sorted({key_stripe, value_stripe})
+        for stripe in stripes:
+            self._acquire(stripe)
+        try:
+            if key in self.data[key_stripe]:
+                raise DuplicatedKeyError()
+            elif value in self.revdata[value_stripe]:
+                raise DuplicatedValueError()
+            else:
+                self.data[key_stripe][key] = value
+                self.revdata[value_stripe][value] = key
+        finally:
+            for stripe in reversed(stripes):
+                self.locks[stripe].release()
+
+    def __getitem__(self, key):
+        return self.data[hash(key) % self.stripes][key]
+
+    def __len__(self):
+        return sum(len(data) for data in self.data)
+
+    def key(self, url):
+        return self.revdata[hash(url) % self.stripes][url]
+
+    def keys(self, since=None):
+        return iter([key for data in self.data for key in list(data)])
+
+    def get_many(self, keys):
+        result = {}
+        for key in keys:
+            value = self.data[self._stripe(key)].get(key)
+            if value is not None:
+                result[key] = value
+        return result
+
+    def stats(self):
+        """Quantidade de pares e de bloqueios que precisaram aguardar.
+        """
+        return {'stripes': self.stripes,
+                'size': len(self),
+                'contended': sum(self.contended)}
+
+
+_CompactIndex = namedtuple('_CompactIndex', 'keys key_entries digests '
+        'digest_entries')
+_NOT_PACKED = 0  # `base28.pack_ref` nunca produz 0
+
+
+def _url_digest(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(),
+            'little')
+
+
+class CompactInMemoryDataStore(DataStore):
+    """Armazena os pares chave-valor em memória, em uma representação
+    compacta.
+
+    As chaves no formato das referências curtas são representadas por
+    inteiros (:func:`nurl.base28.pack_ref`) e indexadas em arrays ordenados;
+    as URLs são concatenadas em um único `bytearray`, delimitadas por um
+    array de posições, e indexadas pelos seus resumos de 64 bits. As chaves
+    em outros formatos são mantidas em um dicionário auxiliar.
+
+    As inclusões são acumuladas em dicionários pendentes e incorporadas aos
+    arrays ordenados em lote, sempre que excedem `merge_threshold` ou um
+    oitavo do tamanho do índice. As consultas não bloqueiam.
+
+    :param initial: (opcional) dicionário de pares chave-valor iniciais.
+    :param merge_threshold: (opcional) quantidade mínima de inclusões
+                            pendentes para a incorporação ao índice.
+    """
+    def __init__(self, initial=None, merge_threshold=4096):
+        self.merge_threshold = merge_threshold
+        self.lock = threading.Lock()
+
+        self.arena = bytearray()
+        self.offsets = array('Q', [0])
+        self.entry_refs = array('Q')
+        self.index = _CompactIndex(array('Q'), array('I'), array('Q'),
+                array('I'))
+        self.pending_keys = {}
+        self.pending_digests = {}
+        self.odd_keys = {}
+        self.odd_refs = {}
+
+        if initial:
+            for k, v in initial.items():
+                self[k] = v
+
+    def __len__(self):
+        return len(self.entry_refs)
+
+    def _url(self, entry):
+        return self.arena[self.offsets[entry]:self.offsets[entry + 1]]
+
+    def _ref(self, entry):
+        packed = self.entry_refs[entry]
+        if packed == _NOT_PACKED:
+            return self.odd_refs[entry]
+        return base28.unpack_ref(packed)
+
+    @staticmethod
+    def _pack(key):
+        try:
+            return base28.pack_ref(key)
+        except ValueError:
+            return _NOT_PACKED
+
+    def _find_key(self, key, packed):
+        if packed == _NOT_PACKED:
+            return self.odd_keys.get(key)
+
+        # os pendentes são consultados antes do índice, que é substituído
+        # antes deles durante a incorporação.
+        entry = self.pending_keys.get(packed)
+        if entry is not None:
+            return entry
+
+        index = self.index
+        pos = bisect.bisect_left(index.keys, packed)
+        if pos < len(index.keys) and index.keys[pos] == packed:
+            return index.key_entries[pos]
+        return None
+
+    def _find_url(self, data, digest):
+        entry = self.pending_digests.get(digest)
+        if entry is not None and self._url(entry) == data:
+            return entry
+
+        index = self.index
+        pos = bisect.bisect_left(index.digests, digest)
+        while pos < len(index.digests) and index.digests[pos] == digest:
+            entry = index.digest_entries[pos]
+            if self._url(entry) == data:
+                return entry
+            pos += 1
+        return None
+
+    def __setitem__(self, key, value):
+        data = value.encode('utf-8')
+        digest = _url_digest(data)
+        packed = self._pack(key)
+
+        with self.lock:
+            if self._find_key(key, packed) is not None:
+                raise DuplicatedKeyError()
+            elif self._find_url(data, digest) is not None:
+                raise DuplicatedValueError()
+
+            if digest in self.pending_digests:
+                # colisão de resumos entre URLs distintas: o índice ordenado
+                # admite resumos repetidos.
+                self._merge()
+
+            entry = len(self.entry_refs)
+            self.arena.extend(data)
+            self.offsets.append(len(self.arena))
+            self.entry_refs.append(packed)
+
+            if packed == _NOT_PACKED:
+                self.odd_refs[entry] = key
+                self.odd_keys[key] = entry
+            else:
+                self.pending_keys[packed] = entry
+            self.pending_digests[digest] = entry
+
+            if len(self.pending_digests) >= max(self.merge_threshold,
+                                                len(self.index.digests) // 8):
+                self._merge()
+
+    @staticmethod
+    def _merged(values, entries, pending):
+        values = values.tolist()
+        entries = entries.tolist()
+        values.extend(pending.keys())
+        entries.extend(pending.values())
+        order = sorted(range(len(values)), key=values.__getitem__)
+        return (array('Q', map(values.__getitem__, order)),
+                array('I', map(entries.__getitem__, order)))
+
+    def _merge(self):
+        """Incorpora as inclusões pendentes aos arrays ordenados.
+        """
+        index = self.index
+        keys, key_entries = self._merged(index.keys, index.key_entries,
+                self.pending_keys)
+        digests, digest_entries = self._merged(index.digests,
+                index.digest_entries, self.pending_digests)
+
+        self.index = _CompactIndex(keys, key_entries, digests, digest_entries)
+        self.pending_keys = {}
+        self.pending_digests = {}
+
+    def compact(self):
+        """Incorpora imediatamente as inclusões pendentes aos arrays
+        ordenados.
+        """
+        with self.lock:
+            if self.pending_digests:
+                self._merge()
+
+    def __getitem__(self, key):
+        entry = self._find_key(key, self._pack(key))
+        if entry is None:
+            raise KeyError(key)
+        return self._url(entry).decode('utf-8')
+
+    def key(self, url):
+        data = url.encode('utf-8')
+        entry = self._find_url(data, _url_digest(data))
+        if entry is None:
+            raise KeyError(url)
+        return self._ref(entry)
+
+    def keys(self, since=None):
+        return (self._ref(entry) for entry in range(len(self.entry_refs)))
+
+    def memory_usage(self):
+        """Quantidade aproximada de bytes ocupados pelos arrays.
+        """
+        index = self.index
+        buffers = [self.arena, self.offsets, self.entry_refs] + list(index)
+        return sum(len(buf) * getattr(buf, 'itemsize', 1) for buf in buffers)
+
+
+def plain_hash(url):
+    """Resumo de 64 bits da URL `url`. O valor possui sinal para que seja
+    armazenado como inteiro de 64 bits no MongoDB e no SQLite.
+    """
+    digest = hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+def duplicated_value_error(value, stored):
+    """Exceção correspondente à violação da unicidade do resumo de `value`,
+    em que `stored` é a URL armazenada com o mesmo resumo.
+    """
+    if stored is not None and stored != value:
+        LOGGER.error('the plain_hash of "%s" collides with the one of "%s"',
+                value, stored)
+        return PlainHashCollisionError()
+    else:
+        return DuplicatedValueError()
+
+
+MONGODB_PAIR_PROJECTION = {'plain': True, 'short_ref': True, '_id': False}
+
+
+def mongodb_record(key, value):
+    """Documento do MongoDB correspondente ao par `key`-`value`.
+    """
+    return {'plain': value, 'plain_hash': plain_hash(value), 'short_ref': key}
+
+
+def mongodb_key_query(url):
+    """Consulta pelo documento da URL `url`, por meio do seu resumo.
+    """
+    return {'plain_hash': plain_hash(url), 'plain': url}
+
+
+def mongodb_key_many_query(urls):
+    """Consulta pelos documentos das URLs `urls`, por meio dos seus resumos.
+    Como os resumos podem colidir, os documentos obtidos devem ser filtrados
+    pelo texto das URLs.
+    """
+    return {'plain_hash': {'$in': [plain_hash(url) for url in urls]}}
+
+
+def mongodb_stored_value_query(value):
+    """Consulta pelo documento que ocupa o resumo de `value`, utilizada na
+    produção de :func:`duplicated_value_error`.
+    """
+    return {'plain_hash': plain_hash(value)}
+
+
+def is_duplicated_value(errmsg):
+    """Indica se a violação de unicidade descrita por `errmsg` se refere à
+    URL, e não à chave.
+    """
+    return 'plain' in errmsg
+
+
+def mongodb_bulk_failures(exc, keys):
+    """Classifica os erros de escrita de `exc`, instância de
+    `pymongo.errors.BulkWriteError`, produzida pela inserção dos documentos
+    das chaves `keys`, nesta ordem. Retorna o par `(failures, duplicated)`,
+    em que `failures` associa às chaves duplicadas instâncias de
+    :class:`DuplicatedKeyError` e `duplicated` é a lista das chaves cujas
+    URLs já estavam armazenadas. Relança `exc` caso algum erro não se refira
+    à unicidade.
+    """
+    failures = {}
+    duplicated = []
+    for error in exc.details.get('writeErrors', []):
+        if error.get('code') not in DUPLICATE_KEY_CODES:
+            raise exc
+        key = keys[error['index']]
+        if is_duplicated_value(error.get('errmsg', '')):
+            duplicated.append(key)
+        else:
+            failures[key] = DuplicatedKeyError()
+    return failures, duplicated
+
 
 class MongoDBDataStore(DataStore):
+    """Armazena os pares chave-valor em uma coleção do MongoDB.
+
+    A unicidade das URLs é garantida por meio de um índice sobre o resumo de
+    64 bits de cada uma (:func:`plain_hash`), e não sobre o próprio texto;
+    as consultas por URL utilizam o resumo e confirmam o texto. As coleções
+    criadas por versões anteriores devem ser migradas por meio de
+    ``nurl-manage backfill-plain-hash``.
+
+    Os índices requeridos, em :data:`nurl.mongodb.DATA_INDEXES`, são criados
+    por meio de ``nurl-manage create-indexes``.
+    """
     def __init__(self, collection):
         self.collection = collection
 
-        self.collection.create_index('short_ref', unique=True)
-        self.collection.create_index('plain', unique=True)
+    def _duplicated_value(self, value):
+        record = self.collection.find_one(mongodb_stored_value_query(value),
+                projection={'plain': True, '_id': False})
+        return duplicated_value_error(value, record and record['plain'])
 
     def __setitem__(self, key, value):
-        record = {'plain': value, 'short_ref': key}
         try:
-            _ = self.collection.insert_one(record)
+            _ = self.collection.insert_one(mongodb_record(key, value))
         except pymongo.errors.DuplicateKeyError as exc:
-            if 'plain' in str(exc):
-                raise DuplicatedValueError() from None
+            if is_duplicated_value(str(exc)):
+                raise self._duplicated_value(value) from None
             else:
                 raise DuplicatedKeyError() from None
 
@@ -94,9 +532,501 @@ class MongoDBDataStore(DataStore):
             return record['plain']
 
     def key(self, url):
-        record = self.collection.find_one({'plain': url})
+        record = self.collection.find_one(mongodb_key_query(url))
         if record is None:
             raise KeyError()
         else:
             return record['short_ref']
 
+    def keys(self, since=None):
+        query = {}
+        if since is not None:
+            query['_id'] = {'$gte': bson.ObjectId.from_datetime(since)}
+
+        records = self.collection.find(query,
+                projection={'short_ref': True, '_id': False})
+        for rec in records:
+            yield rec['short_ref']
+
+    def get_many(self, keys):
+        records = self.collection.find({'short_ref': {'$in': list(keys)}},
+                projection=MONGODB_PAIR_PROJECTION)
+        return {rec['short_ref']: rec['plain'] for rec in records}
+
+    def key_many(self, urls):
+        urls = set(urls)
+        records = self.collection.find(mongodb_key_many_query(urls),
+                projection=MONGODB_PAIR_PROJECTION)
+        return {rec['plain']: rec['short_ref'] for rec in records
+                if rec['plain'] in urls}
+
+    def set_many(self, pairs):
+        keys = list(pairs)
+        if not keys:
+            return {}
+
+        try:
+            _ = self.collection.insert_many(
+                    [mongodb_record(key, pairs[key]) for key in keys],
+                    ordered=False)
+        except pymongo.errors.BulkWriteError as exc:
+            failures, duplicated = mongodb_bulk_failures(exc, keys)
+            for key in duplicated:
+                failures[key] = self._duplicated_value(pairs[key])
+            return failures
+        else:
+            return {}
+
+
+# quantidade máxima de parâmetros por comando nas versões antigas do SQLite.
+SQLITE_MAX_VARIABLES = 999
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    id INTEGER PRIMARY KEY,
+    short_ref TEXT NOT NULL,
+    plain TEXT NOT NULL,
+    plain_hash INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS urls_short_ref ON urls (short_ref);
+CREATE UNIQUE INDEX IF NOT EXISTS urls_plain_hash ON urls (plain_hash);
+CREATE INDEX IF NOT EXISTS urls_created_at ON urls (created_at);
+"""
+
+
+class SQLiteDataStore(DataStore):
+    """Armazena os pares chave-valor em uma base de dados SQLite.
+
+    A unicidade das URLs é garantida por meio de um índice sobre o resumo de
+    64 bits de cada uma (:func:`plain_hash`), e não sobre o próprio texto.
+
+    :param path: caminho do arquivo da base de dados, ou instância de
+                 :class:`nurl.sqlite.ConnectionPool`.
+    """
+    INSERT = ('INSERT INTO urls (short_ref, plain, plain_hash, created_at) '
+              'VALUES (?, ?, ?, ?)')
+
+    def __init__(self, path):
+        self.pool = path if isinstance(path, ConnectionPool) \
+                else ConnectionPool(path)
+        self.pool.executescript(SQLITE_SCHEMA)
+
+    @staticmethod
+    def _duplicated(conn, key, value, exc):
+        # a ordem em que o SQLite verifica os índices não é definida, e a
+        # duplicidade da chave tem precedência.
+        if 'plain_hash' in str(exc) and conn.execute(
+                'SELECT 1 FROM urls WHERE short_ref = ?', (key,)
+                ).fetchone() is None:
+            row = conn.execute('SELECT plain FROM urls WHERE plain_hash = ?',
+                    (plain_hash(value),)).fetchone()
+            return duplicated_value_error(value, row and row[0])
+        else:
+            return DuplicatedKeyError()
+
+    def __setitem__(self, key, value):
+        conn = self.pool.connection
+        try:
+            with self.pool.transaction():
+                conn.execute(self.INSERT,
+                        (key, value, plain_hash(value), time.time()))
+        except sqlite3.IntegrityError as exc:
+            raise self._duplicated(conn, key, value, exc) from None
+
+    def __getitem__(self, key):
+        row = self.pool.connection.execute(
+                'SELECT plain FROM urls WHERE short_ref = ?', (key,)).fetchone()
+        if row is None:
+            raise KeyError()
+        else:
+            return row[0]
+
+    def key(self, url):
+        row = self.pool.connection.execute(
+                'SELECT short_ref FROM urls WHERE plain_hash = ? AND plain = ?',
+                (plain_hash(url), url)).fetchone()
+        if row is None:
+            raise KeyError()
+        else:
+            return row[0]
+
+    def keys(self, since=None):
+        if since is None:
+            rows = self.pool.connection.execute('SELECT short_ref FROM urls')
+        else:
+            timestamp = since.replace(tzinfo=timezone.utc).timestamp()
+            rows = self.pool.connection.execute(
+                    'SELECT short_ref FROM urls WHERE created_at >= ?',
+                    (timestamp,))
+        for row in rows:
+            yield row[0]
+
+    def get_many(self, keys):
+        result = {}
+        conn = self.pool.connection
+        for chunk in _chunks(list(keys), SQLITE_MAX_VARIABLES):
+            rows = conn.execute('SELECT short_ref, plain FROM urls '
+                    'WHERE short_ref IN (%s)' % ','.join('?' * len(chunk)),
+                    chunk)
+            result.update(rows)
+        return result
+
+    def key_many(self, urls):
+        result = {}
+        conn = self.pool.connection
+        for chunk in _chunks(list(set(urls)), SQLITE_MAX_VARIABLES):
+            rows = conn.execute('SELECT plain, short_ref FROM urls '
+                    'WHERE plain_hash IN (%s)' % ','.join('?' * len(chunk)),
+                    [plain_hash(url) for url in chunk])
+            wanted = set(chunk)
+            result.update((plain, short_ref) for plain, short_ref in rows
+                          if plain in wanted)
+        return result
+
+    def set_many(self, pairs):
+        failures = {}
+        now = time.time()
+        with self.pool.transaction() as conn:
+            # uma violação de restrição desfaz apenas o próprio comando.
+            for key, value in pairs.items():
+                try:
+                    conn.execute(self.INSERT,
+                            (key, value, plain_hash(value), now))
+                except sqlite3.IntegrityError as exc:
+                    failures[key] = self._duplicated(conn, key, value, exc)
+        return failures
+
+    def close(self):
+        self.pool.close()
+
+
+class CachedPairs:
+    """Caches LRU dos pares chave-valor, por chave e por URL, compartilhados
+    por :class:`CachingDataStore` e
+    :class:`nurl.aio.datastores.AsyncCachingDataStore`, que se limitam ao
+    acesso ao `store` envolvido.
+    """
+    def __init__(self, maxsize=DEFAULT_CACHE_MAXSIZE, ttl=None):
+        self.value_cache = LRUCache(maxsize, ttl)
+        self.key_cache = LRUCache(maxsize, ttl)
+
+    def _remember(self, key, value):
+        self.value_cache.set(key, value)
+        self.key_cache.set(value, key)
+
+    def _remember_stored(self, pairs, failures):
+        for key, value in pairs.items():
+            if key not in failures:
+                self._remember(key, value)
+
+    @staticmethod
+    def _cached(cache, items):
+        """Retorna o par `(result, missing)`, em que `result` associa os
+        itens de `items` presentes em `cache` aos seus valores e `missing` é
+        a lista dos demais.
+        """
+        result = {}
+        missing = []
+        for item in items:
+            value = cache.get(item)
+            if value is None:
+                missing.append(item)
+            else:
+                result[item] = value
+        return result, missing
+
+    @staticmethod
+    def _fill(cache, result, found):
+        for item, value in found.items():
+            cache.set(item, value)
+        result.update(found)
+
+    def stats(self):
+        """Contadores de acertos, ausências e remoções de cada cache.
+        """
+        return {'values': self.value_cache.stats(),
+                'keys': self.key_cache.stats()}
+
+
+class CachingDataStore(CachedPairs, DataStore):
+    """Cache de leitura à frente de outra instância de :class:`DataStore`.
+
+    Como os pares chave-valor nunca são alterados após armazenados, as
+    consultas por `__getitem__` e `key` são servidas a partir de caches LRU
+    e apenas as ausências são encaminhadas ao `store`. Ausências não são
+    armazenadas em cache.
+
+    :param store: instância de :class:`DataStore` a ser envolvida.
+    :param maxsize: (opcional) número máximo de entradas em cada um dos caches.
+    :param ttl: (opcional) tempo de vida, em segundos, de cada entrada. O
+                valor `None` desliga a expiração.
+    """
+    def __init__(self, store, maxsize=DEFAULT_CACHE_MAXSIZE, ttl=None):
+        super().__init__(maxsize, ttl)
+        self.store = store
+
+    def __setitem__(self, key, value):
+        self.store[key] = value
+        self._remember(key, value)
+
+    def __getitem__(self, key):
+        value = self.value_cache.get(key)
+        if value is None:
+            value = self.store[key]
+            self.value_cache.set(key, value)
+        return value
+
+    def key(self, url):
+        key = self.key_cache.get(url)
+        if key is None:
+            key = self.store.key(url)
+            self.key_cache.set(url, key)
+        return key
+
+    def keys(self, since=None):
+        return self.store.keys(since=since)
+
+    def get_many(self, keys):
+        result, missing = self._cached(self.value_cache, keys)
+        if missing:
+            self._fill(self.value_cache, result, self.store.get_many(missing))
+        return result
+
+    def key_many(self, urls):
+        result, missing = self._cached(self.key_cache, urls)
+        if missing:
+            self._fill(self.key_cache, result, self.store.key_many(missing))
+        return result
+
+    def set_many(self, pairs):
+        failures = self.store.set_many(pairs)
+        self._remember_stored(pairs, failures)
+        return failures
+
+
+class BloomFilteredDataStore(DataStore):
+    """Descarta consultas a chaves inexistentes sem acessar o `store`.
+
+    As chaves cujo formato é incompatível com as referências curtas resultam
+    em :class:`KeyError` imediatamente. As chaves que não constam no filtro
+    de Bloom `bloom` podem ter sido armazenadas por outros processos e, por
+    isso, o filtro é atualizado antes que a chave seja considerada
+    inexistente. As consultas simultâneas aguardam e compartilham a mesma
+    atualização.
+
+    O filtro é populado na primeira consulta de cada processo, e não na
+    criação da instância, que pode ocorrer antes do `fork` dos workers.
+
+    :param store: instância de :class:`DataStore` a ser envolvida.
+    :param bloom: instância de :class:`nurl.bloom.BloomFilter`.
+    :param ref_lengths: (opcional) coleção dos comprimentos válidos das
+                        chaves. O valor `None` desliga a verificação.
+    :param synced_at: (opcional) data e hora (UTC) da última sincronização
+                      entre `bloom` e `store`. O valor `None` indica que o
+                      filtro ainda não foi populado.
+    :param path: (opcional) arquivo no qual o filtro é gravado após ser
+                 populado.
+    """
+    # margem para as diferenças entre os relógios dos hosts, já que o
+    # ObjectId é gerado pelo cliente do MongoDB.
+    CLOCK_SKEW = timedelta(seconds=60)
+
+    def __init__(self, store, bloom, ref_lengths=None, synced_at=None,
+            path=None):
+        self.store = store
+        self.bloom = bloom
+        self.ref_lengths = frozenset(ref_lengths) if ref_lengths else None
+        self.synced_at = synced_at
+        self.path = path
+        self.refresh_started = None
+        self.refresh_lock = threading.Lock()
+
+        self.rejected = 0
+        self.filtered = 0
+        self.refreshes = 0
+
+    def is_valid_ref(self, key):
+        if self.ref_lengths is not None and len(key) not in self.ref_lengths:
+            return False
+        return base28.is_valid_ref(key)
+
+    def refresh(self):
+        """Inclui no filtro as chaves armazenadas desde a última
+        sincronização.
+        """
+        with self.refresh_lock:
+            self._refresh()
+
+    def _refresh(self):
+        self.refresh_started = time.monotonic()
+        now = datetime.utcnow()
+        populated = self.synced_at is not None
+        since = self.synced_at - self.CLOCK_SKEW if populated else None
+        self.bloom.update(self.store.keys(since=since))
+        self.synced_at = now
+        self.refreshes += 1
+
+        if not populated:
+            LOGGER.info('the bloom filter holds %s short refs',
+                    len(self.bloom))
+            if self.path:
+                self.bloom.save(self.path)
+                LOGGER.info('saved the bloom filter to "%s"', self.path)
+
+        if self.bloom.capacity and len(self.bloom) > self.bloom.capacity:
+            LOGGER.warning('the bloom filter holds %s keys, which exceeds '
+                    'its capacity of %s', len(self.bloom), self.bloom.capacity)
+
+    def _refresh_after(self, moment):
+        """Garante que o filtro inclua as chaves armazenadas até `moment`,
+        instante obtido por meio de `time.monotonic`. Uma atualização
+        iniciada após `moment` por outra thread é aproveitada.
+        """
+        with self.refresh_lock:
+            if (self.refresh_started is not None and
+                    self.refresh_started >= moment):
+                return
+            self._refresh()
+
+    def __setitem__(self, key, value):
+        try:
+            self.store[key] = value
+        except DuplicatedKeyError:
+            self.bloom.add(key)
+            raise
+        else:
+            self.bloom.add(key)
+
+    def _might_exist(self, key):
+        if not self.is_valid_ref(key):
+            self.rejected += 1
+            return False
+
+        if self.synced_at is not None and key in self.bloom:
+            return True
+
+        self._refresh_after(time.monotonic())
+        if key not in self.bloom:
+            self.filtered += 1
+            return False
+
+        return True
+
+    def __getitem__(self, key):
+        if not self._might_exist(key):
+            raise KeyError(key)
+
+        return self.store[key]
+
+    def get_many(self, keys):
+        candidates = [key for key in keys if self._might_exist(key)]
+        return self.store.get_many(candidates) if candidates else {}
+
+    def key(self, url):
+        return self.store.key(url)
+
+    def keys(self, since=None):
+        return self.store.keys(since=since)
+
+    def key_many(self, urls):
+        return self.store.key_many(urls)
+
+    def set_many(self, pairs):
+        failures = self.store.set_many(pairs)
+        for key in pairs:
+            if not isinstance(failures.get(key), DuplicatedValueError):
+                self.bloom.add(key)
+        return failures
+
+    def stats(self):
+        """Contadores de chaves rejeitadas por formato e descartadas pelo
+        filtro, e de atualizações do filtro.
+        """
+        return {'rejected': self.rejected, 'filtered': self.filtered,
+                'refreshes': self.refreshes, 'size': len(self.bloom)}
+
+
+class SnapshotDataStore(DataStore):
+    """Serve as consultas a partir de um instantâneo imutável e encaminha ao
+    `store` apenas as chaves e URLs ausentes no instantâneo, como as
+    armazenadas após a sua criação. As inclusões são sempre realizadas no
+    `store`, que deve conter também os pares do instantâneo para que a
+    unicidade seja garantida.
+
+    :param store: instância de :class:`DataStore` a ser envolvida.
+    :param snapshot: instância de :class:`nurl.snapshot.Snapshot`.
+    """
+    def __init__(self, store, snapshot):
+        self.store = store
+        self.snapshot = snapshot
+
+        self.hits = 0
+        self.misses = 0
+
+    def __setitem__(self, key, value):
+        self.store[key] = value
+
+    def __getitem__(self, key):
+        value = self.snapshot.get(key)
+        if value is None:
+            self.misses += 1
+            return self.store[key]
+        self.hits += 1
+        return value
+
+    def key(self, url):
+        key = self.snapshot.key(url)
+        if key is None:
+            self.misses += 1
+            return self.store.key(url)
+        self.hits += 1
+        return key
+
+    def keys(self, since=None):
+        return self.store.keys(since=since)
+
+    def get_many(self, keys):
+        result = {}
+        missing = []
+        for key in keys:
+            value = self.snapshot.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                result[key] = value
+        self.hits += len(result)
+        self.misses += len(missing)
+        if missing:
+            result.update(self.store.get_many(missing))
+        return result
+
+    def key_many(self, urls):
+        result = {}
+        missing = []
+        for url in urls:
+            key = self.snapshot.key(url)
+            if key is None:
+                missing.append(url)
+            else:
+                result[url] = key
+        self.hits += len(result)
+        self.misses += len(missing)
+        if missing:
+            result.update(self.store.key_many(missing))
+        return result
+
+    def set_many(self, pairs):
+        return self.store.set_many(pairs)
+
+    def stats(self):
+        """Consultas servidas pelo instantâneo e encaminhadas ao `store`.
+        """
+        return {'size': len(self.snapshot), 'hits': self.hits,
+                'misses': self.misses}
@@ -0,0 +1,333 @@
+"""Geradores de IDs.
+
+Em vez de sortear IDs e tratar as colisões, :class:`LeasedIdGenerator`
+reserva blocos de números sequenciais a partir de um contador compartilhado
+e mapeia cada número por meio de uma permutação do espaço de IDs, definida
+por uma chave secreta. Os IDs produzidos não são sequenciais nem
+adivinháveis, mas nunca se repetem.
+
+:class:`AdaptiveIdGenerator` sorteia IDs e aumenta o seu comprimento à medida
+que o espaço de IDs é ocupado.
+"""
+import abc
+import hashlib
+import threading
+import logging
+
+import pymongo
+
+from .sqlite import ConnectionPool
+
+from .base28 import BASE28, encode, generate_id
+
+
+__all__ = ['Sequence', 'InMemorySequence', 'MongoDBSequence',
+        'SQLiteSequence', 'FeistelPermutation', 'LeasedIdGenerator',
+        'AdaptiveIdGenerator', 'AdaptiveIds']
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Sequence(metaclass=abc.ABCMeta):
+    """Contador compartilhado a partir do qual são reservados blocos de
+    números sequenciais.
+    """
+    @abc.abstractmethod
+    def lease(self, name: str, size: int) -> int:
+        """Reserva `size` números do contador `name` e retorna o primeiro
+        número do bloco.
+        """
+        return NotImplemented
+
+
+class InMemorySequence(Sequence):
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def lease(self, name, size):
+        with self.lock:
+            start = self.data.get(name, 0)
+            self.data[name] = start + size
+            return start
+
+
+class MongoDBSequence(Sequence):
+    def __init__(self, collection):
+        self.collection = collection
+
+    def lease(self, name, size):
+        record = self.collection.find_one_and_update({'_id': name},
+                {'$inc': {'value': size}}, upsert=True,
+                return_document=pymongo.ReturnDocument.AFTER)
+        return record['value'] - size
+
+
+class SQLiteSequence(Sequence):
+    """:param path: caminho do arquivo da base de dados, ou instância de
+                    :class:`nurl.sqlite.ConnectionPool`.
+    """
+    def __init__(self, path):
+        self.pool = path if isinstance(path, ConnectionPool) \
+                else ConnectionPool(path)
+        self.pool.executescript('CREATE TABLE IF NOT EXISTS sequences '
+                '(name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+
+    def lease(self, name, size):
+        with self.pool.transaction() as conn:
+            conn.execute('INSERT OR IGNORE INTO sequences (name, value) '
+                    'VALUES (?, 0)', (name,))
+            conn.execute('UPDATE sequences SET value = value + ? '
+                    'WHERE name = ?', (size, name))
+            row = conn.execute('SELECT value FROM sequences WHERE name = ?',
+                    (name,)).fetchone()
+        return row[0] - size
+
+
+class FeistelPermutation:
+    """Permutação do intervalo ``[0, domain_size)`` definida pela chave
+    `key`, construída a partir de uma rede de Feistel balanceada e de
+    *cycle walking*.
+
+    :param domain_size: quantidade de elementos do domínio.
+    :param key: chave secreta, em bytes.
+    :param rounds: (opcional) quantidade de rodadas da rede de Feistel.
+    """
+    def __init__(self, domain_size, key, rounds=4):
+        if domain_size < 2:
+            raise ValueError('domain_size must be greater than 1')
+
+        self.domain_size = domain_size
+        self.key = hashlib.blake2b(key, digest_size=32).digest()
+        self.rounds = rounds
+        self.half_bits = max(1, ((domain_size - 1).bit_length() + 1) // 2)
+        self.half_mask = (1 << self.half_bits) - 1
+
+    def _round(self, i, value):
+        digest = hashlib.blake2b(value.to_bytes(8, 'little'), digest_size=8,
+                key=self.key, salt=i.to_bytes(16, 'little')).digest()
+        return int.from_bytes(digest, 'little') & self.half_mask
+
+    def _feistel(self, value):
+        left, right = value >> self.half_bits, value & self.half_mask
+        for i in range(self.rounds):
+            left, right = right, left ^ self._round(i, right)
+        return (left << self.half_bits) | right
+
+    def __call__(self, value):
+        if not 0 <= value < self.domain_size:
+            raise ValueError('value out of the domain')
+
+        value = self._feistel(value)
+        while value >= self.domain_size:
+            value = self._feistel(value)
+        return value
+
+
+class LeasedIdGenerator:
+    """Produz IDs de comprimento `length` a partir de blocos de `block_size`
+    números reservados em `sequence`.
+
+    A instância é compartilhada entre as requisições e deve ser fornecida
+    como o parâmetro `idgen` de :class:`nurl.shortener.Nurl`.
+
+    :param sequence: instância de :class:`Sequence`.
+    :param length: comprimento dos IDs.
+    :param key: chave secreta, em bytes, que define a permutação dos IDs.
+    :param block_size: (opcional) quantidade de números reservados por vez.
+    :param digits: (opcional) alfabeto dos IDs.
+    """
+    def __init__(self, sequence, length, key, block_size=100, digits=BASE28):
+        if not key:
+            raise ValueError('a secret key is required')
+
+        self.sequence = sequence
+        self.length = length
+        self.block_size = block_size
+        self.digits = digits
+        self.name = 'short_ref_%s' % length
+        self.permutation = FeistelPermutation(len(digits) ** length, key)
+
+        self.lock = threading.Lock()
+        self.next_value = 0
+        self.block_end = 0
+
+    def _next_value(self):
+        with self.lock:
+            if self.next_value >= self.block_end:
+                start = self.sequence.lease(self.name, self.block_size)
+                self.next_value = start
+                self.block_end = start + self.block_size
+                LOGGER.debug('leased ids %s to %s', start, self.block_end - 1)
+
+            value = self.next_value
+            self.next_value += 1
+            return value
+
+    def __call__(self):
+        while True:
+            value = self._next_value()
+            if value >= self.permutation.domain_size:
+                LOGGER.error('the keyspace of ids of length %s is exhausted',
+                        self.length)
+                return
+
+            shortid = encode(self.permutation(value), self.digits)
+            yield shortid.rjust(self.length, self.digits[0])
+
+
+class AdaptiveIdGenerator:
+    """Produz IDs pseudo-aleatórios cujo comprimento aumenta à medida que as
+    colisões se tornam frequentes.
+
+    Cada chamada produz um iterador de IDs, por meio do qual o encurtador
+    informa as colisões de chaves (`record_collision`) e os IDs armazenados
+    (`record_success`). Como os IDs são sorteados uniformemente, a taxa de
+    colisões estima a ocupação do espaço de IDs do comprimento corrente. A
+    taxa é apurada a cada `window` IDs armazenados e, quando excede
+    `max_collision_rate`, o comprimento é incrementado, até o limite de
+    `max_length`. Adicionalmente, após `max_consecutive_collisions` colisões
+    consecutivas em um mesmo iterador, os demais IDs do iterador são
+    produzidos com o comprimento seguinte.
+
+    A instância é compartilhada entre as requisições e deve ser fornecida
+    como o parâmetro `idgen` de :class:`nurl.shortener.Nurl`.
+
+    :param length: comprimento inicial dos IDs.
+    :param max_length: (opcional) comprimento máximo dos IDs. Por padrão,
+                       ``length + 2``.
+    :param max_collision_rate: (opcional) taxa de colisões a partir da qual o
+                               comprimento é incrementado.
+    :param max_consecutive_collisions: (opcional) quantidade de colisões
+                                       consecutivas a partir da qual o
+                                       comprimento seguinte é utilizado.
+    :param window: (opcional) quantidade de IDs armazenados por apuração.
+    :param digits: (opcional) alfabeto dos IDs.
+    """
+    def __init__(self, length, max_length=None, max_collision_rate=0.1,
+            max_consecutive_collisions=5, window=1000, digits=BASE28):
+        self.length = length
+        self.max_length = max_length or length + 2
+        self.max_collision_rate = max_collision_rate
+        self.max_consecutive_collisions = max_consecutive_collisions
+        self.window = window
+        self.digits = digits
+
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.draws = 0
+        self.stored = 0
+        self.collisions = 0
+        self.fallbacks = 0
+        self.window_stored = 0
+        self.window_collisions = 0
+        self.collision_rate = 0.0
+
+    def _evaluate(self):
+        """Apura a taxa de colisões da janela corrente e, se necessário,
+        incrementa o comprimento dos IDs.
+        """
+        self.collision_rate = self.window_collisions / (
+                self.window_collisions + self.window_stored)
+        self.window_stored = self.window_collisions = 0
+
+        if (self.collision_rate > self.max_collision_rate and
+                self.length < self.max_length):
+            self.length += 1
+            LOGGER.warning('the collision rate of %.3f exceeded %s, ids will '
+                    'be generated with length %s', self.collision_rate,
+                    self.max_collision_rate, self.length)
+            # o espaço de IDs do novo comprimento é `len(digits)` vezes maior.
+            self.collision_rate /= len(self.digits)
+
+    def _record_draw(self):
+        with self.lock:
+            self.draws += 1
+
+    def _record_collision(self):
+        with self.lock:
+            self.collisions += 1
+            self.window_collisions += 1
+
+    def _record_success(self):
+        with self.lock:
+            self.stored += 1
+            self.window_stored += 1
+            if self.window_stored >= self.window:
+                self._evaluate()
+
+    def _record_fallback(self):
+        with self.lock:
+            self.fallbacks += 1
+
+    def __call__(self):
+        with self.lock:
+            self.calls += 1
+            length = self.length
+        return AdaptiveIds(self, length)
+
+    def estimated_occupancy(self):
+        """Quantidade estimada de IDs do comprimento corrente já ocupados.
+
+        Como os IDs são sorteados uniformemente, a taxa de colisões estima a
+        fração ocupada do espaço de ``len(digits) ** length`` IDs.
+        """
+        with self.lock:
+            return self._estimated_occupancy()
+
+    def _estimated_occupancy(self):
+        return int(self.collision_rate * len(self.digits) ** self.length)
+
+    def stats(self):
+        with self.lock:
+            return {'length': self.length,
+                    'max_length': self.max_length,
+                    'calls': self.calls,
+                    'draws': self.draws,
+                    'stored': self.stored,
+                    'collisions': self.collisions,
+                    'fallbacks': self.fallbacks,
+                    'collision_rate': self.collision_rate,
+                    'estimated_occupancy': self._estimated_occupancy()}
+
+
+class AdaptiveIds:
+    """Iterador de IDs produzido por :class:`AdaptiveIdGenerator`.
+
+    Os IDs obtidos sem que o resultado do armazenamento seja informado não
+    são considerados na taxa de colisões, de modo que um mesmo iterador pode
+    fornecer os IDs de diversas URLs.
+    """
+    def __init__(self, idgen, length):
+        self.idgen = idgen
+        self.length = length
+        self.consecutive_collisions = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.idgen._record_draw()
+        return generate_id(self.length, self.idgen.digits)
+
+    def record_collision(self):
+        """Informa que o último ID obtido colidiu com uma chave existente.
+        """
+        self.idgen._record_collision()
+        self.consecutive_collisions += 1
+        if (self.consecutive_collisions >=
+                self.idgen.max_consecutive_collisions and
+                self.length < self.idgen.max_length):
+            LOGGER.warning('%s consecutive collisions on ids of length %s, '
+                    'falling back to length %s', self.consecutive_collisions,
+                    self.length, self.length + 1)
+            self.idgen._record_fallback()
+            self.length += 1
+            self.consecutive_collisions = 0
+
+    def record_success(self):
+        """Informa que um ID obtido foi armazenado.
+        """
+        self.idgen._record_success()
+        self.consecutive_collisions = 0
@@ -0,0 +1,244 @@
+"""Comandos de manutenção das bases de dados e dos arquivos estáticos.
+
+    $ nurl-manage create-indexes --verify-only
+    $ nurl-manage backfill-plain-hash
+    $ nurl-manage report-duplicates --strip-params "utm_* gclid" > dups.csv
+    $ nurl-manage precompress-assets --encodings "br gzip"
+"""
+import os
+import sys
+import csv
+import argparse
+import logging
+
+import pymongo
+
+from . import datastores, mongodb, precompression, shortener
+
+
+__all__ = ['create_indexes', 'backfill_plain_hash', 'find_duplicates', 'main']
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def create_indexes(collections, verify_only=False):
+    """Cria os índices requeridos pela aplicação ou, com `verify_only`,
+    apenas verifica sua existência.
+
+    Deve ser executado a cada implantação, antes da inicialização da
+    aplicação, que não cria os índices. Retorna a lista de pares
+    ``(nome da coleção, chaves)`` dos índices inexistentes antes da
+    execução.
+
+    :param collections: lista de pares ``(coleção, índices)``, em que os
+                        índices são representados como em
+                        :data:`nurl.mongodb.DATA_INDEXES`.
+    """
+    missing = []
+    for collection, indexes in collections:
+        for keys, options in mongodb.missing_indexes(collection, indexes):
+            missing.append((collection.name, keys))
+            if verify_only:
+                LOGGER.warning('index on %s is missing from "%s"',
+                        ', '.join(name for name, _ in keys), collection.name)
+            else:
+                name = collection.create_index(keys, **options)
+                LOGGER.info('index "%s" was created on "%s"', name,
+                        collection.name)
+    if not missing:
+        LOGGER.info('all the indexes exist')
+    return missing
+
+
+def backfill_plain_hash(collection, batch_size=DEFAULT_BATCH_SIZE,
+        drop_plain_index=False):
+    """Inclui o campo `plain_hash` nos registros de `collection` que ainda
+    não o possuem, cria o índice único sobre o campo e, opcionalmente,
+    remove o índice sobre `plain`.
+
+    O comando pode ser interrompido e executado novamente a qualquer momento.
+    Deve ser executado antes da atualização da aplicação para a versão que
+    consulta as URLs pelo resumo e, novamente, logo após, para incluir os
+    registros criados nesse intervalo. Retorna a quantidade de registros
+    atualizados.
+    """
+    updated = 0
+    requests = []
+    records = collection.find({'plain_hash': {'$exists': False}},
+            projection={'plain': True})
+    for rec in records:
+        requests.append(pymongo.UpdateOne({'_id': rec['_id']},
+                {'$set': {'plain_hash': datastores.plain_hash(rec['plain'])}}))
+        if len(requests) >= batch_size:
+            updated += collection.bulk_write(requests,
+                    ordered=False).modified_count
+            requests = []
+            LOGGER.info('%s records were updated', updated)
+    if requests:
+        updated += collection.bulk_write(requests,
+                ordered=False).modified_count
+    LOGGER.info('%s records were updated', updated)
+
+    collection.create_index('plain_hash', unique=True,
+            partialFilterExpression={'plain_hash': {'$exists': True}})
+
+    if drop_plain_index:
+        if 'plain_1' in collection.index_information():
+            collection.drop_index('plain_1')
+            LOGGER.info('the index on "plain" was dropped')
+        else:
+            LOGGER.info('there is no index on "plain"')
+
+    return updated
+
+
+def find_duplicates(store, canonicalize, batch_size=DEFAULT_BATCH_SIZE):
+    """Produz os pares ``(url canônica, [(chave, url), ...])`` das URLs de
+    `store` que possuem a mesma forma canônica, segundo `canonicalize`.
+
+    Apenas o resumo da forma canônica e a primeira chave de cada URL são
+    mantidos em memória durante a leitura.
+    """
+    first_seen = {}
+    duplicates = {}
+
+    def pairs():
+        batch = []
+        for key in store.keys():
+            batch.append(key)
+            if len(batch) >= batch_size:
+                yield from store.get_many(batch).items()
+                batch = []
+        if batch:
+            yield from store.get_many(batch).items()
+
+    for key, url in pairs():
+        canonical = canonicalize(url)
+        digest = datastores.plain_hash(canonical)
+        first = first_seen.setdefault(digest, key)
+        if first != key:
+            duplicates.setdefault(canonical, [first]).append(key)
+
+    for canonical, keys in duplicates.items():
+        yield canonical, sorted(store.get_many(keys).items())
+
+
+def get_collection(args, name):
+    client = pymongo.MongoClient(args.mongodb_uri, appname='nURL')
+    return client[args.mongodb_db][name]
+
+
+def _create_indexes(args):
+    database = pymongo.MongoClient(args.mongodb_uri,
+            appname='nURL')[args.mongodb_db]
+    missing = create_indexes([
+        (database[args.data_col], mongodb.DATA_INDEXES),
+        (database[args.tracker_col], mongodb.TRACKER_INDEXES),
+        (database[args.counters_col], mongodb.COUNTERS_INDEXES),
+        ], verify_only=args.verify_only)
+    # com --verify-only, o status indica a ausência de índices.
+    return 1 if missing and args.verify_only else 0
+
+
+def _backfill_plain_hash(args):
+    backfill_plain_hash(get_collection(args, args.mongodb_col),
+            batch_size=args.batch_size,
+            drop_plain_index=args.drop_plain_index)
+
+
+def get_store(args):
+    if args.sqlite:
+        return datastores.SQLiteDataStore(args.sqlite)
+    else:
+        return datastores.MongoDBDataStore(
+                get_collection(args, args.mongodb_col))
+
+
+def _report_duplicates(args):
+    canonicalize = shortener.URLCanonicalizer(sort_query=args.sort_query,
+            strip_params=args.strip_params.split())
+    writer = csv.writer(sys.stdout)
+    writer.writerow(['canonical_url', 'short_ref', 'plain'])
+    groups = 0
+    for canonical, pairs in find_duplicates(get_store(args), canonicalize):
+        groups += 1
+        for key, url in pairs:
+            writer.writerow([canonical, key, url])
+    LOGGER.info('%s URLs are stored more than once', groups)
+
+
+def _precompress_assets(args):
+    encodings = precompression.parse_encodings(args.encodings)
+    paths = precompression.precompress_directory(args.static_dir, encodings)
+    LOGGER.info('%s static files were precompressed', len(paths))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            description='Comandos de manutenção das bases de dados e dos '
+                        'arquivos estáticos.')
+    parser.add_argument('--mongodb-uri',
+            default=os.environ.get('NURL_MONGODB_URI',
+                                   'mongodb://localhost:27017/'))
+    parser.add_argument('--mongodb-db',
+            default=os.environ.get('NURL_MONGODB_DB', 'nurl'))
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    indexes = subparsers.add_parser('create-indexes',
+            help='cria os índices requeridos pela aplicação')
+    indexes.add_argument('--verify-only', action='store_true',
+            help='apenas verifica a existência dos índices, terminando com '
+                 'o status 1 caso algum esteja ausente')
+    indexes.add_argument('--data-col',
+            default=os.environ.get('NURL_MONGODB_DATA_COL', 'urls'))
+    indexes.add_argument('--tracker-col',
+            default=os.environ.get('NURL_MONGODB_TRACKER_COL', 'accesses'))
+    indexes.add_argument('--counters-col',
+            default=os.environ.get('NURL_MONGODB_COUNTERS_COL',
+                                   'access_counters'))
+    indexes.set_defaults(func=_create_indexes)
+
+    backfill = subparsers.add_parser('backfill-plain-hash',
+            help='inclui o resumo das URLs nos registros existentes')
+    backfill.add_argument('--mongodb-col',
+            default=os.environ.get('NURL_MONGODB_DATA_COL', 'urls'))
+    backfill.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    backfill.add_argument('--drop-plain-index', action='store_true',
+            help='remove o índice sobre o campo `plain`')
+    backfill.set_defaults(func=_backfill_plain_hash)
+
+    report = subparsers.add_parser('report-duplicates',
+            help='lista, em CSV, as URLs com a mesma forma canônica')
+    report.add_argument('--sqlite', metavar='PATH',
+            help='utiliza a base SQLite em PATH, em vez do MongoDB')
+    report.add_argument('--mongodb-col',
+            default=os.environ.get('NURL_MONGODB_DATA_COL', 'urls'))
+    report.add_argument('--sort-query', action='store_true',
+            help='considera a ordem dos parâmetros irrelevante')
+    report.add_argument('--strip-params', default='',
+            help='padrões, separados por espaços, dos parâmetros ignorados')
+    report.set_defaults(func=_report_duplicates)
+
+    assets = subparsers.add_parser('precompress-assets',
+            help='grava as variantes pré-comprimidas dos arquivos estáticos; '
+                 'deve ser executado na construção do pacote ou na '
+                 'implantação')
+    assets.add_argument('--static-dir', default=precompression.STATIC_DIR,
+            help='diretório dos arquivos estáticos servidos pela aplicação')
+    assets.add_argument('--encodings',
+            default=os.environ.get('NURL_STATIC_ENCODINGS', 'br gzip'),
+            help='codificações, separadas por espaços, p.ex. "br gzip"')
+    assets.set_defaults(func=_precompress_assets)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,523 @@
+"""Métricas de funcionamento no formato de exposição textual do Prometheus.
+
+Os valores de cada processo são mantidos em um arquivo mapeado em memória no
+diretório informado em :class:`Registry`, de maneira que as métricas de
+todos os workers do gunicorn são somadas ao serem expostas, qualquer que
+seja o worker que atenda à requisição. Sem diretório, apenas os valores do
+processo corrente são considerados. Os arquivos de execuções anteriores são
+somados aos demais e, portanto, o diretório deve ser esvaziado antes da
+inicialização do servidor.
+
+As classes ``Instrumented*`` envolvem os componentes do encurtador e
+registram a duração e as exceções de cada operação em
+:class:`Instrumentation`.
+"""
+import os
+import json
+import mmap
+import time
+import bisect
+import struct
+import threading
+import logging
+from collections import OrderedDict
+
+from . import datastores, trackers, pingers
+
+
+__all__ = ['Registry', 'Counter', 'Histogram', 'Instrumentation',
+        'InstrumentedDataStore', 'InstrumentedTracker', 'InstrumentedPinger',
+        'InstrumentedShortener']
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5,
+                   5.0, 10.0)
+INF = float('inf')
+
+
+class MemoryValues:
+    """Valores de um processo, mantidos em memória.
+    """
+    def __init__(self):
+        self.values = {}
+
+    def add(self, key, amount):
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def items(self):
+        return list(self.values.items())
+
+
+# cabeçalho com a quantidade de bytes utilizados do arquivo.
+_USED = struct.Struct('<Q')
+_KEY_SIZE = struct.Struct('<I')
+_VALUE = struct.Struct('<d')
+
+
+class MmapValues:
+    """Valores de um processo, mantidos no arquivo `path` mapeado em memória.
+
+    Cada entrada é composta pelo comprimento da chave (32 bits), pela chave
+    em UTF-8, completada até múltiplo de 8 bytes, e pelo valor (*double*).
+    As entradas são gravadas antes da atualização do cabeçalho, de modo que
+    os leitores de outros processos nunca encontram entradas incompletas.
+    """
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a+b')
+        size = os.fstat(self.file.fileno()).st_size
+        if size < self.INITIAL_SIZE:
+            self.file.truncate(self.INITIAL_SIZE)
+            size = self.INITIAL_SIZE
+        self.mmap = mmap.mmap(self.file.fileno(), size)
+        self.used = _USED.unpack_from(self.mmap)[0] or _USED.size
+        self.positions = {key: pos
+                          for key, pos in _entries(self.mmap, self.used)}
+
+    def _init_key(self, key):
+        encoded = key.encode('utf-8')
+        padded = encoded + b' ' * (-(_KEY_SIZE.size + len(encoded)) % 8)
+        entry_size = _KEY_SIZE.size + len(padded) + _VALUE.size
+        if self.used + entry_size > len(self.mmap):
+            self._grow(self.used + entry_size)
+
+        _KEY_SIZE.pack_into(self.mmap, self.used, len(encoded))
+        self.mmap[self.used + _KEY_SIZE.size:
+                  self.used + _KEY_SIZE.size + len(padded)] = padded
+        pos = self.used + _KEY_SIZE.size + len(padded)
+        _VALUE.pack_into(self.mmap, pos, 0.0)
+        self.used += entry_size
+        _USED.pack_into(self.mmap, 0, self.used)
+        self.positions[key] = pos
+        return pos
+
+    def _grow(self, min_size):
+        size = len(self.mmap)
+        while size < min_size:
+            size *= 2
+        self.mmap.close()
+        self.file.truncate(size)
+        self.mmap = mmap.mmap(self.file.fileno(), size)
+
+    def add(self, key, amount):
+        pos = self.positions.get(key)
+        if pos is None:
+            pos = self._init_key(key)
+        _VALUE.pack_into(self.mmap, pos,
+                _VALUE.unpack_from(self.mmap, pos)[0] + amount)
+
+    def items(self):
+        return read_values(self.path)
+
+    def close(self):
+        self.mmap.close()
+        self.file.close()
+
+
+def _entries(data, used):
+    pos = _USED.size
+    while pos < used:
+        key_size = _KEY_SIZE.unpack_from(data, pos)[0]
+        key_start = pos + _KEY_SIZE.size
+        key = bytes(data[key_start:key_start + key_size]).decode('utf-8')
+        pos = key_start + key_size + (-(_KEY_SIZE.size + key_size) % 8)
+        yield key, pos
+        pos += _VALUE.size
+
+
+def read_values(path):
+    """Lê os pares ``(chave, valor)`` gravados por :class:`MmapValues`.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < _USED.size:
+        return []
+    used = min(_USED.unpack_from(data)[0], len(data))
+    return [(key, _VALUE.unpack_from(data, pos)[0])
+            for key, pos in _entries(data, used)]
+
+
+def _format_value(value):
+    if value == INF:
+        return '+Inf'
+    elif float(value).is_integer():
+        return str(int(value))
+    else:
+        return repr(float(value))
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('\n', r'\n')
+            .replace('"', r'\"'))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value))
+                             for name, value in labels)
+
+
+class Registry:
+    """Registro das métricas e dos respectivos valores.
+
+    :param directory: (opcional) diretório compartilhado pelos processos.
+    """
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.metrics = OrderedDict()
+        self.values = None
+        self.pid = None
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _local_values(self):
+        # os valores herdados pelos processos filhos após o `fork` são
+        # descartados.
+        pid = os.getpid()
+        if self.pid != pid:
+            if self.directory:
+                self.values = MmapValues(os.path.join(self.directory,
+                    'nurl-%s.db' % pid))
+            else:
+                self.values = MemoryValues()
+            self.pid = pid
+        return self.values
+
+    def add(self, *increments):
+        """Soma os valores ``(chave, quantidade)`` de `increments`.
+        """
+        with self.lock:
+            values = self._local_values()
+            for key, amount in increments:
+                values.add(key, amount)
+
+    def _register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError('duplicated metric "%s"' % metric.name)
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(),
+            buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation,
+            labelnames, buckets))
+
+    def collect(self):
+        """Soma os valores de todos os processos. Retorna um dicionário que
+        associa o nome de cada métrica às suas amostras, representadas por
+        ``(sufixo, rótulos, valor)``.
+        """
+        totals = {}
+        if self.directory:
+            with self.lock:
+                self._local_values()
+            for filename in sorted(os.listdir(self.directory)):
+                if not filename.endswith('.db'):
+                    continue
+                try:
+                    items = read_values(os.path.join(self.directory, filename))
+                except (OSError, ValueError, struct.error) as exc:
+                    LOGGER.warning('could not read metrics from "%s": %s',
+                            filename, exc)
+                    continue
+                for key, value in items:
+                    totals[key] = totals.get(key, 0.0) + value
+        else:
+            with self.lock:
+                totals.update(self._local_values().items())
+
+        samples = {}
+        for key, value in totals.items():
+            name, suffix, labels = json.loads(key)
+            samples.setdefault(name, []).append(
+                    (suffix, tuple(tuple(label) for label in labels), value))
+        return samples
+
+    def exposition(self):
+        """Produz as métricas no formato de exposição textual do
+        Prometheus.
+        """
+        samples = self.collect()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append('# HELP %s %s' % (name, _escape(metric.documentation)))
+            lines.append('# TYPE %s %s' % (name, metric.type))
+            for suffix, labels, value in metric.expose(samples.get(name, [])):
+                lines.append('%s%s%s %s' % (name, suffix,
+                    _format_labels(labels), _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+class Metric:
+    type = None
+
+    def __init__(self, registry, name, documentation, labelnames):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+
+    def _key(self, suffix, labels):
+        return json.dumps([self.name, suffix, labels])
+
+    def labels(self, *values):
+        """Obtém a série correspondente aos valores dos rótulos.
+        """
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError('"%s" requires the labels %s' % (
+                    self.name, ', '.join(self.labelnames)))
+            child = self._child([[name, str(value)] for name, value
+                                 in zip(self.labelnames, values)])
+            self.children[values] = child
+        return child
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def _child(self, labels):
+        return _CounterChild(self.registry, self._key('', labels))
+
+    def expose(self, samples):
+        return sorted(samples)
+
+
+class _CounterChild:
+    def __init__(self, registry, key):
+        self.registry = registry
+        self.key = key
+
+    def inc(self, amount=1):
+        self.registry.add((self.key, amount))
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames,
+            buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(bucket) for bucket in buckets))
+
+    def _child(self, labels):
+        bucket_keys = [self._key('_bucket', labels + [['le',
+                                 _format_value(bucket)]])
+                       for bucket in self.buckets + (INF,)]
+        return _HistogramChild(self.registry, self.buckets, bucket_keys,
+                self._key('_sum', labels), self._key('_count', labels))
+
+    def expose(self, samples):
+        # os baldes são armazenados individualmente e acumulados ao serem
+        # expostos.
+        series = OrderedDict()
+        for suffix, labels, value in sorted(samples):
+            if suffix == '_bucket':
+                le = dict(labels)['le']
+                labels = tuple(label for label in labels if label[0] != 'le')
+                upper = INF if le == '+Inf' else float(le)
+                series.setdefault(labels, {}).setdefault('buckets', {})[
+                        upper] = value
+            else:
+                series.setdefault(labels, {})[suffix] = value
+
+        for labels, values in series.items():
+            observed = values.get('buckets', {})
+            cumulative = 0.0
+            for upper in self.buckets + (INF,):
+                cumulative += observed.get(upper, 0.0)
+                yield ('_bucket', labels + (('le', _format_value(upper)),),
+                       cumulative)
+            yield ('_sum', labels, values.get('_sum', 0.0))
+            yield ('_count', labels, values.get('_count', 0.0))
+
+
+class _HistogramChild:
+    def __init__(self, registry, buckets, bucket_keys, sum_key, count_key):
+        self.registry = registry
+        self.buckets = buckets
+        self.bucket_keys = bucket_keys
+        self.sum_key = sum_key
+        self.count_key = count_key
+
+    def observe(self, value):
+        bucket_key = self.bucket_keys[bisect.bisect_left(self.buckets, value)]
+        self.registry.add((bucket_key, 1), (self.sum_key, value),
+                (self.count_key, 1))
+
+
+class Instrumentation:
+    """Métricas do encurtador: a duração e as exceções das operações de cada
+    componente, e a duração e os status das respostas de cada rota.
+
+    :param registry: instância de :class:`Registry`.
+    """
+    def __init__(self, registry):
+        self.registry = registry
+        self.durations = registry.histogram('nurl_operation_duration_seconds',
+                'Duration of the operations of each component.',
+                ['component', 'operation'])
+        self.exceptions = registry.counter('nurl_operation_exceptions_total',
+                'Exceptions raised by the operations of each component.',
+                ['component', 'operation', 'exception'])
+        self.request_durations = registry.histogram(
+                'nurl_http_request_duration_seconds',
+                'Duration of the HTTP requests of each route.', ['route'])
+        self.responses = registry.counter('nurl_http_responses_total',
+                'HTTP responses of each route by status.',
+                ['route', 'status'])
+
+    def call(self, component, operation, func, *args):
+        """Executa ``func(*args)``, registrando a duração e a exceção
+        eventualmente levantada.
+        """
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        except Exception as exc:
+            self.exceptions.labels(component, operation,
+                    type(exc).__name__).inc()
+            raise
+        finally:
+            self.durations.labels(component, operation).observe(
+                    time.perf_counter() - start)
+
+    def observe_request(self, route, status, duration):
+        self.request_durations.labels(route).observe(duration)
+        self.responses.labels(route, status).inc()
+
+
+class InstrumentedDataStore(datastores.DataStore):
+    """Registra a duração das operações de outra instância de
+    :class:`nurl.datastores.DataStore`.
+
+    :param store: instância de :class:`nurl.datastores.DataStore`.
+    :param instrumentation: instância de :class:`Instrumentation`.
+    :param component: (opcional) valor do rótulo ``component``.
+    """
+    def __init__(self, store, instrumentation, component='store'):
+        self.store = store
+        self.instrumentation = instrumentation
+        self.component = component
+
+    def __setitem__(self, key, value):
+        self.instrumentation.call(self.component, 'set',
+                self.store.__setitem__, key, value)
+
+    def __getitem__(self, key):
+        return self.instrumentation.call(self.component, 'get',
+                self.store.__getitem__, key)
+
+    def key(self, url):
+        return self.instrumentation.call(self.component, 'key',
+                self.store.key, url)
+
+    def keys(self, since=None):
+        return self.store.keys(since=since)
+
+    def get_many(self, keys):
+        return self.instrumentation.call(self.component, 'get_many',
+                self.store.get_many, keys)
+
+    def key_many(self, urls):
+        return self.instrumentation.call(self.component, 'key_many',
+                self.store.key_many, urls)
+
+    def set_many(self, pairs):
+        return self.instrumentation.call(self.component, 'set_many',
+                self.store.set_many, pairs)
+
+    def __getattr__(self, name):
+        # p.ex. `stats` e `close`
+        return getattr(self.store, name)
+
+
+class InstrumentedTracker(trackers.Tracker):
+    """Registra a duração das operações de outra instância de
+    :class:`nurl.trackers.Tracker`.
+
+    :param tracker: instância de :class:`nurl.trackers.Tracker`.
+    :param instrumentation: instância de :class:`Instrumentation`.
+    :param component: (opcional) valor do rótulo ``component``.
+    """
+    def __init__(self, tracker, instrumentation, component='tracker'):
+        self.tracker = tracker
+        self.instrumentation = instrumentation
+        self.component = component
+
+    def add(self, short_ref, access):
+        self.instrumentation.call(self.component, 'add', self.tracker.add,
+                short_ref, access)
+
+    def add_many(self, items):
+        return self.instrumentation.call(self.component, 'add_many',
+                self.tracker.add_many, items)
+
+    def get(self, short_ref):
+        return self.instrumentation.call(self.component, 'get',
+                lambda short_ref: list(self.tracker.get(short_ref)), short_ref)
+
+    def __getattr__(self, name):
+        return getattr(self.tracker, name)
+
+
+class InstrumentedPinger(pingers.Pinger):
+    """Registra a duração das verificações de outra instância de
+    :class:`nurl.pingers.Pinger`.
+    """
+    def __init__(self, pinger, instrumentation, component='pinger'):
+        self.pinger = pinger
+        self.instrumentation = instrumentation
+        self.component = component
+
+    def check(self, url, timeout):
+        return self.instrumentation.call(self.component, 'check',
+                self.pinger.check, url, timeout)
+
+    def __getattr__(self, name):
+        return getattr(self.pinger, name)
+
+
+class InstrumentedShortener:
+    """Registra a duração das operações de uma instância de
+    :class:`nurl.shortener.Nurl`, cujos demais atributos são expostos sem
+    alterações.
+    """
+    def __init__(self, nurl, instrumentation, component='shortener'):
+        self.nurl = nurl
+        self.instrumentation = instrumentation
+        self.component = component
+
+    def shorten(self, url):
+        return self.instrumentation.call(self.component, 'shorten',
+                self.nurl.shorten, url)
+
+    def shorten_many(self, urls):
+        return self.instrumentation.call(self.component, 'shorten_many',
+                self.nurl.shorten_many, urls)
+
+    def resolve(self, shortid, access=None):
+        return self.instrumentation.call(self.component, 'resolve',
+                self.nurl.resolve, shortid, access)
+
+    def resolve_many(self, shortids, access=None):
+        return self.instrumentation.call(self.component, 'resolve_many',
+                self.nurl.resolve_many, shortids, access)
+
+    def __getattr__(self, name):
+        return getattr(self.nurl, name)
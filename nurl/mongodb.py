@@ -0,0 +1,172 @@
+"""Acesso ao MongoDB seguro em relação ao `fork` dos workers do gunicorn, e
+gestão dos índices das coleções.
+
+Instâncias de `pymongo.MongoClient` não devem ser compartilhadas entre
+processos. Com ``preload = true``, a aplicação é configurada antes do `fork`
+e, por isso, :class:`LazyDatabase` cria o cliente apenas no primeiro acesso
+de cada processo.
+
+Os índices não são mais criados na inicialização da aplicação, mas por meio
+de ``nurl-manage create-indexes``, que deve ser executado a cada implantação.
+"""
+import os
+import logging
+import threading
+
+import pymongo
+
+
+__all__ = ['LazyDatabase', 'LazyCollection', 'get_client_options',
+        'missing_indexes', 'DATA_INDEXES', 'TRACKER_INDEXES',
+        'COUNTERS_INDEXES']
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+# índices requeridos por cada coleção, representados por ``(chaves, opções)``.
+DATA_INDEXES = [
+    ([('short_ref', pymongo.ASCENDING)], {'unique': True}),
+    # registros ainda não migrados não possuem o campo `plain_hash`.
+    ([('plain_hash', pymongo.ASCENDING)], {'unique': True,
+        'partialFilterExpression': {'plain_hash': {'$exists': True}}}),
+]
+TRACKER_INDEXES = [
+    ([('short_ref', pymongo.ASCENDING)], {}),
+]
+COUNTERS_INDEXES = [
+    ([('short_ref', pymongo.ASCENDING), ('granularity', pymongo.ASCENDING),
+      ('bucket', pymongo.ASCENDING), ('referrer', pymongo.ASCENDING)],
+     {'unique': True}),
+]
+
+READ_PREFERENCES = ('primary', 'primaryPreferred', 'secondary',
+        'secondaryPreferred', 'nearest')
+
+
+def get_client_options(settings):
+    """Obtém os argumentos de `pymongo.MongoClient` de acordo com as
+    configurações ``nurl.mongodb.*``. Os tempos limite iguais a 0 são
+    desligados.
+
+    Como o cliente é criado apenas após o `fork`, a preferência de leitura é
+    validada aqui, na inicialização da aplicação.
+    """
+    read_preference = settings['nurl.mongodb.read_preference']
+    if read_preference not in READ_PREFERENCES:
+        raise ValueError('unknown read preference "%s"' % read_preference)
+
+    optional = lambda value: value or None
+    return {
+        'appname': 'nURL',
+        # os sockets são abertos apenas na primeira operação.
+        'connect': False,
+        'maxPoolSize': settings['nurl.mongodb.max_pool_size'],
+        'minPoolSize': settings['nurl.mongodb.min_pool_size'],
+        'connectTimeoutMS': optional(
+            settings['nurl.mongodb.connect_timeout_ms']),
+        'socketTimeoutMS': optional(settings['nurl.mongodb.socket_timeout_ms']),
+        'serverSelectionTimeoutMS': settings[
+            'nurl.mongodb.server_selection_timeout_ms'],
+        'waitQueueTimeoutMS': optional(
+            settings['nurl.mongodb.wait_queue_timeout_ms']),
+        'readPreference': read_preference,
+    }
+
+
+class LazyDatabase:
+    """Banco de dados `name` do MongoDB em `uri`, cujo cliente é criado no
+    primeiro acesso de cada processo.
+
+    :param client_options: argumentos de `pymongo.MongoClient`, p.ex.
+                           produzidos por :func:`get_client_options`.
+    :param client_factory: (opcional) executável que produz o cliente.
+    """
+    def __init__(self, uri, name, client_options=None,
+            client_factory=pymongo.MongoClient):
+        self.uri = uri
+        self.name = name
+        self.client_options = client_options or {}
+        self.client_factory = client_factory
+        self.lock = threading.Lock()
+        self.pid = None
+        self._client = None
+
+    @property
+    def client(self):
+        # o cliente herdado do processo pai é descartado, e não encerrado,
+        # pois os sockets ainda são utilizados pelo pai.
+        pid = os.getpid()
+        if self.pid != pid:
+            with self.lock:
+                if self.pid != pid:
+                    self._client = self.client_factory(self.uri,
+                            **self.client_options)
+                    self.pid = pid
+                    LOGGER.info('connecting to MongoDB instance "%s" from '
+                            'process %s', self.uri_without_credentials(), pid)
+        return self._client
+
+    def uri_without_credentials(self):
+        scheme, sep, rest = self.uri.partition('://')
+        return scheme + sep + rest.rpartition('@')[2]
+
+    @property
+    def database(self):
+        return self.client[self.name]
+
+    def __getitem__(self, name):
+        return LazyCollection(self, name)
+
+    def close(self):
+        if self.pid == os.getpid():
+            self._client.close()
+        self._client = self.pid = None
+
+    def __repr__(self):
+        return '<LazyDatabase %r at %r>' % (self.name,
+                self.uri_without_credentials())
+
+
+class LazyCollection:
+    """Coleção `name` de uma instância de :class:`LazyDatabase`, que expõe a
+    interface de `pymongo.collection.Collection`.
+    """
+    def __init__(self, database, name):
+        self.lazy_database = database
+        self.name = name
+        self._pid = None
+        self._collection = None
+
+    @property
+    def collection(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            self._collection = self.lazy_database.database[self.name]
+            self._pid = pid
+        return self._collection
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def __repr__(self):
+        return '<LazyCollection %r of %r>' % (self.name, self.lazy_database)
+
+
+def _describe(keys, options):
+    # o servidor pode informar a direção das chaves como número real.
+    keys = [(name, int(direction) if isinstance(direction, float)
+             else direction) for name, direction in keys]
+    return {'key': keys, 'unique': bool(options.get('unique')),
+            'partialFilterExpression': options.get('partialFilterExpression')}
+
+
+def missing_indexes(collection, indexes):
+    """Retorna os índices de `indexes`, representados por ``(chaves,
+    opções)``, inexistentes em `collection` ou existentes com opções
+    diferentes.
+    """
+    existing = [_describe(info['key'], info)
+                for info in collection.index_information().values()]
+    return [(keys, options) for keys, options in indexes
+            if _describe(keys, options) not in existing]
@@ -0,0 +1,311 @@
+"""Estratégias de verificação de conectividade de URLs.
+
+Cada estratégia implementa :class:`Pinger` e pode ser fornecida a
+:class:`nurl.shortener.URLChecker` e :class:`nurl.shortener.Nurl`.
+"""
+import abc
+import ssl
+import socket
+import logging
+import threading
+import http.client
+import urllib.parse
+import urllib.request
+import urllib.error
+from collections import namedtuple
+
+from .caches import LRUCache
+
+
+__all__ = ['Pinger', 'PingResult', 'UrlopenPinger', 'HTTPPinger',
+        'CachingPinger']
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+PingResult = namedtuple('PingResult', 'alive reachable')
+PingResult.__doc__ = """Resultado da verificação de uma URL.
+
+`alive` indica se a URL responde com sucesso. `reachable` indica se o host
+foi alcançado, e é `None` quando a verificação não pôde ser realizada.
+"""
+
+
+REDIRECT_STATUSES = frozenset([301, 302, 303, 307, 308])
+HEAD_UNSUPPORTED_STATUSES = frozenset([403, 405, 501])
+# quantidade máxima de bytes lidos de uma resposta para que a conexão possa
+# ser reutilizada.
+MAX_DRAIN_SIZE = 64 * 1024
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected,
+        ConnectionResetError, BrokenPipeError)
+
+
+def url_origin(parts):
+    """Obtém a origem ``(scheme, host, port)`` da URL representada por
+    `parts`, o resultado de `urllib.parse.urlsplit`.
+    """
+    if parts.scheme not in ('http', 'https'):
+        raise ValueError('unsupported URL scheme "%s"' % parts.scheme)
+    if not parts.hostname:
+        raise ValueError('missing hostname')
+    host = parts.hostname.encode('idna').decode('ascii')
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    return (parts.scheme, host, port)
+
+
+def request_target(parts):
+    """Obtém o alvo da requisição HTTP, composto pelo caminho e pela *query
+    string* da URL representada por `parts`.
+    """
+    target = urllib.parse.quote(parts.path or '/', safe="/%:@&=+$,;~!*'()")
+    if parts.query:
+        target += '?' + urllib.parse.quote(parts.query,
+                safe="/%:@&=+$,;~!*'()?")
+    return target
+
+
+class Pinger(metaclass=abc.ABCMeta):
+    """Verifica se uma URL alcança um servidor.
+    """
+    @abc.abstractmethod
+    def check(self, url: str, timeout: float) -> PingResult:
+        return NotImplemented
+
+    def ping(self, url: str, timeout: float) -> bool:
+        return self.check(url, timeout).alive
+
+
+class UrlopenPinger(Pinger):
+    """Realiza uma requisição GET completa por meio de
+    `urllib.request.urlopen`.
+    """
+    def __init__(self, urllib_request=urllib.request):
+        self.urllib_request = urllib_request
+
+    def check(self, url, timeout):
+        try:
+            resp = self.urllib_request.urlopen(url, timeout=timeout)
+        except urllib.error.HTTPError as exc:
+            LOGGER.info('cannot connect to URL "%s": %s', url, str(exc))
+            return PingResult(alive=False, reachable=True)
+        except (urllib.error.URLError, socket.timeout) as exc:
+            LOGGER.info('cannot connect to URL "%s": %s', url, str(exc))
+            return PingResult(alive=False, reachable=False)
+
+        close = getattr(resp, 'close', None)
+        if close is not None:
+            close()
+        return PingResult(alive=True, reachable=True)
+
+
+class HTTPPinger(Pinger):
+    """Realiza uma requisição HEAD e, caso o método não seja suportado pelo
+    servidor, uma requisição GET limitada ao primeiro byte do recurso.
+
+    Os redirecionamentos são seguidos e as conexões são mantidas abertas para
+    reuso, por host. A quantidade de verificações simultâneas em cada host é
+    limitada a `max_per_host`.
+
+    :param max_per_host: (opcional) quantidade máxima de verificações
+                         simultâneas por host.
+    :param max_idle_per_host: (opcional) quantidade máxima de conexões
+                              ociosas mantidas por host.
+    :param max_redirects: (opcional) quantidade máxima de redirecionamentos
+                          seguidos.
+    :param user_agent: (opcional) valor do cabeçalho `User-Agent`.
+    """
+    def __init__(self, max_per_host=4, max_idle_per_host=2, max_redirects=5,
+            user_agent='nURL'):
+        self.max_per_host = max_per_host
+        self.max_idle_per_host = max_idle_per_host
+        self.max_redirects = max_redirects
+        self.user_agent = user_agent
+        self.ssl_context = ssl.create_default_context()
+
+        self.lock = threading.Lock()
+        self.semaphores = {}
+        self.idle = {}
+
+    def check(self, url, timeout):
+        for _ in range(self.max_redirects + 1):
+            parts = urllib.parse.urlsplit(url)
+            try:
+                origin = url_origin(parts)
+            except (ValueError, UnicodeError) as exc:
+                LOGGER.info('cannot check URL "%s": %s', url, str(exc))
+                return PingResult(alive=False, reachable=False)
+
+            semaphore = self._semaphore(origin)
+            if not semaphore.acquire(timeout=timeout):
+                LOGGER.info('too many concurrent checks on "%s"', origin[1])
+                return PingResult(alive=False, reachable=None)
+            try:
+                status, location = self._request(origin, parts, timeout)
+            except (OSError, http.client.HTTPException) as exc:
+                LOGGER.info('cannot connect to URL "%s": %s', url, str(exc))
+                return PingResult(alive=False, reachable=False)
+            finally:
+                semaphore.release()
+
+            if status in REDIRECT_STATUSES and location:
+                url = urllib.parse.urljoin(url, location)
+                continue
+
+            if status >= 400:
+                LOGGER.info('cannot connect to URL "%s": HTTP status %s',
+                        url, status)
+            return PingResult(alive=status < 400, reachable=True)
+
+        LOGGER.info('cannot connect to URL "%s": too many redirects', url)
+        return PingResult(alive=False, reachable=True)
+
+    def close(self):
+        """Encerra todas as conexões ociosas.
+        """
+        with self.lock:
+            idle, self.idle = self.idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def _semaphore(self, origin):
+        with self.lock:
+            semaphore = self.semaphores.get(origin)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.max_per_host)
+                self.semaphores[origin] = semaphore
+            return semaphore
+
+    def _request(self, origin, parts, timeout):
+        target = request_target(parts)
+        status, location = self._send(origin, 'HEAD', target, {}, timeout)
+        if status in HEAD_UNSUPPORTED_STATUSES:
+            status, location = self._send(origin, 'GET', target,
+                    {'Range': 'bytes=0-0'}, timeout)
+        return status, location
+
+    def _send(self, origin, method, target, headers, timeout):
+        headers = dict(headers, **{'User-Agent': self.user_agent})
+        conn, reused = self._get_connection(origin, timeout)
+        try:
+            conn.request(method, target, headers=headers)
+            resp = conn.getresponse()
+        except STALE_CONNECTION_ERRORS:
+            conn.close()
+            if not reused:
+                raise
+            # a conexão ociosa foi encerrada pelo servidor.
+            conn = self._connect(origin, timeout)
+            try:
+                conn.request(method, target, headers=headers)
+                resp = conn.getresponse()
+            except BaseException:
+                conn.close()
+                raise
+        except BaseException:
+            conn.close()
+            raise
+
+        try:
+            drained = self._drain(resp)
+        except BaseException:
+            conn.close()
+            raise
+
+        if drained and not resp.will_close:
+            self._put_connection(origin, conn)
+        else:
+            conn.close()
+        return resp.status, resp.getheader('Location')
+
+    def _drain(self, resp):
+        """Consome o corpo da resposta. Retorna `False` caso seja maior que
+        `MAX_DRAIN_SIZE`.
+        """
+        remaining = MAX_DRAIN_SIZE
+        while remaining > 0:
+            chunk = resp.read(min(remaining, 8192))
+            if not chunk:
+                return True
+            remaining -= len(chunk)
+        return not resp.read(1)
+
+    def _connect(self, origin, timeout):
+        scheme, host, port = origin
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=timeout,
+                    context=self.ssl_context)
+        else:
+            return http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _get_connection(self, origin, timeout):
+        with self.lock:
+            conns = self.idle.get(origin)
+            conn = conns.pop() if conns else None
+
+        if conn is None:
+            return self._connect(origin, timeout), False
+
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _put_connection(self, origin, conn):
+        with self.lock:
+            conns = self.idle.setdefault(origin, [])
+            if len(conns) < self.max_idle_per_host:
+                conns.append(conn)
+                return
+        conn.close()
+
+
+class CachingPinger(Pinger):
+    """Mantém em cache os resultados das verificações realizadas por outra
+    instância de :class:`Pinger`.
+
+    Os resultados são armazenados por URL, com tempos de vida distintos para
+    sucessos (`ok_ttl`) e falhas (`fail_ttl`). Adicionalmente, os hosts que
+    não puderam ser alcançados são armazenados por `host_fail_ttl` segundos,
+    durante os quais todas as suas URLs são consideradas inválidas.
+
+    :param pinger: instância de :class:`Pinger` a ser envolvida.
+    :param ok_ttl: (opcional) tempo de vida, em segundos, dos sucessos.
+    :param fail_ttl: (opcional) tempo de vida, em segundos, das falhas.
+    :param host_fail_ttl: (opcional) tempo de vida, em segundos, dos hosts
+                          inalcançáveis.
+    :param maxsize: (opcional) número máximo de entradas em cada cache.
+    """
+    def __init__(self, pinger, ok_ttl=3600, fail_ttl=60, host_fail_ttl=30,
+            maxsize=10000):
+        self.pinger = pinger
+        self.ok_urls = LRUCache(maxsize, ok_ttl or None)
+        self.failed_urls = LRUCache(maxsize, fail_ttl or None)
+        self.failed_hosts = LRUCache(maxsize, host_fail_ttl or None)
+
+    def check(self, url, timeout):
+        result = self.ok_urls.get(url) or self.failed_urls.get(url)
+        if result is not None:
+            return result
+
+        host = urllib.parse.urlsplit(url).hostname
+        if host and self.failed_hosts.get(host) is not None:
+            LOGGER.info('host of URL "%s" was recently unreachable', url)
+            return PingResult(alive=False, reachable=False)
+
+        result = self.pinger.check(url, timeout)
+        if result.alive:
+            self.ok_urls.set(url, result)
+        elif result.reachable is not None:
+            self.failed_urls.set(url, result)
+            if not result.reachable and host:
+                self.failed_hosts.set(host, True)
+        return result
+
+    def stats(self):
+        """Contadores de acertos, ausências e remoções de cada cache.
+        """
+        return {'ok_urls': self.ok_urls.stats(),
+                'failed_urls': self.failed_urls.stats(),
+                'failed_hosts': self.failed_hosts.stats()}
@@ -0,0 +1,144 @@
+"""Variantes pré-comprimidas dos arquivos estáticos.
+
+As variantes são gravadas ao lado dos arquivos originais, com as extensões
+de :attr:`mimetypes.encodings_map`, durante a construção do pacote ou a
+implantação, por meio de ``nurl-manage precompress-assets``, e servidas com
+o cabeçalho ``Content-Encoding`` correspondente aos clientes que as aceitam.
+A aplicação não grava as variantes, pois o diretório do pacote instalado
+pode não admitir escrita. A codificação ``br`` requer o pacote opcional
+``brotli``.
+"""
+import gzip
+import logging
+import os
+from collections import OrderedDict
+
+
+__all__ = ['ENCODINGS', 'parse_encodings', 'precompress',
+        'precompress_directory', 'choose_encoding']
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+# codificações suportadas, em ordem de preferência, e as extensões das
+# respectivas variantes.
+ENCODINGS = OrderedDict([('br', '.br'), ('gzip', '.gz')])
+# arquivos estáticos cujas variantes são produzidas.
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg')
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        'webapp', 'static')
+
+
+def _brotli_compress(data):
+    import brotli
+    return brotli.compress(data, quality=11)
+
+
+def _gzip_compress(data):
+    return gzip.compress(data, compresslevel=9)
+
+
+COMPRESSORS = {'br': _brotli_compress, 'gzip': _gzip_compress}
+
+
+def is_available(encoding):
+    if encoding == 'br':
+        try:
+            import brotli
+        except ImportError:
+            return False
+    return encoding in COMPRESSORS
+
+
+def parse_encodings(value):
+    """Obtém a lista de codificações a partir de `value`, em que são
+    separadas por espaços, p.ex. ``br gzip``.
+    """
+    encodings = value.split()
+    for encoding in encodings:
+        if encoding not in ENCODINGS:
+            raise ValueError('unknown content encoding "%s"' % encoding)
+    return encodings
+
+
+def precompress(path, encodings):
+    """Grava as variantes de `path` nas codificações `encodings`, caso
+    inexistentes ou mais antigas que o próprio arquivo. Retorna as
+    codificações cujas variantes estão disponíveis.
+    """
+    mtime = os.stat(path).st_mtime
+    data = None
+    available = []
+    for encoding in encodings:
+        variant = path + ENCODINGS[encoding]
+        try:
+            if os.stat(variant).st_mtime >= mtime:
+                available.append(encoding)
+                continue
+        except FileNotFoundError:
+            pass
+
+        if not is_available(encoding):
+            LOGGER.warning('cannot precompress "%s" with "%s": missing '
+                    'optional dependency', path, encoding)
+            continue
+
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        try:
+            # a variante é substituída atomicamente, pois pode estar sendo
+            # servida por outro processo.
+            tmp_path = '%s.%s.tmp' % (variant, os.getpid())
+            with open(tmp_path, 'wb') as f:
+                f.write(COMPRESSORS[encoding](data))
+            os.replace(tmp_path, variant)
+        except OSError as exc:
+            LOGGER.warning('cannot write "%s": %s', variant, exc)
+            continue
+
+        LOGGER.info('precompressed "%s" with "%s"', path, encoding)
+        available.append(encoding)
+    return available
+
+
+def precompress_directory(directory, encodings):
+    """Grava, por meio de :func:`precompress`, as variantes dos arquivos de
+    `directory` e seus subdiretórios cujas extensões pertencem a
+    :data:`COMPRESSIBLE_EXTENSIONS`. Retorna a lista dos arquivos processados.
+    """
+    paths = []
+    for dirpath, _, filenames in os.walk(directory):
+        for filename in sorted(filenames):
+            if filename.endswith(COMPRESSIBLE_EXTENSIONS):
+                path = os.path.join(dirpath, filename)
+                precompress(path, encodings)
+                paths.append(path)
+    return paths
+
+
+def choose_encoding(accept_encoding, encodings):
+    """Escolhe, dentre `encodings`, a codificação preferida aceita pelo
+    cliente de acordo com o cabeçalho `accept_encoding`, ou `None`.
+    """
+    accepted = set()
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.partition(';')
+        name = name.strip().lower()
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            accepted.add(name)
+
+    for encoding in ENCODINGS:
+        if encoding in encodings and (encoding in accepted or
+                                      '*' in accepted):
+            return encoding
+    return None
@@ -5,17 +5,26 @@ serem utilizados em view-functions.
 """
 import os
 import sys
+import time
 import logging
+from datetime import datetime
 
 from pyramid.events import NewRequest
 from pyramid.settings import asbool
-import pymongo
 
 from nurl import (
         base28,
+        bloom,
+        metrics,
+        mongodb,
         datastores,
         trackers,
+        pingers,
+        idgenerators,
         shortener,
+        sqlite,
+        snapshot,
+        whitelists,
         )
 
 
@@ -23,15 +32,68 @@ LOGGER = logging.getLogger(__name__)
 
 
 DEFAULT_SETTINGS = [
+        ('nurl.backend', 'NURL_BACKEND', str, 'mongodb'),
+        ('nurl.sqlite.path', 'NURL_SQLITE_PATH', str, 'nurl.sqlite3'),
         ('nurl.mongodb.uri', 'NURL_MONGODB_URI', str, 'mongodb://localhost:27017/'),
         ('nurl.mongodb.db', 'NURL_MONGODB_DB', str, 'nurl'),
         ('nurl.mongodb.data_col', 'NURL_MONGODB_DATA_COL', str, 'urls'),
         ('nurl.mongodb.tracker_col', 'NURL_MONGODB_TRACKER_COL', str,'accesses'),
+        ('nurl.mongodb.counters_col', 'NURL_MONGODB_COUNTERS_COL', str, 'access_counters'),
+        ('nurl.mongodb.sequences_col', 'NURL_MONGODB_SEQUENCES_COL', str, 'sequences'),
+        ('nurl.mongodb.max_pool_size', 'NURL_MONGODB_MAX_POOL_SIZE', int, 100),
+        ('nurl.mongodb.min_pool_size', 'NURL_MONGODB_MIN_POOL_SIZE', int, 0),
+        ('nurl.mongodb.connect_timeout_ms', 'NURL_MONGODB_CONNECT_TIMEOUT_MS', int, 5000),
+        ('nurl.mongodb.socket_timeout_ms', 'NURL_MONGODB_SOCKET_TIMEOUT_MS', int, 0),
+        ('nurl.mongodb.server_selection_timeout_ms', 'NURL_MONGODB_SERVER_SELECTION_TIMEOUT_MS', int, 10000),
+        ('nurl.mongodb.wait_queue_timeout_ms', 'NURL_MONGODB_WAIT_QUEUE_TIMEOUT_MS', int, 0),
+        ('nurl.mongodb.read_preference', 'NURL_MONGODB_READ_PREFERENCE', str, 'primary'),
         ('nurl.whitelist.path', 'NURL_WHITELIST_PATH', str, ''),
         ('nurl.whitelist.enabled', 'NURL_WHITELIST_ENABLED', asbool, False),
         ('nurl.whitelist.auto_www', 'NURL_WHITELIST_AUTO_WWW', asbool, True),
+        ('nurl.whitelist.reload_interval', 'NURL_WHITELIST_RELOAD_INTERVAL', float, 5.0),
         ('nurl.shortref_len', 'NURL_SHORTREF_LEN', int, 6),
+        ('nurl.idgen.strategy', 'NURL_IDGEN_STRATEGY', str, 'random'),
+        ('nurl.idgen.key', 'NURL_IDGEN_KEY', str, ''),
+        ('nurl.idgen.block_size', 'NURL_IDGEN_BLOCK_SIZE', int, 100),
+        ('nurl.idgen.max_len', 'NURL_IDGEN_MAX_LEN', int, 8),
+        ('nurl.idgen.max_collision_rate', 'NURL_IDGEN_MAX_COLLISION_RATE', float, 0.1),
+        ('nurl.idgen.max_consecutive_collisions', 'NURL_IDGEN_MAX_CONSECUTIVE_COLLISIONS', int, 5),
+        ('nurl.idgen.window', 'NURL_IDGEN_WINDOW', int, 1000),
+        ('nurl.canonical.enabled', 'NURL_CANONICAL_ENABLED', asbool, True),
+        ('nurl.canonical.sort_query', 'NURL_CANONICAL_SORT_QUERY', asbool, False),
+        ('nurl.canonical.strip_params', 'NURL_CANONICAL_STRIP_PARAMS', str, ''),
         ('nurl.ping_timeout', 'NURL_PING_TIMEOUT', int, 8),
+        ('nurl.redirect.fast_path', 'NURL_REDIRECT_FAST_PATH', asbool, True),
+        ('nurl.redirect.status', 'NURL_REDIRECT_STATUS', int, 301),
+        ('nurl.redirect.max_age', 'NURL_REDIRECT_MAX_AGE', int, 86400),
+        ('nurl.redirect.immutable', 'NURL_REDIRECT_IMMUTABLE', asbool, False),
+        ('nurl.static.encodings', 'NURL_STATIC_ENCODINGS', str, 'br gzip'),
+        ('nurl.batch.max_size', 'NURL_BATCH_MAX_SIZE', int, 1000),
+        ('nurl.batch.workers', 'NURL_BATCH_WORKERS', int, 8),
+        ('nurl.ping.strategy', 'NURL_PING_STRATEGY', str, 'http'),
+        ('nurl.ping.max_per_host', 'NURL_PING_MAX_PER_HOST', int, 4),
+        ('nurl.ping.cache.enabled', 'NURL_PING_CACHE_ENABLED', asbool, True),
+        ('nurl.ping.cache.maxsize', 'NURL_PING_CACHE_MAXSIZE', int, 10000),
+        ('nurl.ping.cache.ok_ttl', 'NURL_PING_CACHE_OK_TTL', int, 3600),
+        ('nurl.ping.cache.fail_ttl', 'NURL_PING_CACHE_FAIL_TTL', int, 60),
+        ('nurl.ping.cache.host_fail_ttl', 'NURL_PING_CACHE_HOST_FAIL_TTL', int, 30),
+        ('nurl.snapshot.path', 'NURL_SNAPSHOT_PATH', str, ''),
+        ('nurl.bloom.enabled', 'NURL_BLOOM_ENABLED', asbool, False),
+        ('nurl.bloom.capacity', 'NURL_BLOOM_CAPACITY', int, 2000000),
+        ('nurl.bloom.error_rate', 'NURL_BLOOM_ERROR_RATE', float, 0.001),
+        ('nurl.bloom.path', 'NURL_BLOOM_PATH', str, ''),
+        ('nurl.cache.enabled', 'NURL_CACHE_ENABLED', asbool, True),
+        ('nurl.cache.maxsize', 'NURL_CACHE_MAXSIZE', int, 100000),
+        ('nurl.cache.ttl', 'NURL_CACHE_TTL', int, 0),
+        ('nurl.tracker.mode', 'NURL_TRACKER_MODE', str, 'buffered'),
+        ('nurl.tracker.storage', 'NURL_TRACKER_STORAGE', str, 'raw'),
+        ('nurl.tracker.by_referrer', 'NURL_TRACKER_BY_REFERRER', asbool, False),
+        ('nurl.tracker.max_batch', 'NURL_TRACKER_MAX_BATCH', int, 500),
+        ('nurl.tracker.flush_interval', 'NURL_TRACKER_FLUSH_INTERVAL', float, 1.0),
+        ('nurl.tracker.max_queued', 'NURL_TRACKER_MAX_QUEUED', int, 10000),
+        ('nurl.tracker.overflow', 'NURL_TRACKER_OVERFLOW', str, 'drop_new'),
+        ('nurl.metrics.enabled', 'NURL_METRICS_ENABLED', asbool, True),
+        ('nurl.metrics.dir', 'NURL_METRICS_DIR', str, ''),
         ]
 
 
@@ -55,24 +117,59 @@ def parse_settings(settings):
 
 def includeme(config):
     settings = parse_settings(config.registry.settings)
+    settings['nurl.redirect.cache_control'] = get_redirect_cache_control(
+            settings)
     config.registry.settings.update(settings)
 
-    # mongodb client
-    mongodb_uri = settings['nurl.mongodb.uri']
-    mongodb_name = settings['nurl.mongodb.db']
-    mongodb_dscol = settings['nurl.mongodb.data_col']
-    mongodb_trcol = settings['nurl.mongodb.tracker_col']
+    instrumentation = get_instrumentation(settings)
+    instrument = lambda wrapper, obj, component: (obj
+            if instrumentation is None
+            else wrapper(obj, instrumentation, component=component))
 
-    mongodb_client = pymongo.MongoClient(mongodb_uri, appname='nURL')
-    data_collection = mongodb_client[mongodb_name][mongodb_dscol]
-    trac_collection = mongodb_client[mongodb_name][mongodb_trcol]
-    LOGGER.info('connecting to MongoDB instance "%s"', repr(mongodb_client))
+    backend = settings['nurl.backend']
+    if backend == 'mongodb':
+        mongodb_uri = settings['nurl.mongodb.uri']
+        mongodb_name = settings['nurl.mongodb.db']
+        mongodb_dscol = settings['nurl.mongodb.data_col']
+        mongodb_trcol = settings['nurl.mongodb.tracker_col']
+        mongodb_cncol = settings['nurl.mongodb.counters_col']
+        mongodb_sqcol = settings['nurl.mongodb.sequences_col']
+
+        # o cliente é criado no primeiro acesso de cada worker, após o
+        # `fork`, e os índices por meio de `nurl-manage create-indexes`.
+        database = mongodb.LazyDatabase(mongodb_uri, mongodb_name,
+                mongodb.get_client_options(settings))
+        LOGGER.info('using the MongoDB database %r', database)
+
+        datastore = datastores.MongoDBDataStore(database[mongodb_dscol])
+        sequence_factory = lambda: idgenerators.MongoDBSequence(
+                database[mongodb_sqcol])
+        raw_tracker_factory = lambda: trackers.MongoDBTracker(
+                database[mongodb_trcol])
+        aggregating_tracker_factory = lambda by_referrer: (
+                trackers.MongoDBAggregatingTracker(database[mongodb_cncol],
+                    by_referrer=by_referrer))
+    elif backend == 'sqlite':
+        sqlite_path = settings['nurl.sqlite.path']
+        sqlite_pool = sqlite.ConnectionPool(sqlite_path)
+        LOGGER.info('using the SQLite database at "%s"', sqlite_path)
+
+        datastore = datastores.SQLiteDataStore(sqlite_pool)
+        sequence_factory = lambda: idgenerators.SQLiteSequence(sqlite_pool)
+        raw_tracker_factory = lambda: trackers.SQLiteTracker(sqlite_pool)
+        aggregating_tracker_factory = None
+    else:
+        raise ValueError('unknown backend "%s"' % backend)
+
+    datastore = instrument(metrics.InstrumentedDataStore, datastore,
+            'store_backend')
 
     if settings['nurl.whitelist.enabled']:
         whitelist_path = settings['nurl.whitelist.path']
         whitelist_auto_www = settings['nurl.whitelist.auto_www']
-        with open(whitelist_path) as wl_file:
-            whitelist = get_whitelist(wl_file, whitelist_auto_www)
+        whitelist = whitelists.WhitelistFile(whitelist_path,
+                auto_www=whitelist_auto_www,
+                reload_interval=settings['nurl.whitelist.reload_interval'])
 
         # torna a lista disponível para a webapp
         config.registry.settings['nurl.whitelist'] = whitelist
@@ -85,15 +182,75 @@ def includeme(config):
         whitelist = None
 
     # subscribers
-    shortid_len = settings['nurl.shortref_len']
-    idgen = lambda: base28.igenerate_id(shortid_len)
-    access_tracker = trackers.MongoDBTracker(trac_collection)
-    datastore = datastores.MongoDBDataStore(data_collection)
+    idgen = get_idgen(settings, sequence_factory)
+    tracker_storage = settings['nurl.tracker.storage']
+    if tracker_storage == 'raw':
+        access_tracker = raw_tracker_factory()
+    elif tracker_storage == 'aggregated':
+        if aggregating_tracker_factory is None:
+            raise ValueError('the "%s" backend does not support aggregated '
+                    'tracker storage' % backend)
+        access_tracker = aggregating_tracker_factory(
+                settings['nurl.tracker.by_referrer'])
+    else:
+        raise ValueError('unknown tracker storage "%s"' % tracker_storage)
+    LOGGER.info('storing accesses as "%s" records', tracker_storage)
+    access_tracker = instrument(metrics.InstrumentedTracker, access_tracker,
+            'tracker_backend')
+
+    tracker_mode = settings['nurl.tracker.mode']
+    if tracker_mode == 'buffered':
+        access_tracker = trackers.BufferedTracker(access_tracker,
+                max_batch=settings['nurl.tracker.max_batch'],
+                flush_interval=settings['nurl.tracker.flush_interval'],
+                max_queued=settings['nurl.tracker.max_queued'],
+                overflow=settings['nurl.tracker.overflow'])
+    elif tracker_mode != 'sync':
+        raise ValueError('unknown tracker mode "%s"' % tracker_mode)
+    LOGGER.info('tracking accesses in "%s" mode', tracker_mode)
+    access_tracker = instrument(metrics.InstrumentedTracker, access_tracker,
+            'tracker')
+    snapshot_path = settings['nurl.snapshot.path']
+    if snapshot_path:
+        url_snapshot = snapshot.Snapshot(snapshot_path)
+        datastore = datastores.SnapshotDataStore(datastore, url_snapshot)
+        LOGGER.info('serving %s pairs from the snapshot at "%s"',
+                len(url_snapshot), snapshot_path)
+    else:
+        LOGGER.info('snapshot of short refs is not being used')
+
+    if settings['nurl.bloom.enabled']:
+        datastore = get_bloom_filtered_store(datastore,
+                path=settings['nurl.bloom.path'],
+                capacity=settings['nurl.bloom.capacity'],
+                error_rate=settings['nurl.bloom.error_rate'],
+                ref_lengths=get_ref_lengths(settings))
+    else:
+        LOGGER.info('bloom filter for short refs is disabled')
+
+    if settings['nurl.cache.enabled']:
+        cache_maxsize = settings['nurl.cache.maxsize']
+        cache_ttl = settings['nurl.cache.ttl'] or None
+        datastore = datastores.CachingDataStore(datastore,
+                maxsize=cache_maxsize, ttl=cache_ttl)
+        LOGGER.info('caching up to %s entries (ttl: %s)', cache_maxsize,
+                cache_ttl)
+    else:
+        LOGGER.info('datastore cache is disabled')
+    datastore = instrument(metrics.InstrumentedDataStore, datastore, 'store')
     ping_timeout = settings['nurl.ping_timeout']
+    pinger = get_pinger(settings, instrumentation)
 
     nurl = shortener.Nurl(datastore, idgen, tracker=access_tracker, 
-            whitelist=whitelist, timeout=ping_timeout)
+            whitelist=whitelist, timeout=ping_timeout, pinger=pinger,
+            batch_workers=settings['nurl.batch.workers'],
+            canonicalize=get_canonicalizer(settings))
     LOGGER.debug('using the nURL instance "%s"', repr(nurl))
+    nurl = instrument(metrics.InstrumentedShortener, nurl, 'shortener')
+
+    if instrumentation is not None:
+        config.registry.settings['nurl.instrumentation'] = instrumentation
+        config.add_tween('nurl.pyramid_nurl.metrics_tween_factory')
 
     config.registry.settings['nurl'] = nurl
     config.registry.settings['tracker'] = access_tracker
@@ -101,6 +258,181 @@ def includeme(config):
     config.add_subscriber(add_access_tracker, NewRequest)
 
 
+def get_idgen(settings, sequence_factory):
+    """Constrói o gerador de IDs de acordo com as configurações
+    ``nurl.idgen.*``. `sequence_factory` é utilizado apenas pela estratégia
+    ``leased``, e deve retornar uma instância de
+    :class:`nurl.idgenerators.Sequence`.
+    """
+    shortid_len = settings['nurl.shortref_len']
+    strategy = settings['nurl.idgen.strategy']
+    if strategy == 'random':
+        idgen = lambda: base28.igenerate_id(shortid_len)
+    elif strategy == 'adaptive':
+        idgen = idgenerators.AdaptiveIdGenerator(shortid_len,
+                max_length=settings['nurl.idgen.max_len'],
+                max_collision_rate=settings['nurl.idgen.max_collision_rate'],
+                max_consecutive_collisions=settings[
+                    'nurl.idgen.max_consecutive_collisions'],
+                window=settings['nurl.idgen.window'])
+    elif strategy == 'leased':
+        idgen = idgenerators.LeasedIdGenerator(sequence_factory(),
+                shortid_len, settings['nurl.idgen.key'].encode('utf-8'),
+                block_size=settings['nurl.idgen.block_size'])
+    else:
+        raise ValueError('unknown id generation strategy "%s"' % strategy)
+
+    LOGGER.info('generating ids with the "%s" strategy', strategy)
+    return idgen
+
+
+def get_ref_lengths(settings):
+    """Comprimentos possíveis das referências curtas geradas.
+    """
+    shortid_len = settings['nurl.shortref_len']
+    if settings['nurl.idgen.strategy'] == 'adaptive':
+        max_len = max(shortid_len, settings['nurl.idgen.max_len'])
+        return list(range(shortid_len, max_len + 1))
+    else:
+        return [shortid_len]
+
+
+REDIRECT_REASONS = {301: 'Moved Permanently', 302: 'Found'}
+
+
+def get_redirect_cache_control(settings):
+    """Obtém o valor do cabeçalho ``Cache-Control`` dos redirecionamentos
+    de acordo com as configurações ``nurl.redirect.*``.
+
+    Os redirecionamentos permanentes podem ser armazenados em cache por
+    ``nurl.redirect.max_age`` segundos, já que as referências nunca são
+    alteradas. Os temporários (302) são sempre revalidados, de maneira que
+    todos os acessos chegam ao servidor e são registrados.
+    """
+    status = settings['nurl.redirect.status']
+    if status not in REDIRECT_REASONS:
+        raise ValueError('unsupported redirect status "%s"' % status)
+
+    max_age = settings['nurl.redirect.max_age']
+    if status == 302 or max_age <= 0:
+        return 'no-cache'
+
+    cache_control = 'public, max-age=%s' % max_age
+    if settings['nurl.redirect.immutable']:
+        cache_control += ', immutable'
+    return cache_control
+
+
+def get_canonicalizer(settings):
+    """Constrói a instância de :class:`nurl.shortener.URLCanonicalizer` de
+    acordo com as configurações ``nurl.canonical.*``, ou `None`.
+    """
+    if not settings['nurl.canonical.enabled']:
+        LOGGER.info('URL canonicalization is disabled')
+        return None
+
+    strip_params = settings['nurl.canonical.strip_params'].split()
+    LOGGER.info('canonicalizing URLs (sort query: %s, strip params: %s)',
+            settings['nurl.canonical.sort_query'], strip_params)
+    return shortener.URLCanonicalizer(
+            sort_query=settings['nurl.canonical.sort_query'],
+            strip_params=strip_params)
+
+
+def get_pinger(settings, instrumentation=None):
+    """Constrói a instância de :class:`nurl.pingers.Pinger` de acordo com as
+    configurações ``nurl.ping.*``. Com `instrumentation`, uma instância de
+    :class:`nurl.metrics.Instrumentation`, são registradas as durações das
+    verificações realizadas e das servidas pelo cache.
+    """
+    strategy = settings['nurl.ping.strategy']
+    if strategy == 'http':
+        pinger = pingers.HTTPPinger(
+                max_per_host=settings['nurl.ping.max_per_host'])
+    elif strategy == 'urlopen':
+        pinger = pingers.UrlopenPinger()
+    else:
+        raise ValueError('unknown ping strategy "%s"' % strategy)
+    LOGGER.info('checking URLs with the "%s" ping strategy', strategy)
+
+    if instrumentation is not None:
+        pinger = metrics.InstrumentedPinger(pinger, instrumentation,
+                component='pinger_backend')
+
+    if settings['nurl.ping.cache.enabled']:
+        pinger = pingers.CachingPinger(pinger,
+                ok_ttl=settings['nurl.ping.cache.ok_ttl'],
+                fail_ttl=settings['nurl.ping.cache.fail_ttl'],
+                host_fail_ttl=settings['nurl.ping.cache.host_fail_ttl'],
+                maxsize=settings['nurl.ping.cache.maxsize'])
+    else:
+        LOGGER.info('ping results cache is disabled')
+
+    if instrumentation is not None:
+        pinger = metrics.InstrumentedPinger(pinger, instrumentation)
+    return pinger
+
+
+def get_instrumentation(settings):
+    """Constrói a instância de :class:`nurl.metrics.Instrumentation` de
+    acordo com as configurações ``nurl.metrics.*``, ou `None`.
+    """
+    if not settings['nurl.metrics.enabled']:
+        LOGGER.info('metrics are disabled')
+        return None
+
+    metrics_dir = settings['nurl.metrics.dir']
+    if metrics_dir:
+        LOGGER.info('aggregating metrics of all processes at "%s"',
+                metrics_dir)
+    else:
+        LOGGER.info('exposing metrics of each process separately')
+    return metrics.Instrumentation(metrics.Registry(metrics_dir or None))
+
+
+def get_bloom_filtered_store(store, path, capacity, error_rate,
+        ref_lengths=None):
+    """Envolve `store` em :class:`nurl.datastores.BloomFilteredDataStore`.
+
+    O filtro é carregado a partir de `path`, quando existente, e atualizado
+    com as chaves armazenadas desde então. Caso contrário, é construído a
+    partir de todas as chaves de `store` e gravado em `path`. Em ambos os
+    casos, o acesso a `store` ocorre apenas na primeira consulta de cada
+    processo.
+    """
+    if path and os.path.exists(path):
+        bloom_filter = bloom.BloomFilter.load(path)
+        synced_at = datetime.utcfromtimestamp(os.path.getmtime(path))
+        LOGGER.info('loaded the bloom filter from "%s"', path)
+    else:
+        bloom_filter = bloom.BloomFilter(capacity, error_rate)
+        synced_at = None
+
+    return datastores.BloomFilteredDataStore(store, bloom_filter,
+            ref_lengths=ref_lengths, synced_at=synced_at, path=path or None)
+
+
+def metrics_tween_factory(handler, registry):
+    """Registra a duração e o status das respostas de cada rota.
+    """
+    instrumentation = registry.settings['nurl.instrumentation']
+
+    def metrics_tween(request):
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = handler(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.matched_route
+            instrumentation.observe_request(
+                    route.name if route is not None else 'notfound', status,
+                    time.perf_counter() - start)
+
+    return metrics_tween
+
+
 def add_nurl(event):
     settings = event.request.registry.settings
     event.request.nurl = settings['nurl']
@@ -112,13 +444,6 @@ def add_access_tracker(event):
 
 
 def get_whitelist(whitelist, auto_www=False):
-    if auto_www:
-        hostnames = []
-        for host in whitelist:
-            hostnames.append(host.strip('\n'))
-            if not host.startswith('www'):
-                hostnames.append('www.' + host.strip('\n'))
-        return set(hostnames)
-    else:
-        return set((host.strip('\n') for host in whitelist))
+    return whitelists.HostnameWhitelist(
+            whitelists.parse_rules(whitelist, auto_www))
 
@@ -1,22 +1,49 @@
+import re
+import fnmatch
 import urllib.parse
 import urllib.request
-import urllib.error
-import socket
 import logging
+import threading
+import concurrent.futures
+from collections import namedtuple
 
 from . import (
     datastores,
     trackers,
+    pingers,
+    whitelists,
     )
 
 
-__all__ = ['Nurl', 'URLError', 'NotExists']
+__all__ = ['Nurl', 'URLError', 'NotExists', 'ShortenResult',
+        'URLCanonicalizer']
 
 
 LOGGER = logging.getLogger(__name__)
 
 
 DEFAULT_TIMEOUT = 10  # segundos
+DEFAULT_BATCH_WORKERS = 8
+# quantidade de colisões em um único encurtamento a partir da qual um alerta
+# é registrado.
+COLLISIONS_WARNING_THRESHOLD = 3
+# a URL já existe, mas não pode ser obtida por meio do resumo, p.ex. antes da
+# execução de ``nurl-manage backfill-plain-hash``.
+UNREACHABLE_DUPLICATE_MSG = ('URL "%s" is already stored but cannot be found '
+        'by its plain_hash; run nurl-manage backfill-plain-hash')
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+# parâmetros de rastreamento de campanhas comumente incluídos nas URLs.
+TRACKING_PARAMS = ('utm_*', 'gclid', 'fbclid', 'mc_cid', 'mc_eid')
+
+
+ShortenResult = namedtuple('ShortenResult', 'url short_ref error')
+ShortenResult.__doc__ = """Resultado do encurtamento de uma URL em lote.
+
+Apenas um dos campos `short_ref` e `error` é preenchido. Os valores possíveis
+de `error` são ``invalid_url``, ``hostname_not_allowed``, ``unreachable``,
+``no_available_id`` e ``hash_collision``, quando a URL não pode ser armazenada
+nem obtida por meio do seu resumo.
+"""
 
 
 class URLError(Exception):
@@ -26,6 +53,7 @@ class URLError(Exception):
       - Ausência do `scheme`;
       - Não é possível resolver ou alcançar o servidor;
       - Nome do host não faz parte da lista dos permitidos;
+      - O resumo da URL coincide com o de outra URL já armazenada;
     """
 
 
@@ -34,67 +62,425 @@ class NotExists(Exception):
     """
 
 
-class Nurl:
-    """Encurtador de URLs.
+class CollisionStats:
+    """Estatísticas das colisões de chaves ocorridas ao armazenar novas URLs.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stored = 0
+        self.attempts = 0
+        self.collisions = 0
+        self.max_consecutive_collisions = 0
 
-    :param store: instância de :class:`nurl.lib.datastores.DataStore`.
-    :param idgen: executável que produz uma lista de IDs pseudo-aleatórios.
-    :param whitelist: (opcional) coleção de strings de texto representando
-                      hostnames permitidos de serem encurtados. O valor `None`
-                      desliga o filtro.
-    :param tracker: (opcional) instância de :class:`nurl.lib.trackers.Tracker`.
-    :param timeout: (opcional) tempo máximo, em segundos, para resposta do 
-                    ping.
+    def record(self, attempts, collisions, stored=1):
+        with self.lock:
+            self.stored += stored
+            self.attempts += attempts
+            self.collisions += collisions
+            if stored == 1:
+                self.max_consecutive_collisions = max(collisions,
+                        self.max_consecutive_collisions)
+
+    def as_dict(self):
+        with self.lock:
+            return {'stored': self.stored,
+                    'attempts': self.attempts,
+                    'collisions': self.collisions,
+                    'collision_rate': (self.collisions / self.attempts
+                                       if self.attempts else 0.0),
+                    'max_consecutive_collisions':
+                        self.max_consecutive_collisions}
+
+
+def record_id_outcome(ids, collided):
+    """Informa ao iterador de IDs `ids`, caso suportado, se o último ID obtido
+    colidiu com uma chave existente ou foi armazenado. Ver
+    :class:`nurl.idgenerators.AdaptiveIds`.
     """
-    def __init__(self, store, idgen, whitelist=None, tracker=None, 
-            timeout=DEFAULT_TIMEOUT):
+    hook = getattr(ids, 'record_collision' if collided else 'record_success',
+            None)
+    if hook is not None:
+        hook()
+
+
+class URLCanonicalizer:
+    """Reescreve as URLs em uma forma canônica, para que variações de uma
+    mesma URL sejam armazenadas apenas uma vez.
+
+    O nome do esquema e do host são convertidos para minúsculas, e a porta
+    padrão do esquema e os delimitadores de *query string* e de fragmento
+    vazios são removidos. Opcionalmente, os parâmetros da *query string* são
+    ordenados pelo nome e os parâmetros cujos nomes correspondem a algum dos
+    padrões de `strip_params` são removidos. A codificação dos parâmetros é
+    mantida. As URLs que não podem ser analisadas são retornadas inalteradas.
+
+    :param sort_query: (opcional) ordena os parâmetros da *query string*.
+    :param strip_params: (opcional) padrões, no formato do módulo `fnmatch`,
+                         dos nomes dos parâmetros a serem removidos, p.ex.
+                         :data:`TRACKING_PARAMS`.
+    """
+    HOSTPORT = re.compile(r'^(\[[^\]]*\]|[^:]*)(?::(\d*))?$')
+
+    def __init__(self, sort_query=False, strip_params=()):
+        self.sort_query = sort_query
+        self.strip_params = tuple(strip_params)
+
+        # as etapas são definidas uma única vez, de acordo com as opções.
+        if self.strip_params:
+            pattern = '|'.join(fnmatch.translate(param.lower())
+                               for param in self.strip_params)
+            self.is_stripped = re.compile(pattern).match
+        else:
+            self.is_stripped = None
+
+        if self.sort_query or self.is_stripped:
+            self.canonical_query = self._rewrite_query
+        else:
+            self.canonical_query = lambda query: query
+
+    def _rewrite_query(self, query):
+        params = [param for param in query.split('&') if param]
+        if self.is_stripped:
+            params = [param for param in params
+                      if not self.is_stripped(self._param_name(param))]
+        if self.sort_query:
+            params.sort(key=self._param_name)
+        return '&'.join(params)
+
+    @staticmethod
+    def _param_name(param):
+        return urllib.parse.unquote_plus(param.partition('=')[0]).lower()
+
+    def canonical_netloc(self, scheme, netloc):
+        userinfo, at, hostport = netloc.rpartition('@')
+        match = self.HOSTPORT.match(hostport)
+        if match is None:
+            return netloc
+
+        host, port = match.groups()
+        hostport = host.lower()
+        if port and port != DEFAULT_PORTS.get(scheme):
+            hostport += ':' + port
+        return userinfo + at + hostport
+
+    def __call__(self, url):
+        try:
+            parts = urllib.parse.urlsplit(url)
+        except ValueError:
+            return url
+
+        scheme = parts.scheme.lower()
+        return urllib.parse.urlunsplit((scheme,
+                self.canonical_netloc(scheme, parts.netloc), parts.path,
+                self.canonical_query(parts.query), parts.fragment))
+
+
+class BaseNurl:
+    """Regras do encurtamento de URLs comuns a :class:`Nurl` e
+    :class:`nurl.aio.shortener.AsyncNurl`.
+
+    As etapas do encurtamento são geradores que produzem as operações de E/S
+    a serem executadas, na forma de tuplas ``(operação, argumentos...)``, e
+    recebem os seus resultados ou exceções. As operações são ``key``,
+    ``key_many``, ``set`` e ``set_many``, sobre o `store`, e ``ping`` e
+    ``ping_many``, sobre instâncias de :class:`URLChecker`. Cada subclasse
+    executa as operações por meio do método `_run`, de maneira síncrona ou
+    assíncrona.
+    """
+    def __init__(self, store, idgen, whitelist=None, tracker=None,
+            timeout=DEFAULT_TIMEOUT, pinger=None,
+            batch_workers=DEFAULT_BATCH_WORKERS, canonicalize=None):
         self.store = store
         self.idgen = idgen
-        self.whitelist = set(whitelist) if whitelist else None
+        if isinstance(whitelist, whitelists.Whitelist):
+            self.whitelist = whitelist
+        elif whitelist:
+            self.whitelist = whitelists.HostnameWhitelist(whitelist)
+        else:
+            self.whitelist = None
         self.tracker = tracker
         self.timeout = timeout
+        self.pinger = pinger
+        self.batch_workers = batch_workers
+        self.canonicalize = canonicalize
+        self.collision_stats = CollisionStats()
 
-    def shorten(self, url):
-        if not is_valid_url(url, self.whitelist, self.timeout):
+    def _shorten_steps(self, url):
+        if self.canonicalize is not None:
+            url = self.canonicalize(url)
+
+        try:
+            uc = URLChecker(url, self.whitelist, self.timeout, self.pinger)
+        except ValueError as exc:
+            LOGGER.info('cannot check URL "%s": %s', url, str(exc))
+            raise URLError() from None
+
+        if not uc.is_allowed_hostname():
+            raise URLError()
+
+        # URLs já encurtadas dispensam a verificação de conectividade.
+        try:
+            return (yield ('key', url))
+        except KeyError:
+            pass
+
+        if not (yield ('ping', uc)):
             raise URLError()
 
-        for attempt, shortid in enumerate(self.idgen()):
+        ids = self.idgen()
+        for attempt, shortid in enumerate(ids):
             LOGGER.info('attempt #%s to shorten "%s"', attempt, url)
             try:
-                self.store[shortid] = url
+                yield ('set', shortid, url)
             except datastores.DuplicatedKeyError:
                 LOGGER.info('could not store an URL due to a collision on key')
+                record_id_outcome(ids, collided=True)
                 continue
+            except datastores.PlainHashCollisionError:
+                LOGGER.error('cannot shorten "%s" due to a collision on '
+                        'plain_hash', url)
+                raise URLError() from None
             except datastores.DuplicatedValueError:
                 LOGGER.info('short id already exists for URL "%s"', url)
-                return self.store.key(url)
+                self.collision_stats.record(attempt + 1, attempt, stored=0)
+                try:
+                    return (yield ('key', url))
+                except KeyError:
+                    # p.ex. registros sem o campo `plain_hash`.
+                    LOGGER.error(UNREACHABLE_DUPLICATE_MSG, url)
+                    raise URLError() from None
             else:
+                record_id_outcome(ids, collided=False)
+                self.collision_stats.record(attempt + 1, attempt)
+                if attempt >= COLLISIONS_WARNING_THRESHOLD:
+                    LOGGER.warning('%s collisions on key before storing "%s"',
+                            attempt, url)
                 return shortid
 
+        LOGGER.error('cannot shorten "%s": no short id is available', url)
+        raise URLError()
+
+    def _shorten_many_steps(self, urls):
+        urls = list(urls)
+        if self.canonicalize is not None:
+            canonical = {url: self.canonicalize(url) for url in urls}
+        else:
+            canonical = {url: url for url in urls}
+
+        errors = {}
+        checkers = {}
+        for url in canonical.values():
+            if url in checkers or url in errors:
+                continue
+            try:
+                uc = URLChecker(url, self.whitelist, self.timeout, self.pinger)
+            except ValueError as exc:
+                LOGGER.info('cannot check URL "%s": %s', url, str(exc))
+                errors[url] = 'invalid_url'
+                continue
+
+            if uc.is_allowed_hostname():
+                checkers[url] = uc
+            else:
+                errors[url] = 'hostname_not_allowed'
+
+        short_refs = (yield ('key_many', checkers)) if checkers else {}
+        new_urls = [url for url in checkers if url not in short_refs]
+
+        if new_urls:
+            alive = yield ('ping_many', [checkers[url] for url in new_urls])
+            for url, is_alive in zip(new_urls, alive):
+                if not is_alive:
+                    errors[url] = 'unreachable'
+            new_urls = [url for url, is_alive in zip(new_urls, alive)
+                        if is_alive]
+
+        short_refs.update((yield from self._store_many_steps(new_urls, errors)))
+
+        return [ShortenResult(url, short_refs.get(canonical[url]),
+                              errors.get(canonical[url]))
+                for url in urls]
+
+    def _store_many_steps(self, urls, errors):
+        """Armazena as URLs `urls`, gerando novas chaves para os pares que
+        colidirem. As URLs armazenadas concorrentemente por outro processo
+        têm suas chaves obtidas do `store`.
+        """
+        stored = {}
+        duplicated = []
+        ids = self.idgen()
+        pending = list(urls)
+        attempt = 0
+        while pending:
+            LOGGER.info('attempt #%s to shorten %s URLs', attempt, len(pending))
+            pairs = {}
+            deferred = []
+            try:
+                for url in pending:
+                    shortid = next(ids)
+                    if shortid in pairs:
+                        deferred.append(url)
+                    else:
+                        pairs[shortid] = url
+            except StopIteration:
+                for url in pending:
+                    errors[url] = 'no_available_id'
+                break
+
+            failures = yield ('set_many', pairs)
+            pending = list(deferred)
+            for shortid, url in pairs.items():
+                exc = failures.get(shortid)
+                if exc is None:
+                    record_id_outcome(ids, collided=False)
+                    stored[url] = shortid
+                elif isinstance(exc, datastores.DuplicatedKeyError):
+                    record_id_outcome(ids, collided=True)
+                    pending.append(url)
+                elif isinstance(exc, datastores.PlainHashCollisionError):
+                    errors[url] = 'hash_collision'
+                else:
+                    duplicated.append(url)
+            self.collision_stats.record(len(pairs), len(pending) - len(deferred),
+                    stored=len(pairs) - len(failures))
+
+            if pending:
+                LOGGER.info('could not store %s URLs due to collisions on key',
+                        len(pending))
+            attempt += 1
+
+        if duplicated:
+            LOGGER.info('short ids already exist for %s URLs', len(duplicated))
+            stored.update((yield ('key_many', duplicated)))
+            for url in duplicated:
+                if url not in stored:
+                    LOGGER.error(UNREACHABLE_DUPLICATE_MSG, url)
+                    errors[url] = 'hash_collision'
+        return stored
+
+    def stats(self):
+        """Estatísticas das colisões de chaves e, quando disponíveis, do
+        gerador de IDs.
+        """
+        result = {'collisions': self.collision_stats.as_dict()}
+        idgen_stats = getattr(self.idgen, 'stats', None)
+        if idgen_stats is not None:
+            result['idgen'] = idgen_stats()
+        return result
+
+
+class Nurl(BaseNurl):
+    """Encurtador de URLs.
+
+    :param store: instância de :class:`nurl.lib.datastores.DataStore`.
+    :param idgen: executável que produz uma lista de IDs pseudo-aleatórios.
+    :param whitelist: (opcional) instância de
+                      :class:`nurl.whitelists.Whitelist` ou coleção de regras
+                      representando hostnames permitidos de serem encurtados.
+                      O valor `None` desliga o filtro.
+    :param tracker: (opcional) instância de :class:`nurl.lib.trackers.Tracker`.
+    :param timeout: (opcional) tempo máximo, em segundos, para resposta do 
+                    ping.
+    :param pinger: (opcional) instância de :class:`nurl.pingers.Pinger`
+                   utilizada na verificação de conectividade das URLs.
+    :param batch_workers: (opcional) quantidade máxima de verificações de
+                          conectividade simultâneas em `shorten_many`.
+    :param canonicalize: (opcional) executável que produz a forma canônica
+                         de uma URL, p.ex. instância de
+                         :class:`URLCanonicalizer`, aplicado antes de
+                         qualquer verificação.
+    """
+    def _run(self, steps):
+        result = error = None
+        while True:
+            try:
+                if error is None:
+                    op = steps.send(result)
+                else:
+                    op = steps.throw(error)
+            except StopIteration as stop:
+                return stop.value
+
+            try:
+                result, error = self._perform(*op), None
+            except Exception as exc:
+                result, error = None, exc
+
+    def _perform(self, op, arg, *args):
+        if op == 'set':
+            self.store[arg] = args[0]
+        elif op == 'ping':
+            return arg.ping()
+        elif op == 'ping_many':
+            workers = min(self.batch_workers, len(arg))
+            with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+                return list(executor.map(lambda uc: uc.ping(), arg))
+        else:
+            return getattr(self.store, op)(arg)
+
+    def shorten(self, url):
+        return self._run(self._shorten_steps(url))
+
+    def shorten_many(self, urls):
+        """Encurta diversas URLs de uma só vez.
+
+        As URLs já encurtadas são obtidas em uma única consulta, a
+        conectividade das demais é verificada concorrentemente e as novas
+        URLs são armazenadas em lote. Apenas os pares cujas chaves colidiram
+        são armazenados novamente.
+
+        Retorna uma lista de :class:`ShortenResult`, na ordem de `urls`. O
+        campo `url` contém a URL conforme fornecida.
+        """
+        return self._run(self._shorten_many_steps(urls))
+
     def resolve(self, shortid, access=None):
         assert isinstance(access, (type(None), trackers.Access))
 
+        try:
+            url = self.store[shortid]
+        except KeyError:
+            raise NotExists() from None
+
         if access and self.tracker:
             self.tracker.add(shortid, access)
         else:
             LOGGER.info('could not track access to shortid "%s"', shortid)
 
-        try:
-            return self.store[shortid]
-        except KeyError:
-            raise NotExists() from None
+        return url
+
+    def resolve_many(self, shortids, access=None):
+        """Resolve diversos IDs de uma só vez.
+
+        Retorna um dicionário que associa cada ID existente à respectiva URL.
+        Os acessos são registrados apenas quando `access` é fornecido.
+        """
+        assert isinstance(access, (type(None), trackers.Access))
+
+        urls = self.store.get_many(shortids)
+
+        if access and self.tracker:
+            self.tracker.add_many((shortid, access) for shortid in urls)
+
+        return urls
 
 
 class URLChecker:
     """Checador de URLs.
+
+    :param pinger: (opcional) instância de :class:`nurl.pingers.Pinger`. Por
+                   padrão, é realizada uma requisição GET por meio de
+                   `urllib.request.urlopen`.
     """
     urllib_request = urllib.request  # para facilitar os testes
 
-    def __init__(self, url, whitelist=None, timeout=DEFAULT_TIMEOUT):
+    def __init__(self, url, whitelist=None, timeout=DEFAULT_TIMEOUT,
+            pinger=None):
         self.url = url
         self.parsed_url = urllib.parse.urlparse(self.url)
         self.whitelist = whitelist
         self.timeout = timeout
+        self.pinger = pinger
 
         if self.parsed_url.scheme not in ['http', 'https']:
             raise ValueError('missing URL schema')
@@ -111,24 +497,17 @@ class URLChecker:
     def ping(self):
         """Verifica se a URL alcança um servidor.
         """
-        try:
-            _ = self.urllib_request.urlopen(self.url, timeout=self.timeout)
-        except (urllib.error.HTTPError, urllib.error.URLError,
-                socket.timeout) as exc:
-            LOGGER.info('cannot connect to URL "%s": %s', self.url, str(exc))
-            return False
-        else:
-            return True
+        pinger = self.pinger or pingers.UrlopenPinger(self.urllib_request)
+        return pinger.ping(self.url, self.timeout)
 
 
-def is_valid_url(url, whitelist=None, timeout=DEFAULT_TIMEOUT):
+def is_valid_url(url, whitelist=None, timeout=DEFAULT_TIMEOUT, pinger=None):
     """Verifica se `url` é válida.
     """
     try:
-        uc = URLChecker(url, whitelist, timeout)
+        uc = URLChecker(url, whitelist, timeout, pinger)
     except ValueError as exc:
         LOGGER.info('cannot check URL "%s": %s', url, str(exc))
         return False
 
     return uc.is_allowed_hostname() and uc.ping()
-
@@ -0,0 +1,245 @@
+"""Instantâneos imutáveis dos pares chave-valor, servidos por meio de `mmap`.
+
+O arquivo é composto por um cabeçalho seguido das seções:
+
+* referências curtas, representadas por :func:`nurl.base28.pack_ref`, em
+  ordem crescente (``count`` inteiros de 64 bits);
+* posições de início de cada URL na área de dados, na ordem das referências,
+  mais a posição final (``count + 1`` inteiros de 64 bits);
+* resumos de 64 bits das URLs, em ordem crescente (``count`` inteiros de 64
+  bits);
+* índices das entradas correspondentes a cada resumo (``count`` inteiros de
+  32 bits, completados até múltiplo de 8 bytes);
+* área de dados, com as URLs codificadas em UTF-8.
+
+Os inteiros são gravados em *little-endian*. Como o arquivo é mapeado em
+memória apenas para leitura, os workers criados por `fork` compartilham as
+mesmas páginas do cache do sistema operacional.
+
+Para exportar os pares de uma base de dados::
+
+    $ nurl-snapshot --mongodb-uri mongodb://localhost:27017/ urls.snapshot
+"""
+import os
+import sys
+import mmap
+import time
+import struct
+import bisect
+import hashlib
+import argparse
+import tempfile
+import logging
+from array import array
+
+from . import base28
+
+
+__all__ = ['Snapshot', 'write_snapshot', 'export']
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+MAGIC = b'NURLSNP1'
+HEADER = struct.Struct('<8sQQd')
+# quantidade de chaves obtidas do `store` por consulta durante a exportação.
+EXPORT_BATCH_SIZE = 1000
+
+
+def url_digest(data):
+    """Resumo de 64 bits, sem sinal, dos bytes `data`.
+    """
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(),
+            'little')
+
+
+def _little_endian(values):
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+def write_snapshot(pairs, path, created_at=None):
+    """Grava, de maneira atômica, o instantâneo dos pares ``(chave, url)`` de
+    `pairs` em `path`. As chaves em formato diferente do das referências
+    curtas são ignoradas.
+
+    Retorna a quantidade de pares gravados.
+    """
+    entries = []
+    skipped = 0
+    for key, url in pairs:
+        try:
+            entries.append((base28.pack_ref(key), url.encode('utf-8')))
+        except ValueError:
+            skipped += 1
+    if skipped:
+        LOGGER.warning('%s keys cannot be represented in the snapshot and '
+                'were skipped', skipped)
+    entries.sort()
+
+    keys = array('Q', (packed for packed, _ in entries))
+    offsets = array('Q', [0])
+    arena = bytearray()
+    for _, data in entries:
+        arena.extend(data)
+        offsets.append(len(arena))
+    digests = sorted((url_digest(data), i)
+                     for i, (_, data) in enumerate(entries))
+    digest_values = array('Q', (digest for digest, _ in digests))
+    digest_entries = array('I', (i for _, i in digests))
+    padding = b'\0' * (-len(digest_entries) * digest_entries.itemsize % 8)
+
+    header = HEADER.pack(MAGIC, len(entries), len(arena),
+            time.time() if created_at is None else created_at)
+
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.snapshot-')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(header)
+            for values in (keys, offsets, digest_values, digest_entries):
+                tmp.write(_little_endian(values).tobytes())
+            tmp.write(padding)
+            tmp.write(arena)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    return len(entries)
+
+
+def export(store, path):
+    """Grava o instantâneo de todos os pares armazenados em `store`, uma
+    instância de :class:`nurl.datastores.DataStore`.
+    """
+    created_at = time.time()
+
+    def pairs():
+        batch = []
+        for key in store.keys():
+            batch.append(key)
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                yield from store.get_many(batch).items()
+                batch = []
+        if batch:
+            yield from store.get_many(batch).items()
+
+    return write_snapshot(pairs(), path, created_at=created_at)
+
+
+class Snapshot:
+    """Instantâneo gravado por :func:`write_snapshot`, mapeado em memória.
+
+    As consultas são realizadas por meio de busca binária diretamente sobre
+    as páginas mapeadas, sem cópias e sem bloqueios.
+
+    :param path: caminho do arquivo do instantâneo.
+    """
+    def __init__(self, path):
+        if sys.byteorder != 'little':
+            raise ValueError('snapshots are only supported on little-endian '
+                    'platforms')
+
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.mmap) < HEADER.size:
+            raise ValueError('"%s" is not a snapshot file' % path)
+        magic, count, arena_size, self.created_at = HEADER.unpack_from(
+                self.mmap)
+        if magic != MAGIC:
+            raise ValueError('"%s" is not a snapshot file' % path)
+
+        sizes = [count * 8, (count + 1) * 8, count * 8,
+                 count * 4 + (-count * 4 % 8), arena_size]
+        if HEADER.size + sum(sizes) != len(self.mmap):
+            raise ValueError('"%s" is truncated' % path)
+
+        self.view = memoryview(self.mmap)
+        sections = []
+        start = HEADER.size
+        for size in sizes:
+            sections.append(self.view[start:start + size])
+            start += size
+        self.keys = sections[0].cast('Q')
+        self.offsets = sections[1].cast('Q')
+        self.digests = sections[2].cast('Q')
+        self.digest_entries = sections[3][:count * 4].cast('I')
+        self.arena = sections[4]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _url(self, entry):
+        return self.arena[self.offsets[entry]:self.offsets[entry + 1]]
+
+    def get(self, key):
+        """Obtém a URL associada a `key`, ou `None`.
+        """
+        try:
+            packed = base28.pack_ref(key)
+        except ValueError:
+            return None
+
+        pos = bisect.bisect_left(self.keys, packed)
+        if pos < len(self.keys) and self.keys[pos] == packed:
+            return bytes(self._url(pos)).decode('utf-8')
+        return None
+
+    def key(self, url):
+        """Obtém a chave associada a `url`, ou `None`.
+        """
+        data = url.encode('utf-8')
+        digest = url_digest(data)
+        pos = bisect.bisect_left(self.digests, digest)
+        while pos < len(self.digests) and self.digests[pos] == digest:
+            entry = self.digest_entries[pos]
+            if self._url(entry) == data:
+                return base28.unpack_ref(self.keys[entry])
+            pos += 1
+        return None
+
+    def close(self):
+        for view in (self.keys, self.offsets, self.digests,
+                     self.digest_entries, self.arena, self.view):
+            view.release()
+        self.mmap.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Exporta os pares '
+            'chave-valor para um instantâneo servido por SnapshotDataStore.')
+    parser.add_argument('output', help='caminho do arquivo do instantâneo')
+    parser.add_argument('--sqlite', metavar='PATH',
+            help='exporta a partir da base SQLite em PATH, em vez do MongoDB')
+    parser.add_argument('--mongodb-uri',
+            default=os.environ.get('NURL_MONGODB_URI',
+                                   'mongodb://localhost:27017/'))
+    parser.add_argument('--mongodb-db',
+            default=os.environ.get('NURL_MONGODB_DB', 'nurl'))
+    parser.add_argument('--mongodb-col',
+            default=os.environ.get('NURL_MONGODB_DATA_COL', 'urls'))
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    from . import datastores
+    if args.sqlite:
+        store = datastores.SQLiteDataStore(args.sqlite)
+    else:
+        import pymongo
+        client = pymongo.MongoClient(args.mongodb_uri, appname='nURL')
+        store = datastores.MongoDBDataStore(
+                client[args.mongodb_db][args.mongodb_col])
+
+    count = export(store, args.output)
+    LOGGER.info('%s pairs were written to "%s"', count, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Acesso a bases de dados SQLite, utilizadas como alternativa ao MongoDB em
+instalações de um único nó.
+"""
+import os
+import sqlite3
+import threading
+import contextlib
+import logging
+
+
+__all__ = ['ConnectionPool']
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+# tempo máximo, em milissegundos, de espera por bloqueios de escrita.
+DEFAULT_BUSY_TIMEOUT = 5000
+# quantidade de comandos preparados mantidos por conexão.
+CACHED_STATEMENTS = 128
+
+
+class ConnectionPool:
+    """Mantém uma conexão com a base de dados `path` por thread.
+
+    As conexões operam em modo *autocommit* e as transações são delimitadas
+    explicitamente por meio de :meth:`transaction`. A base utiliza *write-ahead
+    logging*, de modo que as leituras não são bloqueadas pelas escritas. As
+    conexões são recriadas nos processos filhos após o `fork`.
+
+    :param path: caminho do arquivo da base de dados.
+    :param busy_timeout: (opcional) tempo máximo, em milissegundos, de espera
+                         por bloqueios de escrita.
+    """
+    def __init__(self, path, busy_timeout=DEFAULT_BUSY_TIMEOUT):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, isolation_level=None,
+                check_same_thread=False, cached_statements=CACHED_STATEMENTS)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=%d' % self.busy_timeout)
+        with self.lock:
+            self.connections.append(conn)
+        LOGGER.debug('connected to the SQLite database at "%s"', self.path)
+        return conn
+
+    @property
+    def connection(self):
+        pid = os.getpid()
+        if getattr(self.local, 'pid', None) != pid:
+            self.local.conn = self._connect()
+            self.local.pid = pid
+        return self.local.conn
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Executa o bloco em uma transação que obtém o bloqueio de escrita
+        desde o início.
+        """
+        conn = self.connection
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
+
+    def executescript(self, script):
+        self.connection.executescript(script)
+
+    def close(self):
+        """Encerra todas as conexões abertas pelo processo corrente.
+        """
+        with self.lock:
+            connections, self.connections = self.connections, []
+        for conn in connections:
+            conn.close()
+        self.local = threading.local()
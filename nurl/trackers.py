@@ -1,8 +1,18 @@
 import abc
-from collections import namedtuple
-from typing import Iterable
+import os
+import atexit
+import threading
+import weakref
+from collections import namedtuple, deque, Counter
+from datetime import datetime
+from typing import Iterable, Tuple, List, Dict, Optional
+import urllib.parse
 import logging
 
+import pymongo
+
+from .sqlite import ConnectionPool
+
 
 LOGGER = logging.getLogger(__name__)
 
@@ -10,6 +20,12 @@ LOGGER = logging.getLogger(__name__)
 Access = namedtuple('Access', 'utctime referrer')
 
 
+class AccessesNotKept(Exception):
+    """Os acessos individuais não são mantidos pelo tracker, p.ex. por
+    instâncias de :class:`AggregatingTracker`.
+    """
+
+
 class Tracker(metaclass=abc.ABCMeta):
     """Registra acesso às URLs encurtadas.
     """
@@ -19,8 +35,22 @@ class Tracker(metaclass=abc.ABCMeta):
 
     @abc.abstractmethod
     def get(self, short_ref: str) -> Iterable[Access]:
+        """Retorna os acessos a `short_ref`. Levanta :class:`AccessesNotKept`
+        caso os acessos individuais não sejam mantidos.
+        """
         return NotImplemented
 
+    def add_many(self, items: Iterable[Tuple[str, Access]]) -> int:
+        """Registra diversos acessos de uma só vez.
+
+        Retorna a quantidade de acessos registrados com sucesso.
+        """
+        count = 0
+        for short_ref, access in items:
+            self.add(short_ref, access)
+            count += 1
+        return count
+
 
 class InMemoryTracker(Tracker):
     def __init__(self):
@@ -36,12 +66,12 @@ class InMemoryTracker(Tracker):
 
 
 class MongoDBTracker(Tracker):
-
+    """Os índices requeridos, em :data:`nurl.mongodb.TRACKER_INDEXES`, são
+    criados por meio de ``nurl-manage create-indexes``.
+    """
     def __init__(self, collection):
         self.collection = collection
 
-        self.collection.create_index('short_ref')
-
     def add(self, short_ref, access):
         record = access._asdict()
         record['short_ref'] = short_ref
@@ -49,6 +79,28 @@ class MongoDBTracker(Tracker):
         r = self.collection.insert_one(record)
         LOGGER.info('access info was successfully saved to "%s"', r.inserted_id)
 
+    def add_many(self, items):
+        records = []
+        for short_ref, access in items:
+            record = access._asdict()
+            record['short_ref'] = short_ref
+            records.append(record)
+
+        if not records:
+            return 0
+
+        try:
+            r = self.collection.insert_many(records, ordered=False)
+        except pymongo.errors.BulkWriteError as exc:
+            inserted = exc.details.get('nInserted', 0)
+            LOGGER.error('could not save %s of %s access records: %s',
+                    len(records) - inserted, len(records), str(exc))
+            return inserted
+        else:
+            LOGGER.info('%s access records were successfully saved',
+                    len(r.inserted_ids))
+            return len(r.inserted_ids)
+
     def get(self, short_ref):
         records = self.collection.find({'short_ref': short_ref})
         for rec in records:
@@ -56,3 +108,401 @@ class MongoDBTracker(Tracker):
                             referrer=rec['referrer'])
             yield access
         
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS accesses (
+    id INTEGER PRIMARY KEY,
+    short_ref TEXT NOT NULL,
+    utctime TEXT NOT NULL,
+    referrer TEXT
+);
+CREATE INDEX IF NOT EXISTS accesses_short_ref ON accesses (short_ref);
+"""
+SQLITE_TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+class SQLiteTracker(Tracker):
+    """Registra os acessos em uma base de dados SQLite.
+
+    Cada chamada a `add_many` é gravada em uma única transação e, portanto,
+    a instância deve ser envolvida por :class:`BufferedTracker` para que os
+    acessos sejam gravados em lotes.
+
+    :param path: caminho do arquivo da base de dados, ou instância de
+                 :class:`nurl.sqlite.ConnectionPool`.
+    """
+    def __init__(self, path):
+        self.pool = path if isinstance(path, ConnectionPool) \
+                else ConnectionPool(path)
+        self.pool.executescript(SQLITE_SCHEMA)
+
+    def add(self, short_ref, access):
+        self.add_many([(short_ref, access)])
+
+    def add_many(self, items):
+        rows = [(short_ref, access.utctime.strftime(SQLITE_TIME_FORMAT),
+                 access.referrer) for short_ref, access in items]
+        if not rows:
+            return 0
+
+        with self.pool.transaction() as conn:
+            conn.executemany('INSERT INTO accesses (short_ref, utctime, '
+                    'referrer) VALUES (?, ?, ?)', rows)
+        LOGGER.info('%s access records were successfully saved', len(rows))
+        return len(rows)
+
+    def get(self, short_ref):
+        rows = self.pool.connection.execute('SELECT utctime, referrer '
+                'FROM accesses WHERE short_ref = ? ORDER BY id', (short_ref,))
+        for utctime, referrer in rows:
+            yield Access(utctime=datetime.strptime(utctime, SQLITE_TIME_FORMAT),
+                         referrer=referrer)
+
+    def close(self):
+        self.pool.close()
+
+
+GRANULARITIES = ('hour', 'day')
+
+
+def bucket_start(utctime, granularity):
+    """Trunca `utctime` para o início do intervalo de tempo `granularity`.
+    """
+    if granularity == 'hour':
+        return utctime.replace(minute=0, second=0, microsecond=0)
+    elif granularity == 'day':
+        return utctime.replace(hour=0, minute=0, second=0, microsecond=0)
+    else:
+        raise ValueError('unknown granularity "%s"' % granularity)
+
+
+def referrer_host(referrer):
+    """Obtém o nome do host a partir da URL `referrer`.
+    """
+    if not referrer:
+        return None
+    return urllib.parse.urlparse(referrer).hostname
+
+
+class AggregatingTracker(Tracker):
+    """Registra acesso às URLs encurtadas por meio de contadores agregados em
+    intervalos de tempo, em vez de um registro por acesso.
+
+    Os acessos individuais não são mantidos e, portanto, o método `get`
+    levanta :class:`AccessesNotKept`. Os dados são consultados por meio dos
+    métodos `totals` e `series`.
+
+    :param by_referrer: (opcional) mantém os contadores também por nome do
+                        host de origem do acesso.
+    """
+    def __init__(self, by_referrer=False):
+        self.by_referrer = by_referrer
+
+    def get(self, short_ref):
+        raise AccessesNotKept('individual accesses are not kept by '
+                'aggregating trackers')
+
+    @abc.abstractmethod
+    def totals(self, short_ref: str) -> Dict:
+        """Retorna o total de acessos a `short_ref`, no formato
+        ``{'total': int, 'referrers': {host: int}}``.
+        """
+        return NotImplemented
+
+    @abc.abstractmethod
+    def series(self, short_ref: str, granularity: str = 'day',
+            start: Optional[datetime] = None,
+            end: Optional[datetime] = None) -> List[Tuple[datetime, int]]:
+        """Retorna a quantidade de acessos a `short_ref` por intervalo de tempo,
+        ordenados cronologicamente. O intervalo `end` não é incluído.
+        """
+        return NotImplemented
+
+    def _counter_keys(self, access):
+        """Produz as chaves ``(granularity, bucket, referrer)`` dos contadores
+        que devem ser incrementados para `access`.
+        """
+        host = referrer_host(access.referrer) if self.by_referrer else None
+        yield ('total', None, host)
+        for granularity in GRANULARITIES:
+            yield (granularity, bucket_start(access.utctime, granularity), host)
+
+
+class InMemoryAggregatingTracker(AggregatingTracker):
+    def __init__(self, by_referrer=False):
+        super().__init__(by_referrer=by_referrer)
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def add(self, short_ref, access):
+        with self.lock:
+            counters = self.data.setdefault(short_ref, Counter())
+            counters.update(self._counter_keys(access))
+
+    def totals(self, short_ref):
+        counters = self.data.get(short_ref, Counter())
+        result = {'total': 0, 'referrers': {}}
+        for (granularity, _, host), count in counters.items():
+            if granularity != 'total':
+                continue
+            result['total'] += count
+            if host is not None:
+                result['referrers'][host] = count
+        return result
+
+    def series(self, short_ref, granularity='day', start=None, end=None):
+        if granularity not in GRANULARITIES:
+            raise ValueError('unknown granularity "%s"' % granularity)
+
+        buckets = Counter()
+        for (gran, bucket, _), count in self.data.get(short_ref, {}).items():
+            if gran != granularity:
+                continue
+            if start is not None and bucket < start:
+                continue
+            if end is not None and bucket >= end:
+                continue
+            buckets[bucket] += count
+        return sorted(buckets.items())
+
+
+class MongoDBAggregatingTracker(AggregatingTracker):
+    """Os índices requeridos, em :data:`nurl.mongodb.COUNTERS_INDEXES`, são
+    criados por meio de ``nurl-manage create-indexes``.
+    """
+    def __init__(self, collection, by_referrer=False):
+        super().__init__(by_referrer=by_referrer)
+        self.collection = collection
+
+    def add(self, short_ref, access):
+        self.add_many([(short_ref, access)])
+
+    def add_many(self, items):
+        counters = Counter()
+        accesses = Counter()
+        for short_ref, access in items:
+            counters.update((short_ref,) + key
+                            for key in self._counter_keys(access))
+            accesses[short_ref] += 1
+
+        if not counters:
+            return 0
+
+        keys = list(counters)
+        requests = [pymongo.UpdateOne({'short_ref': short_ref,
+                                       'granularity': granularity,
+                                       'bucket': bucket,
+                                       'referrer': host},
+                                      {'$inc': {'count': inc}},
+                                      upsert=True)
+                    for (short_ref, granularity, bucket, host), inc
+                    in counters.items()]
+        try:
+            self.collection.bulk_write(requests, ordered=False)
+        except pymongo.errors.BulkWriteError as exc:
+            # as demais atualizações foram aplicadas, pois não são ordenadas.
+            # Os acessos a uma URL são considerados registrados apenas se
+            # todos os seus contadores foram atualizados.
+            errors = exc.details.get('writeErrors', [])
+            failed = {keys[error['index']][0] for error in errors}
+            LOGGER.error('could not update %s access counters (%s were '
+                    'updated): %s', len(errors),
+                    exc.details.get('nUpserted', 0)
+                    + exc.details.get('nModified', 0), str(exc))
+            return sum(n for short_ref, n in accesses.items()
+                       if short_ref not in failed)
+        else:
+            LOGGER.info('%s access counters were successfully updated',
+                    len(requests))
+            return sum(accesses.values())
+
+    def totals(self, short_ref):
+        records = self.collection.find({'short_ref': short_ref,
+                                        'granularity': 'total'})
+        result = {'total': 0, 'referrers': {}}
+        for rec in records:
+            result['total'] += rec['count']
+            if rec['referrer'] is not None:
+                result['referrers'][rec['referrer']] = rec['count']
+        return result
+
+    def series(self, short_ref, granularity='day', start=None, end=None):
+        if granularity not in GRANULARITIES:
+            raise ValueError('unknown granularity "%s"' % granularity)
+
+        query = {'short_ref': short_ref, 'granularity': granularity}
+        bucket_range = {}
+        if start is not None:
+            bucket_range['$gte'] = start
+        if end is not None:
+            bucket_range['$lt'] = end
+        if bucket_range:
+            query['bucket'] = bucket_range
+
+        records = self.collection.aggregate([
+            {'$match': query},
+            {'$group': {'_id': '$bucket', 'count': {'$sum': '$count'}}},
+            {'$sort': {'_id': 1}},
+            ])
+        return [(rec['_id'], rec['count']) for rec in records]
+
+
+OVERFLOW_POLICIES = ('drop_new', 'drop_oldest')
+
+# instâncias de `BufferedTracker` ainda não encerradas. As referências são
+# fracas, de modo que as instâncias descartadas não são mantidas até o
+# encerramento do processo.
+_OPEN_BUFFERED_TRACKERS = weakref.WeakSet()
+
+
+@atexit.register
+def _close_buffered_trackers():
+    for tracker in list(_OPEN_BUFFERED_TRACKERS):
+        tracker.close()
+
+
+class BufferedTracker(Tracker):
+    """Enfileira os acessos em memória e os registra em lotes, a partir de
+    uma thread em segundo plano, por meio de `tracker.add_many`.
+
+    Um lote é enviado sempre que a fila alcança `max_batch` acessos ou a cada
+    `flush_interval` segundos. A fila é limitada a `max_queued` acessos e,
+    quando cheia, a política `overflow` determina se o acesso mais recente
+    (``drop_new``) ou o mais antigo (``drop_oldest``) é descartado. Os
+    acessos pendentes são registrados ao encerrar o processo.
+
+    A thread é iniciada no primeiro acesso de cada processo, de maneira que
+    a instância pode ser criada antes do `fork` dos workers.
+
+    :param tracker: instância de :class:`Tracker` a ser envolvida.
+    :param max_batch: (opcional) quantidade máxima de acessos por lote.
+    :param flush_interval: (opcional) intervalo máximo, em segundos, entre
+                           os envios.
+    :param max_queued: (opcional) quantidade máxima de acessos na fila.
+    :param overflow: (opcional) política de descarte quando a fila está
+                     cheia.
+    """
+    def __init__(self, tracker, max_batch=500, flush_interval=1.0,
+            max_queued=10000, overflow='drop_new'):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('unknown overflow policy "%s"' % overflow)
+
+        self.tracker = tracker
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_queued = max_queued
+        self.overflow = overflow
+
+        self.queue = deque()
+        self.cond = threading.Condition()
+        self.flush_lock = threading.Lock()
+        self.start_lock = threading.Lock()
+        self.flusher = None
+        self.pid = None
+        self.closed = False
+
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0
+
+        _OPEN_BUFFERED_TRACKERS.add(self)
+
+    def add(self, short_ref, access):
+        if self.closed:
+            self.tracker.add(short_ref, access)
+            return
+
+        self._ensure_flusher()
+        with self.cond:
+            if len(self.queue) >= self.max_queued:
+                self.dropped += 1
+                if self.overflow == 'drop_new':
+                    LOGGER.warning('tracker queue is full, dropping access '
+                            'to "%s"', short_ref)
+                    return
+                self.queue.popleft()
+                LOGGER.warning('tracker queue is full, dropping the oldest '
+                        'access')
+
+            self.queue.append((short_ref, access))
+            self.queued += 1
+            if len(self.queue) >= self.max_batch:
+                self.cond.notify()
+
+    def get(self, short_ref):
+        self.flush()
+        return self.tracker.get(short_ref)
+
+    def flush(self):
+        """Registra imediatamente todos os acessos enfileirados.
+        """
+        with self.flush_lock:
+            while True:
+                with self.cond:
+                    size = min(len(self.queue), self.max_batch)
+                    batch = [self.queue.popleft() for _ in range(size)]
+                if not batch:
+                    return
+
+                try:
+                    count = self.tracker.add_many(batch)
+                except Exception:
+                    LOGGER.exception('could not save %s access records',
+                            len(batch))
+                    count = 0
+
+                with self.cond:
+                    self.flushed += count
+                    self.dropped += len(batch) - count
+
+    def close(self):
+        """Interrompe a thread em segundo plano e registra os acessos
+        pendentes. Acessos posteriores são registrados de maneira síncrona.
+        """
+        _OPEN_BUFFERED_TRACKERS.discard(self)
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+
+        flusher = self.flusher
+        if flusher is not None and flusher.is_alive() and (
+                flusher is not threading.current_thread()):
+            flusher.join(self.flush_interval + 5)
+
+        self.flush()
+
+    def stats(self):
+        """Contadores de acessos enfileirados, registrados e descartados.
+        """
+        with self.cond:
+            return {'queued': self.queued, 'flushed': self.flushed,
+                    'dropped': self.dropped, 'pending': len(self.queue)}
+
+    def _ensure_flusher(self):
+        pid = os.getpid()
+        if self.pid == pid:
+            return
+
+        with self.start_lock:
+            if self.pid == pid:
+                return
+
+            self.flusher = threading.Thread(target=self._run,
+                    name='nurl-tracker-flusher', daemon=True)
+            self.flusher.start()
+            self.pid = pid
+            LOGGER.debug('started the tracker flusher thread on pid %s', pid)
+
+    def _is_flush_due(self):
+        return self.closed or len(self.queue) >= self.max_batch
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(self._is_flush_due,
+                        timeout=self.flush_interval)
+                closed = self.closed
+
+            self.flush()
+            if closed:
+                return
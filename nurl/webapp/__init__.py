@@ -1,8 +1,29 @@
+from datetime import datetime
+import urllib.parse
+import mimetypes
+import logging
+import time
+
 from pyramid.config import Configurator
 from pyramid.renderers import JSONP
-from pyramid.events import NewRequest
 import webassets
 
+from nurl import base28, precompression
+from nurl.pyramid_nurl import REDIRECT_REASONS
+from nurl.shortener import NotExists
+from nurl.trackers import Access
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+# caracteres mantidos ao codificar a URL de destino no cabeçalho `Location`.
+LOCATION_SAFE_CHARS = "!#$%&'()*+,-./:;=?@[]_~"
+
+# a extensão das variantes em brotli é conhecida apenas a partir do
+# Python 3.9.
+mimetypes.encodings_map.setdefault('.br', 'br')
+
 
 def main(global_config, **settings):
     """ This function returns a Pyramid WSGI application.
@@ -14,13 +35,22 @@ def main(global_config, **settings):
     config.add_renderer('jsonp', JSONP(param_name='callback'))
 
     # URL patterns
+    settings = config.registry.settings
+    content_encodings = precompression.parse_encodings(
+            settings['nurl.static.encodings'])
     config.add_static_view(path='nurl.webapp:static', name='static',
-            cache_max_age=3600)
+            cache_max_age=3600, content_encodings=content_encodings)
     config.add_route('home', '/')
     config.add_route('shortened', '/{short_ref}')
 
     # restful endpoints
     config.add_route('shortener_v1', '/api/v1/shorten')
+    config.add_route('batch_shortener_v1', '/api/v1/shorten/batch',
+            request_method='POST')
+    config.add_route('resolver_v1', '/api/v1/resolve',
+            request_method=('GET', 'POST'))
+    config.add_route('stats_v1', '/api/v1/stats')
+    config.add_route('metrics_v1', '/api/v1/metrics')
 
     css = webassets.Bundle(
         'bootstrap.min.css',
@@ -28,14 +58,99 @@ def main(global_config, **settings):
         output='bundle.min.css')
 
     config.add_webasset('css', css)
-    config.registry.settings['webassets_env'] = config.get_webassets_env()
-    config.add_subscriber(add_webassets_env, NewRequest)
+    settings['webassets_env'] = config.get_webassets_env()
+    # as URLs dos ativos são obtidas uma única vez, e não a cada requisição
+    # à página inicial.
+    settings['nurl.css_paths'] = get_css_paths(settings['webassets_env'])
 
     config.scan()
-    return config.make_wsgi_app()
+    app = config.make_wsgi_app()
+
+    if settings['nurl.redirect.fast_path']:
+        LOGGER.info('redirects are served by the WSGI fast path')
+        app = RedirectDispatcher(app, settings['nurl'],
+                instrumentation=settings.get('nurl.instrumentation'),
+                status=settings['nurl.redirect.status'],
+                cache_control=settings['nurl.redirect.cache_control'])
+    return app
+
+
+def get_css_paths(webassets_env):
+    """Obtém os caminhos relativos das folhas de estilo.
+
+    A lista produzida pelo método `Bundle.urls()` contém URLs completas para
+    os ativos estáticos, das quais são mantidos apenas os segmentos path e
+    query.
+    """
+    paths = []
+    for url in webassets_env['css'].urls():
+        parts = urllib.parse.urlsplit(url)
+        paths.append(parts.path + ('?' + parts.query if parts.query else ''))
+    return paths
+
+
+class RedirectDispatcher:
+    """Aplicação WSGI que responde diretamente, por meio de `nurl`, às
+    requisições GET e HEAD a ``/{short_ref}``, sem passar pelo roteamento e
+    pelos *subscribers* do Pyramid. As referências inexistentes são
+    respondidas com o status 404, para que não sejam consultadas novamente
+    pela aplicação. As demais requisições são encaminhadas a `app`.
+
+    :param app: aplicação WSGI do Pyramid.
+    :param nurl: instância de :class:`nurl.shortener.Nurl`.
+    :param instrumentation: (opcional) instância de
+                            :class:`nurl.metrics.Instrumentation`, na qual
+                            as respostas são registradas sob a rota
+                            ``shortened``.
+    :param status: (opcional) status dos redirecionamentos, 301 ou 302.
+    :param cache_control: (opcional) valor do cabeçalho ``Cache-Control``
+                          dos redirecionamentos.
+    """
+    def __init__(self, app, nurl, instrumentation=None, status=301,
+            cache_control=None):
+        self.app = app
+        self.nurl = nurl
+        self.instrumentation = instrumentation
+        self.status = status
+        self.status_line = '%s %s' % (status, REDIRECT_REASONS[status])
+        self.headers = [
+            ('Content-Type', 'text/plain; charset=UTF-8'),
+            ('Content-Length', '0'),
+            ]
+        if cache_control:
+            self.headers.append(('Cache-Control', cache_control))
+        self.not_found_body = b'404 Not Found'
+        self.not_found_headers = [
+            ('Content-Type', 'text/plain; charset=UTF-8'),
+            ('Content-Length', str(len(self.not_found_body))),
+            ]
+
+    def __call__(self, environ, start_response):
+        if environ['REQUEST_METHOD'] not in ('GET', 'HEAD'):
+            return self.app(environ, start_response)
 
+        short_ref = environ.get('PATH_INFO', '')[1:]
+        if not base28.is_valid_ref(short_ref):
+            return self.app(environ, start_response)
 
-def add_webassets_env(event):
-    settings = event.request.registry.settings
-    event.request.webassets_env = settings['webassets_env']
+        start = time.perf_counter()
+        access = Access(utctime=datetime.utcnow(),
+                referrer=environ.get('HTTP_REFERER'))
+        try:
+            plain_url = self.nurl.resolve(short_ref, access=access)
+        except NotExists:
+            status = 404
+            start_response('404 Not Found', list(self.not_found_headers))
+            body = b'' if environ['REQUEST_METHOD'] == 'HEAD' \
+                    else self.not_found_body
+        else:
+            status = self.status
+            location = urllib.parse.quote(plain_url, safe=LOCATION_SAFE_CHARS)
+            start_response(self.status_line, [('Location', location)]
+                           + self.headers)
+            body = b''
 
+        if self.instrumentation is not None:
+            self.instrumentation.observe_request('shortened', status,
+                    time.perf_counter() - start)
+        return [body]
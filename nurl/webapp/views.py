@@ -1,8 +1,8 @@
 from datetime import datetime
-from urllib.parse import urlparse
 
 from pyramid.view import view_config
 from pyramid.response import Response
+from pyramid.settings import asbool
 from pyramid import httpexceptions
 
 from nurl.shortener import (
@@ -12,14 +12,14 @@ from nurl.shortener import (
 from nurl.trackers import Access
 
 
+REDIRECT_RESPONSES = {301: httpexceptions.HTTPMovedPermanently,
+                      302: httpexceptions.HTTPFound}
+
+
 @view_config(route_name='home', renderer='templates/home.pt')
 def home(request):
-    # a lista produzida pelo método `Bundle.urls()`, abaixo, contém URLs
-    # completas para os ativos estáticos. O hack abaixo pega apenas os segmentos
-    # path e query, para formar URLs relativas.
-    parsed_css_urls = [urlparse(url) 
-                       for url in request.webassets_env['css'].urls()]
-    css_paths = [url.path+'?'+url.query for url in parsed_css_urls]
+    # os caminhos são obtidos na inicialização, em `nurl.webapp.main`.
+    css_paths = request.registry.settings['nurl.css_paths']
 
     response_dict = {'project':'nurl', 'css_paths': css_paths}
 
@@ -52,6 +52,109 @@ def url_shortener(request):
     return request.route_url('shortened', short_ref=short_ref)
 
 
+@view_config(route_name='batch_shortener_v1', renderer='json')
+def batch_url_shortener(request):
+    """Encurta as URLs enviadas no corpo da requisição, em JSON, no formato
+    ``{"urls": [...]}``.
+    """
+    try:
+        payload = request.json_body
+    except ValueError:
+        raise httpexceptions.HTTPBadRequest('invalid JSON payload') from None
+
+    incoming_urls = payload.get('urls') if isinstance(payload, dict) else None
+    if not isinstance(incoming_urls, list) or not all(
+            isinstance(url, str) for url in incoming_urls):
+        raise httpexceptions.HTTPBadRequest('"urls" must be a list of strings')
+
+    max_size = request.registry.settings['nurl.batch.max_size']
+    if len(incoming_urls) > max_size:
+        raise httpexceptions.HTTPBadRequest(
+                'at most %s URLs are accepted per request' % max_size)
+
+    results = []
+    for result in request.nurl.shorten_many(incoming_urls):
+        if result.error:
+            results.append({'url': result.url, 'error': result.error})
+        else:
+            short_url = request.route_url('shortened',
+                    short_ref=result.short_ref)
+            results.append({'url': result.url, 'short_url': short_url})
+
+    return {'results': results}
+
+
+@view_config(route_name='resolver_v1', renderer='jsonp')
+def batch_short_ref_resolver(request):
+    """Resolve diversas referências curtas de uma só vez.
+
+    As referências são informadas por meio de parâmetros ``ref`` repetidos
+    ou, em requisições POST, do corpo em JSON no formato
+    ``{"refs": [...], "track": false}``. Os acessos são registrados apenas
+    quando ``track`` é verdadeiro.
+    """
+    if request.method == 'POST':
+        try:
+            payload = request.json_body
+        except ValueError:
+            raise httpexceptions.HTTPBadRequest('invalid JSON payload') from None
+        if not isinstance(payload, dict):
+            raise httpexceptions.HTTPBadRequest('invalid JSON payload')
+        short_refs = payload.get('refs')
+        track = asbool(payload.get('track', False))
+    else:
+        short_refs = request.params.getall('ref')
+        track = asbool(request.params.get('track', False))
+
+    if not short_refs or not isinstance(short_refs, list) or not all(
+            isinstance(ref, str) for ref in short_refs):
+        raise httpexceptions.HTTPBadRequest('"refs" must be a list of strings')
+
+    max_size = request.registry.settings['nurl.batch.max_size']
+    if len(short_refs) > max_size:
+        raise httpexceptions.HTTPBadRequest(
+                'at most %s refs are accepted per request' % max_size)
+
+    access = None
+    if track:
+        access = Access(utctime=datetime.utcnow(), referrer=request.referrer)
+
+    urls = request.nurl.resolve_many(short_refs, access=access)
+    missing = [ref for ref in dict.fromkeys(short_refs) if ref not in urls]
+
+    return {'urls': urls, 'missing': missing}
+
+
+@view_config(route_name='stats_v1', renderer='json')
+def stats(request):
+    """Estatísticas de funcionamento do encurtador, para monitoramento.
+    """
+    response_dict = {'shortener': request.nurl.stats()}
+    for name, obj in [('store', request.nurl.store),
+                      ('tracker', request.tracker),
+                      ('pinger', request.nurl.pinger)]:
+        obj_stats = getattr(obj, 'stats', None)
+        if obj_stats is not None:
+            response_dict[name] = obj_stats()
+
+    return response_dict
+
+
+@view_config(route_name='metrics_v1')
+def metrics_exposition(request):
+    """Métricas de funcionamento no formato de exposição textual do
+    Prometheus.
+    """
+    instrumentation = request.registry.settings.get('nurl.instrumentation')
+    if instrumentation is None:
+        raise httpexceptions.HTTPNotFound()
+
+    response = Response(instrumentation.registry.exposition())
+    response.content_type = 'text/plain'
+    response.content_type_params = {'version': '0.0.4', 'charset': 'utf-8'}
+    return response
+
+
 @view_config(route_name='shortened')
 def short_ref_resolver(request):
     access = Access(utctime=datetime.utcnow(), referrer=request.referrer)
@@ -61,5 +164,8 @@ def short_ref_resolver(request):
     except NotExists:
         raise httpexceptions.HTTPNotFound() from None
 
-    raise httpexceptions.HTTPMovedPermanently(plain_url)
+    settings = request.registry.settings
+    response_class = REDIRECT_RESPONSES[settings['nurl.redirect.status']]
+    raise response_class(plain_url,
+            headers={'Cache-Control': settings['nurl.redirect.cache_control']})
 
@@ -0,0 +1,192 @@
+"""Listas de nomes de hosts permitidos de serem encurtados.
+
+As regras são nomes de hosts exatos, como ``www.scielo.br``, ou curingas que
+abrangem todos os subdomínios de um domínio, como ``*.scielo.br``. As regras
+são compiladas em uma *trie* cujas arestas são os rótulos dos nomes em ordem
+reversa, de modo que o custo de cada consulta é proporcional à quantidade de
+rótulos do nome consultado.
+"""
+import os
+import abc
+import time
+import threading
+import logging
+
+
+__all__ = ['Whitelist', 'HostnameWhitelist', 'WhitelistFile',
+        'normalize_hostname', 'parse_rules']
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+_EXACT = object()
+_WILDCARD = object()
+
+
+def normalize_hostname(hostname):
+    """Converte `hostname` para minúsculas e, se necessário, para a sua
+    representação ASCII segundo o IDNA. Retorna `None` caso o nome seja
+    inválido.
+    """
+    hostname = hostname.strip().rstrip('.')
+    try:
+        hostname.encode('ascii')
+    except UnicodeEncodeError:
+        try:
+            hostname = hostname.encode('idna').decode('ascii')
+        except UnicodeError:
+            return None
+    return hostname.lower() or None
+
+
+class Whitelist(metaclass=abc.ABCMeta):
+    """Coleção de regras de nomes de hosts permitidos.
+    """
+    @abc.abstractmethod
+    def __contains__(self, hostname: str) -> bool:
+        return NotImplemented
+
+    @abc.abstractmethod
+    def __iter__(self):
+        """Produz as regras, em ordem alfabética.
+        """
+        return NotImplemented
+
+
+class HostnameWhitelist(Whitelist):
+    """Lista de nomes de hosts permitidos compilada em uma *trie*.
+
+    :param rules: (opcional) coleção de regras.
+    """
+    def __init__(self, rules=()):
+        self.root = {}
+        self.rules = set()
+        for rule in rules:
+            self.add(rule)
+
+    def add(self, rule):
+        is_wildcard = rule.startswith('*.')
+        hostname = normalize_hostname(rule[2:] if is_wildcard else rule)
+        if hostname is None:
+            raise ValueError('invalid whitelist rule "%s"' % rule)
+
+        node = self.root
+        for label in reversed(hostname.split('.')):
+            node = node.setdefault(label, {})
+        node[_WILDCARD if is_wildcard else _EXACT] = True
+        self.rules.add('*.' + hostname if is_wildcard else hostname)
+
+    def __contains__(self, hostname):
+        if not hostname:
+            return False
+        hostname = normalize_hostname(hostname)
+        if hostname is None:
+            return False
+
+        node = self.root
+        for label in reversed(hostname.split('.')):
+            # os curingas abrangem apenas os subdomínios.
+            if _WILDCARD in node:
+                return True
+            node = node.get(label)
+            if node is None:
+                return False
+        return _EXACT in node
+
+    def __iter__(self):
+        return iter(sorted(self.rules))
+
+    def __len__(self):
+        return len(self.rules)
+
+
+def parse_rules(lines, auto_www=False):
+    """Produz as regras contidas em `lines`, ignorando as linhas vazias e os
+    comentários iniciados por ``#``. Com `auto_www`, a variante ``www.`` de
+    cada nome exato é incluída.
+    """
+    for line in lines:
+        rule = line.split('#', 1)[0].strip()
+        if not rule:
+            continue
+        yield rule
+        if auto_www and not rule.startswith(('www.', '*.')):
+            yield 'www.' + rule
+
+
+class WhitelistFile(Whitelist):
+    """Lista de nomes de hosts permitidos carregada do arquivo `path`, com
+    uma regra por linha, e recarregada quando o arquivo é modificado.
+
+    A data de modificação do arquivo é verificada no máximo uma vez a cada
+    `reload_interval` segundos, durante as consultas, de maneira que cada
+    processo recarrega a lista sem a necessidade de reinicialização. Caso o
+    arquivo não possa ser lido ou contenha regras inválidas, a lista
+    corrente é mantida.
+
+    :param path: caminho do arquivo.
+    :param auto_www: (opcional) inclui a variante ``www.`` dos nomes exatos.
+    :param reload_interval: (opcional) intervalo mínimo, em segundos, entre
+                            as verificações. O valor 0 desliga a recarga.
+    """
+    def __init__(self, path, auto_www=False, reload_interval=5.0,
+            clock=time.monotonic):
+        self.path = path
+        self.auto_www = auto_www
+        self.reload_interval = reload_interval
+        self.clock = clock
+        self.lock = threading.Lock()
+
+        self.version = self._version()
+        self.whitelist = self._load()
+        self.checked_at = self.clock()
+
+    def _version(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        with open(self.path, encoding='utf-8') as f:
+            return HostnameWhitelist(parse_rules(f, self.auto_www))
+
+    def reload(self):
+        """Recarrega a lista caso o arquivo tenha sido modificado.
+        """
+        self.checked_at = self.clock()
+        try:
+            version = self._version()
+            if version == self.version:
+                return False
+            whitelist = self._load()
+        except (OSError, ValueError) as exc:
+            LOGGER.error('could not reload the whitelist at "%s": %s',
+                    self.path, exc)
+            return False
+
+        self.whitelist, self.version = whitelist, version
+        LOGGER.info('reloaded the whitelist at "%s" with %s rules',
+                self.path, len(whitelist))
+        return True
+
+    def _maybe_reload(self):
+        if (not self.reload_interval or
+                self.clock() - self.checked_at < self.reload_interval):
+            return
+
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.reload()
+        finally:
+            self.lock.release()
+
+    def __contains__(self, hostname):
+        self._maybe_reload()
+        return hostname in self.whitelist
+
+    def __iter__(self):
+        return iter(self.whitelist)
+
+    def __len__(self):
+        return len(self.whitelist)
@@ -12,13 +12,21 @@ if sys.version_info[0:2] < (3, 6):
 
 
 INSTALL_REQUIRES = [
-        'pyramid >= 1.8.3',
+        'pyramid >= 1.10',
         'pyramid-chameleon >= 0.3',
         'pyramid-webassets >= 0.9',
         'yuicompressor >= 2.4.8',
         'pymongo >= 3.4.0',
         ]
 TESTS_REQUIRE = []
+EXTRAS_REQUIRE = {
+        # operações vetorizadas em `nurl.base28`
+        'numpy': ['numpy >= 1.17'],
+        # modo assíncrono, em `nurl.aio`
+        'asyncio': ['motor >= 2.0', 'uvicorn >= 0.11'],
+        # variantes em brotli dos arquivos estáticos, em `nurl.precompression`
+        'brotli': ['brotli >= 1.0'],
+        }
 
 
 setup(
@@ -44,10 +52,15 @@ setup(
     tests_require=TESTS_REQUIRE,
     test_suite='tests',
     install_requires=INSTALL_REQUIRES,
+    extras_require=EXTRAS_REQUIRE,
     entry_points={
         'paste.app_factory': [
             'main = nurl.webapp:main',
         ],
+        'console_scripts': [
+            'nurl-snapshot = nurl.snapshot:main',
+            'nurl-manage = nurl.manage:main',
+        ],
     },
 )
 
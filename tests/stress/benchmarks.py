@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""Conjunto de *benchmarks* reprodutíveis do encurtador, executados no mesmo
+processo e sem acesso à rede.
+
+Para cada *benchmark* são informadas a vazão, em operações por segundo, e a
+latência das operações nos percentis 50, 95 e 99. Os resultados podem ser
+salvos como referência (`--save`) e comparados com uma referência anterior
+(`--compare`); nesse caso, o script termina com o status 1 caso a vazão de
+algum *benchmark* diminua, ou a latência no percentil 95 aumente, mais do
+que a tolerância definida em `--threshold`.
+
+As dependências opcionais são listadas em ``requirements.txt``. Os
+*benchmarks* de ``MongoDBDataStore`` utilizam o ``mongomock`` ou, na sua
+ausência, o servidor indicado na variável de ambiente NURL_MONGODB_URI; os
+da aplicação WSGI utilizam o ``WebTest``. Os *benchmarks* cujas dependências
+não estão disponíveis são ignorados.
+
+Uso: python benchmarks.py [-n operações] [-k padrão] [--save arquivo.json]
+                          [--compare arquivo.json] [--threshold 0.25]
+"""
+import argparse
+import fnmatch
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from datetime import datetime
+from unittest import mock
+
+from nurl import base28, datastores, shortener
+
+
+SEED = 28
+URL = 'http://www.scielo.br/scielo.php?script=sci_arttext&pid=%s'
+PERCENTILES = (50, 95, 99)
+
+WEBAPP_SETTINGS = {
+    'pyramid.includes': 'pyramid_chameleon pyramid_webassets',
+    'webassets.base_dir': 'nurl.webapp:static',
+    'webassets.base_url': '/static',
+    'webassets.debug': 'True',
+    'webassets.cache': 'False',
+    'webassets.manifest': 'False',
+    'webassets.auto_build': 'False',
+    'nurl.backend': 'sqlite',
+    'nurl.ping.strategy': 'urlopen',
+    'nurl.tracker.max_queued': '1000000',
+}
+
+BENCHMARKS = OrderedDict()
+
+
+class Unavailable(Exception):
+    """O *benchmark* não pode ser executado no ambiente corrente.
+    """
+
+
+def benchmark(name, max_ops=None):
+    """Registra uma função que prepara o *benchmark* `name`, limitado a
+    `max_ops` operações.
+
+    A função recebe a quantidade de operações e o diretório temporário da
+    execução, e retorna o executável que realiza a i-ésima operação.
+    """
+    def decorator(setup):
+        BENCHMARKS[name] = (setup, max_ops)
+        return setup
+    return decorator
+
+
+def refs_sample(n, length=6):
+    refs = set()
+    while len(refs) < n:
+        refs.update(base28.generate_ids(n - len(refs), length))
+    return sorted(refs)
+
+
+class UrllibRequestStub:
+    """Substitui `urllib.request` em :class:`nurl.shortener.URLChecker`,
+    de modo que todas as URLs são consideradas válidas.
+    """
+    class Response:
+        def close(self):
+            pass
+
+    def urlopen(self, url, timeout=None):
+        return self.Response()
+
+
+@benchmark('base28.generate_id')
+def bench_generate_id(n, tmpdir):
+    return lambda i: base28.generate_id(6)
+
+
+@benchmark('base28.generate_ids[100]')
+def bench_generate_ids(n, tmpdir):
+    return lambda i: base28.generate_ids(100, 6)
+
+
+def store_benchmarks(prefix, factory, max_ops=None):
+    @benchmark(prefix + '.set', max_ops)
+    def bench_set(n, tmpdir):
+        store = factory(tmpdir)
+        refs = refs_sample(n)
+
+        def op(i):
+            store[refs[i]] = URL % refs[i]
+        return op
+
+    @benchmark(prefix + '.get', max_ops)
+    def bench_get(n, tmpdir):
+        store = factory(tmpdir)
+        refs = refs_sample(min(n, 10000))
+        store.set_many({ref: URL % ref for ref in refs})
+        return lambda i: store[refs[i % len(refs)]]
+
+    @benchmark(prefix + '.key', max_ops)
+    def bench_key(n, tmpdir):
+        store = factory(tmpdir)
+        refs = refs_sample(min(n, 10000))
+        store.set_many({ref: URL % ref for ref in refs})
+        return lambda i: store.key(URL % refs[i % len(refs)])
+
+
+def mongodb_collection(tmpdir):
+    try:
+        import mongomock
+    except ImportError:
+        mongodb_uri = os.environ.get('NURL_MONGODB_URI')
+        if not mongodb_uri:
+            raise Unavailable('requires mongomock or NURL_MONGODB_URI')
+        import pymongo
+        client = pymongo.MongoClient(mongodb_uri)
+    else:
+        client = mongomock.MongoClient()
+
+    # cada preparação utiliza uma coleção vazia.
+    db = client['nurl_bench']
+    db.drop_collection('urls')
+    return db['urls']
+
+
+store_benchmarks('InMemoryDataStore',
+        lambda tmpdir: datastores.InMemoryDataStore())
+# as consultas do mongomock percorrem toda a coleção.
+store_benchmarks('MongoDBDataStore',
+        lambda tmpdir: datastores.MongoDBDataStore(mongodb_collection(tmpdir)),
+        max_ops=2000)
+
+
+def make_nurl():
+    return shortener.Nurl(datastores.InMemoryDataStore(),
+            lambda: base28.igenerate_id(6))
+
+
+@benchmark('Nurl.shorten')
+def bench_shorten(n, tmpdir):
+    nurl = make_nurl()
+    return lambda i: nurl.shorten(URL % i)
+
+
+@benchmark('Nurl.shorten[existing]')
+def bench_shorten_existing(n, tmpdir):
+    nurl = make_nurl()
+    urls = [URL % i for i in range(min(n, 10000))]
+    for url in urls:
+        nurl.shorten(url)
+    return lambda i: nurl.shorten(urls[i % len(urls)])
+
+
+@benchmark('Nurl.resolve')
+def bench_resolve(n, tmpdir):
+    nurl = make_nurl()
+    refs = [nurl.shorten(URL % i) for i in range(min(n, 10000))]
+    return lambda i: nurl.resolve(refs[i % len(refs)])
+
+
+def make_testapp(tmpdir, **settings):
+    try:
+        import webtest
+    except ImportError:
+        raise Unavailable('requires WebTest') from None
+    from nurl.webapp import main as make_app
+
+    settings = dict(WEBAPP_SETTINGS, **settings)
+    settings['nurl.sqlite.path'] = os.path.join(tmpdir,
+            'nurl-%s.db' % len(os.listdir(tmpdir)))
+    app = make_app({}, **settings)
+    nurl = getattr(app, 'nurl', None) or app.registry.settings['nurl']
+    return webtest.TestApp(app), nurl
+
+
+def webapp_refs(nurl, n):
+    refs = refs_sample(min(n, 10000))
+    nurl.store.set_many({ref: URL % ref for ref in refs})
+    return refs
+
+
+@benchmark('webapp.redirect')
+def bench_redirect(n, tmpdir):
+    app, nurl = make_testapp(tmpdir)
+    refs = webapp_refs(nurl, n)
+    return lambda i: app.get('/' + refs[i % len(refs)], status=301)
+
+
+@benchmark('webapp.redirect[pyramid]')
+def bench_redirect_pyramid(n, tmpdir):
+    app, nurl = make_testapp(tmpdir, **{'nurl.redirect.fast_path': 'False'})
+    refs = webapp_refs(nurl, n)
+    return lambda i: app.get('/' + refs[i % len(refs)], status=301)
+
+
+@benchmark('webapp.shorten[existing]')
+def bench_webapp_shorten(n, tmpdir):
+    app, nurl = make_testapp(tmpdir)
+    refs = webapp_refs(nurl, n)
+    return lambda i: app.get('/api/v1/shorten',
+            {'url': URL % refs[i % len(refs)]}, status=200)
+
+
+@benchmark('webapp.resolve')
+def bench_webapp_resolve(n, tmpdir):
+    app, nurl = make_testapp(tmpdir)
+    refs = webapp_refs(nurl, n)
+    return lambda i: app.get('/api/v1/resolve',
+            {'ref': refs[i % len(refs)]}, status=200)
+
+
+def percentile(ordered, p):
+    index = max(0, int(round(p / 100 * len(ordered))) - 1)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def measure(op, n):
+    """Executa `n` operações, precedidas de um aquecimento, e retorna a vazão
+    e os percentis da latência, em microssegundos.
+    """
+    warmup = min(n // 10, 1000)
+    for i in range(warmup):
+        op(i)
+
+    latencies = []
+    timer = time.perf_counter
+    gc.collect()
+    start = timer()
+    for i in range(warmup, warmup + n):
+        t1 = timer()
+        op(i)
+        latencies.append(timer() - t1)
+    elapsed = timer() - start
+
+    latencies.sort()
+    result = OrderedDict([('ops', n), ('ops_per_sec', n / elapsed)])
+    for p in PERCENTILES:
+        result['p%s_us' % p] = percentile(latencies, p) * 1e6
+    return result
+
+
+def run(names, n):
+    results = OrderedDict()
+    for name in names:
+        setup, max_ops = BENCHMARKS[name]
+        ops = min(n, max_ops or n)
+        # as operações de cada benchmark independem das anteriores.
+        random.seed(SEED)
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch.object(shortener.URLChecker, 'urllib_request',
+                                  UrllibRequestStub()):
+            try:
+                op = setup(ops + min(ops // 10, 1000), tmpdir)
+            except Unavailable as exc:
+                print('%-28s skipped: %s' % (name, exc))
+                continue
+            results[name] = measure(op, ops)
+        print('%-28s %12.0f ops/s   p50 %8.1f us   p95 %8.1f us   '
+              'p99 %8.1f us' % ((name, results[name]['ops_per_sec'])
+                  + tuple(results[name]['p%s_us' % p] for p in PERCENTILES)))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Compara `results` com os resultados de `baseline`, e retorna a lista
+    de regressões que excedem `threshold`.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+
+        throughput = current['ops_per_sec'] / previous['ops_per_sec'] - 1
+        latency = current['p95_us'] / previous['p95_us'] - 1
+        print('%-28s ops/s %+7.1f%%   p95 %+7.1f%%'
+              % (name, throughput * 100, latency * 100))
+        if throughput < -threshold:
+            regressions.append('%s: throughput decreased %.1f%%'
+                               % (name, -throughput * 100))
+        if latency > threshold:
+            regressions.append('%s: p95 latency increased %.1f%%'
+                               % (name, latency * 100))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            description='Offline benchmarks of nurl.')
+    parser.add_argument('-n', '--ops', type=int, default=20000,
+            help='operations measured by each benchmark')
+    parser.add_argument('-k', '--select', default='*',
+            help='run only the benchmarks matching this glob pattern')
+    parser.add_argument('--save', metavar='PATH',
+            help='save the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH',
+            help='compare the results to a JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+            help='tolerated regression, as a fraction of the baseline')
+    parser.add_argument('-l', '--list', action='store_true',
+            help='list the benchmarks and exit')
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS
+             if fnmatch.fnmatchcase(name, args.select)]
+    if args.list:
+        print('\n'.join(names))
+        return 0
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = run(names, args.ops)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(OrderedDict([
+                ('created', datetime.utcnow().isoformat()),
+                ('python', platform.python_version()),
+                ('platform', platform.platform()),
+                ('results', results),
+                ]), f, indent=2)
+
+    if baseline is not None:
+        print('\ncompared to %s (%s, Python %s)'
+              % (args.compare, baseline['created'], baseline['python']))
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            print('\nregressions beyond %.0f%%:\n  %s'
+                  % (args.threshold * 100, '\n  '.join(regressions)))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Compara a latência das operações de `SQLiteDataStore` e
+`MongoDBDataStore`.
+
+O MongoDB é utilizado apenas se a variável de ambiente NURL_MONGODB_URI
+estiver definida. As bases de dados utilizadas são removidas ao final.
+
+Uso: python datastore_backends.py [quantidade de pares]
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+from nurl import base28, datastores
+
+
+URL = 'http://www.scielo.br/scielo.php?script=sci_arttext&pid=%s'
+BATCH_SIZE = 100
+
+
+def timed(label, n, func):
+    t1 = datetime.now()
+    func()
+    elapsed = (datetime.now() - t1).total_seconds()
+    print('  %-10s %8.1f us/op' % (label, elapsed / n * 1e6))
+
+
+def run(store, refs):
+    half = len(refs) // 2
+    single, batched = refs[:half], refs[half:]
+
+    def set_single():
+        for ref in single:
+            store[ref] = URL % ref
+
+    def set_many():
+        for i in range(0, len(batched), BATCH_SIZE):
+            store.set_many({ref: URL % ref
+                            for ref in batched[i:i + BATCH_SIZE]})
+
+    def get():
+        for ref in refs:
+            store[ref]
+
+    def key():
+        for ref in refs:
+            store.key(URL % ref)
+
+    timed('set', len(single), set_single)
+    timed('set_many', len(batched), set_many)
+    timed('get', len(refs), get)
+    timed('key', len(refs), key)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    refs = list(set(base28.generate_ids(n, 6)))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = datastores.SQLiteDataStore(os.path.join(tmpdir, 'bench.db'))
+        print('SQLiteDataStore')
+        run(store, refs)
+        store.close()
+
+    mongodb_uri = os.environ.get('NURL_MONGODB_URI')
+    if mongodb_uri:
+        import pymongo
+        client = pymongo.MongoClient(mongodb_uri)
+        try:
+            store = datastores.MongoDBDataStore(client['nurl_bench']['urls'])
+            print('MongoDBDataStore')
+            run(store, refs)
+        finally:
+            client.drop_database('nurl_bench')
+
+
+if __name__ == '__main__':
+    main()
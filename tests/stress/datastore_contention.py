@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Compara a vazão de `InMemoryDataStore` e `StripedInMemoryDataStore` sob
+acesso concorrente de diversas threads.
+
+Cada thread realiza inclusões e consultas intercaladas, na proporção de uma
+inclusão para `READS_PER_WRITE` consultas.
+
+Uso: python datastore_contention.py [operações por thread]
+"""
+import sys
+import threading
+from datetime import datetime
+
+from nurl import datastores
+
+
+READS_PER_WRITE = 9
+THREADS = (1, 2, 4, 8, 16, 32)
+
+
+def worker(store, thread_id, ops, barrier):
+    barrier.wait()
+    written = []
+    for i in range(ops):
+        if i % (READS_PER_WRITE + 1) == 0:
+            key = '%s-%s' % (thread_id, i)
+            store[key] = 'http://www.scielo.br/%s' % key
+            written.append(key)
+        else:
+            store[written[i % len(written)]]
+
+
+def measure(factory, threads, ops):
+    store = factory()
+    barrier = threading.Barrier(threads + 1)
+    workers = [threading.Thread(target=worker, args=(store, i, ops, barrier))
+               for i in range(threads)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    t1 = datetime.now()
+    for w in workers:
+        w.join()
+    elapsed = (datetime.now() - t1).total_seconds()
+    return threads * ops / elapsed, store
+
+
+def main():
+    ops = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for threads in THREADS:
+        for factory in (datastores.InMemoryDataStore,
+                        datastores.StripedInMemoryDataStore):
+            rate, store = measure(factory, threads, ops)
+            contended = getattr(store, 'stats', lambda: {})().get('contended')
+            print('%2d threads, %s: %.0f ops/s%s'
+                  % (threads, factory.__name__, rate,
+                     '' if contended is None
+                     else ' (%s contended writes)' % contended))
+
+
+if __name__ == '__main__':
+    main()
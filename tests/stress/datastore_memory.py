@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Mede a memória ocupada por mapeamento nas implementações em memória de
+`nurl.datastores.DataStore`.
+
+Uso: python datastore_memory.py [quantidade de mapeamentos]
+"""
+import sys
+import tracemalloc
+from datetime import datetime
+
+from nurl import base28, datastores
+
+
+URL = 'http://www.scielo.br/scielo.php?script=sci_arttext&pid=%s'
+
+
+def sample(n, length=6):
+    refs = set()
+    while len(refs) < n:
+        refs.update(base28.generate_ids(n - len(refs), length))
+    return refs
+
+
+def measure(factory, refs):
+    tracemalloc.start()
+    t1 = datetime.now()
+    store = factory()
+    for ref in refs:
+        # as chaves são copiadas para que sejam contabilizadas.
+        store[ref.encode('ascii').decode('ascii')] = URL % ref
+    if hasattr(store, 'compact'):
+        store.compact()
+    t2 = datetime.now()
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return store, used, t2 - t1
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    refs = sample(n)
+
+    for factory in (datastores.InMemoryDataStore,
+                    datastores.CompactInMemoryDataStore):
+        store, used, elapsed = measure(factory, refs)
+        print('%s: %.1f bytes per mapping (%.1f MiB), loaded in %s'
+              % (factory.__name__, used / n, used / 2 ** 20, elapsed))
+        del store
+
+
+if __name__ == '__main__':
+    main()
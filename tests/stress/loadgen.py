@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""Gerador de carga assíncrono para uma instância em execução da webapp.
+
+As requisições combinam, nas proporções definidas em `--mix`, o
+encurtamento de novas URLs (``shorten``), o redirecionamento de referências
+existentes (``resolve``) e o de referências inexistentes (``notfound``). A
+popularidade das referências segue uma distribuição de Zipf com expoente
+`--zipf`, de modo que poucas referências concentram a maior parte dos
+acessos, como em produção.
+
+Com `--rate`, as requisições chegam segundo um processo de Poisson,
+independentemente das respostas (carga em laço aberto), e a latência é
+contada a partir do instante programado para cada requisição, incluindo a
+espera por uma das `--concurrency` conexões. Sem `--rate`, cada uma das
+conexões realiza uma requisição após a outra (laço fechado). As requisições
+dos primeiros `--warmup` segundos são descartadas.
+
+As URLs encurtadas apontam para um servidor HTTP local (*stub*), iniciado
+pelo próprio script, de maneira que as verificações de conectividade
+realizadas pela webapp nunca deixam a máquina.
+
+Uso: python loadgen.py [--target http://127.0.0.1:6543] [--duration 30]
+                       [--rate 500] [--concurrency 64]
+                       [--mix shorten=0.05,resolve=0.9,notfound=0.05]
+                       [--csv resultado.csv] [--json resultado.json]
+"""
+import argparse
+import asyncio
+import bisect
+import csv
+import http.server
+import itertools
+import json
+import random
+import socketserver
+import sys
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+
+from nurl import base28
+
+
+KINDS = ('shorten', 'resolve', 'notfound')
+EXPECTED_STATUS = {'shorten': (200,), 'resolve': (301, 302),
+                   'notfound': (404,)}
+PERCENTILES = (50, 90, 95, 99, 99.9)
+SETUP_BATCH_SIZE = 500
+
+
+class OriginHandler(http.server.BaseHTTPRequestHandler):
+    """Responde com o status 200 e o corpo vazio a qualquer requisição.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_GET = do_HEAD
+
+    def log_message(self, format, *args):
+        pass
+
+
+class OriginServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+def start_origin(host='127.0.0.1', port=0):
+    """Inicia o servidor de origem local em uma thread e retorna sua URL
+    base.
+    """
+    server = OriginServer((host, port), OriginHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return 'http://%s:%s' % server.server_address[:2]
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class Connection:
+    """Conexão HTTP/1.1 persistente com o servidor sob teste.
+    """
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, target, body=b'', headers=()):
+        """Retorna o status e o corpo da resposta.
+        """
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                    self.host, self.port)
+
+        lines = ['%s %s HTTP/1.1' % (method, target),
+                 'Host: %s:%s' % (self.host, self.port),
+                 'Content-Length: %s' % len(body)]
+        lines.extend('%s: %s' % header for header in headers)
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+                          + body)
+
+        try:
+            status_line = await self.reader.readline()
+            if not status_line:
+                raise ProtocolError('connection closed by the server')
+            version, status = status_line.split(None, 2)[:2]
+
+            response_headers = {}
+            while True:
+                line = await self.reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                response_headers[name.strip().lower()] = value.strip()
+
+            if response_headers.get('transfer-encoding') == 'chunked':
+                body = await self._read_chunked()
+            elif 'content-length' in response_headers:
+                body = await self.reader.readexactly(
+                        int(response_headers['content-length']))
+            else:
+                body = await self.reader.read()
+                self.close()
+        except BaseException:
+            self.close()
+            raise
+
+        if (response_headers.get('connection', '').lower() == 'close'
+                or version == b'HTTP/1.0'):
+            self.close()
+        return int(status), body
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                while (await self.reader.readline()) not in (b'\r\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+class ZipfSampler:
+    """Sorteia itens de `items` com probabilidade proporcional a
+    ``1 / posição ** s``.
+    """
+    def __init__(self, items, s, rand):
+        self.items = list(items)
+        self.cum_weights = list(itertools.accumulate(
+                1 / rank ** s for rank in range(1, len(self.items) + 1)))
+        self.rand = rand
+
+    def sample(self):
+        x = self.rand.random() * self.cum_weights[-1]
+        index = bisect.bisect(self.cum_weights, x)
+        return self.items[min(index, len(self.items) - 1)]
+
+
+class LoadGenerator:
+    def __init__(self, target, origin, concurrency, mix, zipf_s, timeout,
+            seed):
+        parts = urllib.parse.urlsplit(target)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.origin = origin
+        self.timeout = timeout
+        self.rand = random.Random(seed)
+        self.kinds, weights = zip(*mix.items())
+        self.cum_weights = list(itertools.accumulate(weights))
+        self.zipf_s = zipf_s
+        self.sampler = None
+        self.refs = set()
+        self.new_urls = itertools.count()
+        # as URLs de cada execução são inéditas para o servidor, mesmo com
+        # a mesma semente.
+        self.run_id = '%x' % int(time.time() * 1000)
+
+        self.idle = [Connection(self.host, self.port)
+                     for _ in range(concurrency)]
+        self.available = asyncio.Semaphore(concurrency)
+        self.samples = []
+
+    async def _acquire(self):
+        await self.available.acquire()
+        return self.idle.pop()
+
+    def _release(self, conn):
+        self.idle.append(conn)
+        self.available.release()
+
+    async def setup(self, n):
+        """Encurta `n` URLs do servidor de origem, cujas referências serão
+        utilizadas nas requisições ``resolve``.
+        """
+        refs = []
+        conn = await self._acquire()
+        try:
+            for start in range(0, n, SETUP_BATCH_SIZE):
+                urls = ['%s/doc/%s/%s' % (self.origin, self.run_id, i)
+                        for i in range(start, min(start + SETUP_BATCH_SIZE, n))]
+                status, body = await conn.request('POST',
+                        '/api/v1/shorten/batch',
+                        json.dumps({'urls': urls}).encode('utf-8'),
+                        [('Content-Type', 'application/json')])
+                if status != 200:
+                    raise ProtocolError('could not shorten the URLs: %s %s'
+                                        % (status, body[:200]))
+                for result in json.loads(body.decode('utf-8'))['results']:
+                    if 'short_url' in result:
+                        refs.append(urllib.parse.urlsplit(
+                            result['short_url']).path.lstrip('/'))
+        finally:
+            self._release(conn)
+
+        if not refs:
+            raise ProtocolError('no URL was shortened')
+        self.refs = set(refs)
+        self.ref_len = len(refs[0])
+        # a ordem de popularidade independe da ordem de encurtamento.
+        self.rand.shuffle(refs)
+        self.sampler = ZipfSampler(refs, self.zipf_s, self.rand)
+
+    def next_request(self):
+        kind = self.kinds[bisect.bisect(self.cum_weights,
+                                        self.rand.random() * self.cum_weights[-1])]
+        if kind == 'shorten':
+            url = '%s/new/%s/%s' % (self.origin, self.run_id,
+                                    next(self.new_urls))
+            target = '/api/v1/shorten?' + urllib.parse.urlencode({'url': url})
+        elif kind == 'resolve':
+            target = '/' + self.sampler.sample()
+        else:
+            ref = None
+            while ref is None or ref in self.refs:
+                ref = ''.join(self.rand.choice(base28.BASE28)
+                              for _ in range(self.ref_len))
+            target = '/' + ref
+        return kind, target
+
+    async def send(self, kind, target, scheduled, record):
+        conn = await self._acquire()
+        try:
+            status, _ = await asyncio.wait_for(conn.request('GET', target),
+                    self.timeout)
+        except asyncio.TimeoutError:
+            conn.close()
+            outcome = 'timeout'
+        except (OSError, ProtocolError, ValueError,
+                asyncio.IncompleteReadError) as exc:
+            outcome = type(exc).__name__
+        else:
+            outcome = ('ok' if status in EXPECTED_STATUS[kind]
+                       else 'status %s' % status)
+        finally:
+            self._release(conn)
+
+        if record:
+            self.samples.append((kind, outcome,
+                                 time.perf_counter() - scheduled))
+
+    async def run_open_loop(self, rate, duration, warmup):
+        loop = asyncio.get_event_loop()
+        pending = set()
+        start = time.perf_counter()
+        scheduled = start
+        while scheduled < start + warmup + duration:
+            scheduled += self.rand.expovariate(rate)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            kind, target = self.next_request()
+            task = asyncio.ensure_future(self.send(kind, target, scheduled,
+                    record=scheduled >= start + warmup), loop=loop)
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.wait(pending)
+
+    async def run_closed_loop(self, concurrency, duration, warmup):
+        start = time.perf_counter()
+        end = start + warmup + duration
+
+        async def worker():
+            while True:
+                scheduled = time.perf_counter()
+                if scheduled >= end:
+                    return
+                kind, target = self.next_request()
+                await self.send(kind, target, scheduled,
+                        record=scheduled >= start + warmup)
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+    def close(self):
+        for conn in self.idle:
+            conn.close()
+
+
+def percentile(ordered, p):
+    index = max(0, int(round(p / 100 * len(ordered))) - 1)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def summarize(samples, duration):
+    """Agrupa as amostras por tipo de requisição e por resultado, e calcula
+    a vazão e os percentis da latência, em milissegundos.
+    """
+    groups = OrderedDict()
+    for kind, outcome, latency in sorted(samples):
+        groups.setdefault((kind, 'all'), []).append(latency)
+        groups.setdefault((kind, outcome), []).append(latency)
+
+    rows = []
+    for (kind, outcome), latencies in groups.items():
+        latencies.sort()
+        row = OrderedDict([('kind', kind), ('outcome', outcome),
+                           ('requests', len(latencies)),
+                           ('rps', len(latencies) / duration)])
+        for p in PERCENTILES:
+            row['p%s_ms' % p] = percentile(latencies, p) * 1e3
+        row['max_ms'] = latencies[-1] * 1e3
+        rows.append(row)
+    return rows
+
+
+def print_report(rows):
+    print('%-9s %-22s %9s %9s %s %9s' % (('kind', 'outcome', 'requests',
+          'req/s') + (' '.join('%9s' % ('p%s ms' % p) for p in PERCENTILES),
+          'max ms')))
+    for row in rows:
+        print('%-9s %-22s %9d %9.1f %s %9.2f' % (row['kind'], row['outcome'],
+              row['requests'], row['rps'],
+              ' '.join('%9.2f' % row['p%s_ms' % p] for p in PERCENTILES),
+              row['max_ms']))
+
+
+def parse_mix(value):
+    mix = OrderedDict()
+    for item in value.split(','):
+        kind, _, weight = item.partition('=')
+        if kind not in KINDS:
+            raise argparse.ArgumentTypeError('unknown request kind "%s"' % kind)
+        mix[kind] = float(weight)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError('at least one weight must be positive')
+    return mix
+
+
+async def run(args, origin):
+    generator = LoadGenerator(args.target, origin, args.concurrency, args.mix,
+            args.zipf, args.timeout, args.seed)
+    try:
+        print('shortening %s URLs of %s...' % (args.refs, origin))
+        await generator.setup(args.refs)
+        print('running for %ss after a %ss warmup...'
+              % (args.duration, args.warmup))
+        if args.rate:
+            await generator.run_open_loop(args.rate, args.duration,
+                    args.warmup)
+        else:
+            await generator.run_closed_loop(args.concurrency, args.duration,
+                    args.warmup)
+    finally:
+        generator.close()
+    return generator.samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            description='Asynchronous load generator for nurl.')
+    parser.add_argument('--target', default='http://127.0.0.1:6543',
+            help='base URL of the server under test')
+    parser.add_argument('--duration', type=float, default=30,
+            help='seconds of measured load')
+    parser.add_argument('--warmup', type=float, default=5,
+            help='seconds of load discarded before the measurement')
+    parser.add_argument('--rate', type=float, default=0,
+            help='mean arrival rate, in requests/s; 0 for a closed loop')
+    parser.add_argument('--concurrency', type=int, default=64,
+            help='maximum connections to the server')
+    parser.add_argument('--mix', type=parse_mix,
+            default=parse_mix('shorten=0.05,resolve=0.9,notfound=0.05'),
+            help='weights of each kind of request')
+    parser.add_argument('--refs', type=int, default=10000,
+            help='URLs shortened before the load, to be resolved')
+    parser.add_argument('--zipf', type=float, default=1.1,
+            help='exponent of the popularity of the refs')
+    parser.add_argument('--timeout', type=float, default=10,
+            help='timeout of each request, in seconds')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--origin', default=None,
+            help='base URL of an origin already running, instead of the '
+                 'local stub')
+    parser.add_argument('--origin-host', default='127.0.0.1',
+            help='address of the local stub origin')
+    parser.add_argument('--csv', metavar='PATH',
+            help='save the summary as CSV')
+    parser.add_argument('--json', metavar='PATH',
+            help='save the summary and the parameters as JSON')
+    args = parser.parse_args(argv)
+
+    origin = args.origin or start_origin(args.origin_host)
+    loop = asyncio.get_event_loop()
+    samples = loop.run_until_complete(run(args, origin))
+    if not samples:
+        print('no request was measured')
+        return 1
+
+    rows = summarize(samples, args.duration)
+    print_report(rows)
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    if args.json:
+        params = OrderedDict((name, getattr(args, name)) for name in (
+            'target', 'duration', 'warmup', 'rate', 'concurrency', 'mix',
+            'refs', 'zipf', 'timeout', 'seed'))
+        with open(args.json, 'w') as f:
+            json.dump(OrderedDict([('params', params), ('results', rows)]),
+                      f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Mede a quantidade de redirecionamentos por segundo atendidos pela webapp,
+com e sem o atalho WSGI para ``/{short_ref}``.
+
+As requisições são realizadas diretamente na aplicação WSGI, no mesmo
+processo, de modo que o resultado não inclui o custo da rede nem o do
+servidor HTTP. A base de dados SQLite utilizada é temporária.
+
+Uso: python redirect_rps.py [requisições]
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+from nurl import base28
+from nurl.webapp import main as make_app
+
+
+SETTINGS = {
+    'pyramid.includes': 'pyramid_chameleon pyramid_webassets',
+    'webassets.base_dir': 'nurl.webapp:static',
+    'webassets.base_url': '/static',
+    'webassets.debug': 'True',
+    'webassets.cache': 'False',
+    'webassets.manifest': 'False',
+    'webassets.auto_build': 'False',
+    'nurl.backend': 'sqlite',
+    'nurl.ping.strategy': 'urlopen',
+    # evita o descarte de acessos, que distorceria a comparação.
+    'nurl.tracker.max_queued': '1000000',
+}
+
+
+def start_response(status, headers, exc_info=None):
+    assert status.startswith('301'), status
+
+
+def run(app, refs, n):
+    environs = [{'REQUEST_METHOD': 'GET', 'PATH_INFO': '/' + ref,
+                 'SCRIPT_NAME': '', 'QUERY_STRING': '',
+                 'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+                 'HTTP_HOST': 'localhost', 'wsgi.url_scheme': 'http'}
+                for ref in refs]
+    t1 = datetime.now()
+    for i in range(n):
+        for _ in app(dict(environs[i % len(environs)]), start_response):
+            pass
+    return n / (datetime.now() - t1).total_seconds()
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    refs = base28.generate_ids(1000, 6)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        settings = dict(SETTINGS,
+                **{'nurl.sqlite.path': os.path.join(tmpdir, 'nurl.db')})
+        for fast_path in ('False', 'True'):
+            app = make_app({}, **dict(settings,
+                    **{'nurl.redirect.fast_path': fast_path}))
+            nurl = app.nurl if fast_path == 'True' else \
+                    app.registry.settings['nurl']
+            nurl.store.set_many({ref: 'http://www.scielo.br/%s' % ref
+                                 for ref in refs})
+            print('fast path %s: %.0f requests/s'
+                  % (fast_path.lower(), run(app, refs, n)))
+
+
+if __name__ == '__main__':
+    main()
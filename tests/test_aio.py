@@ -0,0 +1,619 @@
+import os
+import gzip
+import json
+import asyncio
+import tempfile
+import unittest
+from unittest import mock
+from datetime import datetime
+
+from nurl import (
+        base28,
+        datastores as sync_datastores,
+        idgenerators,
+        manage,
+        mongodb,
+        pyramid_nurl,
+        )
+from nurl.pingers import PingResult
+from nurl.shortener import URLError, NotExists, URLCanonicalizer
+from nurl.trackers import Access, InMemoryTracker
+from nurl.aio import (
+        datastores,
+        trackers,
+        pingers,
+        shortener,
+        app as aioapp,
+        )
+from .test_pingers import CountingServer, OriginHandler
+
+
+IS_RUNNING_ON_TRAVISCI = os.environ.get('TRAVIS', False)
+
+
+class AsyncTestCase(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+
+class AsyncInMemoryDataStoreTests(AsyncTestCase):
+    def make_store(self):
+        return datastores.AsyncInMemoryDataStore()
+
+    def setUp(self):
+        super().setUp()
+        self.store = self.make_store()
+
+    def tearDown(self):
+        self.run_async(self.store.close())
+        super().tearDown()
+
+    def test_set_and_get(self):
+        self.run_async(self.store.set('4kgjc', 'http://www.scielo.br'))
+        self.assertEqual(self.run_async(self.store.get('4kgjc')),
+                'http://www.scielo.br')
+        self.assertEqual(self.run_async(self.store.key('http://www.scielo.br')),
+                '4kgjc')
+
+    def test_missing_key(self):
+        self.assertRaises(KeyError,
+                lambda: self.run_async(self.store.get('4kgjc')))
+        self.assertRaises(KeyError,
+                lambda: self.run_async(self.store.key('http://www.scielo.br')))
+
+    def test_duplicated_key(self):
+        self.run_async(self.store.set('4kgjc', 'http://www.scielo.br'))
+        self.assertRaises(sync_datastores.DuplicatedKeyError,
+                lambda: self.run_async(
+                    self.store.set('4kgjc', 'http://www.scielo.org')))
+
+    def test_duplicated_value(self):
+        self.run_async(self.store.set('4kgjc', 'http://www.scielo.br'))
+        self.assertRaises(sync_datastores.DuplicatedValueError,
+                lambda: self.run_async(
+                    self.store.set('4kgjd', 'http://www.scielo.br')))
+
+    def test_many(self):
+        failures = self.run_async(self.store.set_many(
+                {'4kgjc': 'http://www.scielo.br',
+                 '4kgjd': 'http://www.scielo.org'}))
+        self.assertEqual(failures, {})
+
+        failures = self.run_async(self.store.set_many(
+                {'4kgjc': 'http://blog.scielo.org',
+                 '4kgjf': 'http://www.scielo.org'}))
+        self.assertIsInstance(failures['4kgjc'],
+                sync_datastores.DuplicatedKeyError)
+        self.assertIsInstance(failures['4kgjf'],
+                sync_datastores.DuplicatedValueError)
+
+        self.assertEqual(self.run_async(self.store.get_many(['4kgjc', 'x'])),
+                {'4kgjc': 'http://www.scielo.br'})
+        self.assertEqual(self.run_async(self.store.key_many(
+                ['http://www.scielo.org', 'http://x.org'])),
+                {'http://www.scielo.org': '4kgjd'})
+
+    def test_keys(self):
+        self.run_async(self.store.set('4kgjc', 'http://www.scielo.br'))
+        self.run_async(self.store.set('4kgjd', 'http://www.scielo.org'))
+
+        async def collect():
+            return [key async for key in self.store.keys()]
+
+        self.assertEqual(sorted(self.run_async(collect())),
+                ['4kgjc', '4kgjd'])
+
+
+class AsyncCachingDataStoreTests(AsyncInMemoryDataStoreTests):
+    def make_store(self):
+        return datastores.AsyncCachingDataStore(
+                datastores.AsyncInMemoryDataStore(), maxsize=10)
+
+    def test_hits_are_served_from_the_cache(self):
+        self.run_async(self.store.store.set('4kgjc', 'http://www.scielo.br'))
+        self.run_async(self.store.get('4kgjc'))
+        self.run_async(self.store.get('4kgjc'))
+        self.assertEqual(self.store.stats()['values']['hits'], 1)
+
+
+class ExecutorDataStoreTests(AsyncInMemoryDataStoreTests):
+    def make_store(self):
+        return datastores.ExecutorDataStore(
+                sync_datastores.InMemoryDataStore())
+
+
+@unittest.skipUnless(IS_RUNNING_ON_TRAVISCI, 'requires travis-ci')
+class AsyncMongoDBDataStoreTests(AsyncInMemoryDataStoreTests):
+    def make_store(self):
+        import motor.motor_asyncio
+        client = motor.motor_asyncio.AsyncIOMotorClient(
+                'mongodb://localhost:27017/')
+        collection = client['nurl_aio_tests']['urls']
+        self.run_async(collection.drop())
+        import pymongo
+        manage.create_indexes([(pymongo.MongoClient(
+            'mongodb://localhost:27017/')['nurl_aio_tests']['urls'],
+            mongodb.DATA_INDEXES)])
+        return datastores.AsyncMongoDBDataStore(collection)
+
+
+class AsyncTrackerTests(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tracker = trackers.AsyncInMemoryTracker()
+        self.access = Access(utctime=datetime(2017, 5, 1, 10), referrer='')
+
+    def test_add_and_get(self):
+        self.run_async(self.tracker.add('4kgjc', self.access))
+        self.run_async(self.tracker.add_many([('4kgjc', self.access)]))
+        self.assertEqual(self.run_async(self.tracker.get('4kgjc')),
+                [self.access, self.access])
+        self.assertEqual(self.run_async(self.tracker.get('4kgjd')), [])
+
+    def test_executor_tracker(self):
+        tracker = trackers.ExecutorTracker(InMemoryTracker())
+        self.run_async(tracker.add_many([('4kgjc', self.access)]))
+        self.assertEqual(self.run_async(tracker.get('4kgjc')), [self.access])
+
+
+class AsyncBufferedTrackerTests(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.backend = trackers.AsyncInMemoryTracker()
+        self.access = Access(utctime=datetime(2017, 5, 1, 10), referrer='')
+
+    def make_tracker(self, **kwargs):
+        kwargs.setdefault('flush_interval', 60)
+        return trackers.AsyncBufferedTracker(self.backend, **kwargs)
+
+    def test_accesses_are_queued(self):
+        tracker = self.make_tracker()
+        self.run_async(tracker.add('4kgjc', self.access))
+        self.assertEqual(self.backend.data, {})
+        self.assertEqual(tracker.stats()['pending'], 1)
+        self.run_async(tracker.close())
+
+    def test_background_flush_on_max_batch(self):
+        tracker = self.make_tracker(max_batch=2)
+
+        async def add_and_wait():
+            await tracker.add('4kgjc', self.access)
+            await tracker.add('4kgjd', self.access)
+            for _ in range(10):
+                await asyncio.sleep(0)
+
+        self.run_async(add_and_wait())
+        self.assertEqual(sorted(self.backend.data), ['4kgjc', '4kgjd'])
+        self.assertEqual(tracker.stats()['flushed'], 2)
+        self.run_async(tracker.close())
+
+    def test_close_writes_pending_accesses(self):
+        tracker = self.make_tracker()
+        self.run_async(tracker.add('4kgjc', self.access))
+        self.run_async(tracker.close())
+        self.assertEqual(self.backend.data, {'4kgjc': [self.access]})
+
+        self.run_async(tracker.add('4kgjd', self.access))
+        self.assertEqual(self.backend.data['4kgjd'], [self.access])
+
+    def test_drop_new_overflow_policy(self):
+        tracker = self.make_tracker(max_queued=1)
+        self.run_async(tracker.add('4kgjc', self.access))
+        self.run_async(tracker.add('4kgjd', self.access))
+        self.assertEqual(self.run_async(tracker.get('4kgjc')), [self.access])
+        self.assertEqual(self.run_async(tracker.get('4kgjd')), [])
+        self.assertEqual(tracker.stats()['dropped'], 1)
+        self.run_async(tracker.close())
+
+    def test_unknown_overflow_policy(self):
+        self.assertRaises(ValueError,
+                lambda: self.make_tracker(overflow='drop_all'))
+
+
+class AsyncHTTPPingerTests(AsyncTestCase):
+    @classmethod
+    def setUpClass(cls):
+        import threading
+        cls.server = CountingServer(('127.0.0.1', 0), OriginHandler)
+        cls.base_url = 'http://127.0.0.1:%s' % cls.server.server_address[1]
+        cls.thread = threading.Thread(target=cls.server.serve_forever,
+                daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        super().setUp()
+        self.server.requests = []
+        self.server.connections = 0
+        self.pinger = pingers.AsyncHTTPPinger()
+
+    def tearDown(self):
+        self.run_async(self.pinger.close())
+        super().tearDown()
+
+    def test_head_request(self):
+        self.assertTrue(self.run_async(
+            self.pinger.ping(self.base_url + '/ok', 2)))
+        self.assertEqual(self.server.requests, [('HEAD', '/ok')])
+
+    def test_fallback_to_ranged_get(self):
+        self.assertTrue(self.run_async(
+            self.pinger.ping(self.base_url + '/no-head', 2)))
+        self.assertEqual(self.server.requests,
+                [('HEAD', '/no-head'), ('GET', '/no-head', 'bytes=0-0')])
+
+    def test_error_status(self):
+        result = self.run_async(
+                self.pinger.check(self.base_url + '/missing', 2))
+        self.assertEqual(result, PingResult(alive=False, reachable=True))
+
+    def test_redirects_are_followed(self):
+        self.assertTrue(self.run_async(
+            self.pinger.ping(self.base_url + '/moved', 2)))
+        self.assertEqual(self.server.requests,
+                [('HEAD', '/moved'), ('HEAD', '/ok')])
+
+    def test_too_many_redirects(self):
+        self.assertFalse(self.run_async(
+            self.pinger.ping(self.base_url + '/loop', 2)))
+
+    def test_connections_are_reused(self):
+        for path in ['/ok', '/no-head', '/ok']:
+            self.assertTrue(self.run_async(
+                self.pinger.ping(self.base_url + path, 2)))
+        self.assertEqual(self.server.connections, 1)
+
+    def test_concurrent_checks(self):
+        async def check_all():
+            return await asyncio.gather(*[
+                self.pinger.ping(self.base_url + '/ok', 2)
+                for _ in range(10)])
+
+        self.assertEqual(self.run_async(check_all()), [True] * 10)
+        self.assertEqual(len(self.server.requests), 10)
+
+    def test_unreachable_host(self):
+        with CountingServer(('127.0.0.1', 0), OriginHandler) as server:
+            url = 'http://127.0.0.1:%s/' % server.server_address[1]
+        result = self.run_async(self.pinger.check(url, 2))
+        self.assertEqual(result, PingResult(alive=False, reachable=False))
+
+    def test_invalid_url(self):
+        result = self.run_async(self.pinger.check('ftp://scielo.org/', 2))
+        self.assertEqual(result, PingResult(alive=False, reachable=False))
+
+
+class PingerStub(pingers.AsyncPinger):
+    def __init__(self, results=None, default=PingResult(True, True)):
+        self.results = results or {}
+        self.default = default
+        self.calls = []
+
+    async def check(self, url, timeout):
+        self.calls.append(url)
+        await asyncio.sleep(0)
+        return self.results.get(url, self.default)
+
+
+class AsyncCachingPingerTests(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.stub = PingerStub({
+            'http://a.org/ok': PingResult(True, True),
+            'http://b.org/1': PingResult(False, False),
+            })
+        self.pinger = pingers.AsyncCachingPinger(self.stub)
+
+    def test_results_are_cached(self):
+        for _ in range(2):
+            self.assertTrue(self.run_async(
+                self.pinger.ping('http://a.org/ok', 1)))
+        self.assertEqual(self.stub.calls, ['http://a.org/ok'])
+
+    def test_unreachable_hosts_are_cached(self):
+        self.run_async(self.pinger.check('http://b.org/1', 1))
+        result = self.run_async(self.pinger.check('http://b.org/2', 1))
+        self.assertEqual(result, PingResult(False, False))
+        self.assertEqual(self.stub.calls, ['http://b.org/1'])
+
+    def test_concurrent_checks_are_coalesced(self):
+        async def check_all():
+            return await asyncio.gather(*[
+                self.pinger.ping('http://a.org/ok', 1) for _ in range(5)])
+
+        self.assertEqual(self.run_async(check_all()), [True] * 5)
+        self.assertEqual(self.stub.calls, ['http://a.org/ok'])
+        self.assertEqual(self.pinger.stats()['coalesced'], 4)
+
+
+class AsyncNurlTests(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.store = datastores.AsyncInMemoryDataStore()
+        self.tracker = trackers.AsyncInMemoryTracker()
+        self.pinger = PingerStub({'http://dead.org/': PingResult(False, True)})
+        self.nurl = shortener.AsyncNurl(self.store,
+                lambda: base28.igenerate_id(6), tracker=self.tracker,
+                whitelist=['*.scielo.br', 'dead.org'], pinger=self.pinger,
+                canonicalize=URLCanonicalizer())
+
+    def test_shorten(self):
+        short_ref = self.run_async(self.nurl.shorten('http://www.scielo.br'))
+        self.assertEqual(self.run_async(self.store.get(short_ref)),
+                'http://www.scielo.br')
+        self.assertEqual(self.run_async(
+            self.nurl.shorten('HTTP://WWW.SCIELO.BR:80')), short_ref)
+        self.assertEqual(self.pinger.calls, ['http://www.scielo.br'])
+
+    def test_shorten_invalid_urls(self):
+        for url in ['www.scielo.br', 'http://www.scielo.org',
+                    'http://dead.org/']:
+            self.assertRaises(URLError,
+                    lambda: self.run_async(self.nurl.shorten(url)))
+
+    def test_shorten_on_key_collision(self):
+        self.run_async(self.store.set('4kgjc', 'http://blog.scielo.br'))
+        ids = iter(['4kgjc', '4kgjd'])
+        self.nurl.idgen = lambda: ids
+        self.assertEqual(self.run_async(
+            self.nurl.shorten('http://www.scielo.br')), '4kgjd')
+
+    def test_shorten_without_available_ids(self):
+        self.nurl.idgen = lambda: iter([])
+        self.assertRaises(URLError, lambda: self.run_async(
+            self.nurl.shorten('http://www.scielo.br')))
+
+    def test_duplicated_url_that_cannot_be_found(self):
+        async def set(key, value):
+            raise sync_datastores.DuplicatedValueError()
+
+        self.store.set = set
+        self.assertRaises(URLError, lambda: self.run_async(
+            self.nurl.shorten('http://www.scielo.br')))
+        results = self.run_async(self.nurl.shorten_many(
+            ['http://www.scielo.br']))
+        self.assertEqual(results[0].error, 'hash_collision')
+
+    def test_shorten_on_plain_hash_collision(self):
+        async def set(key, value):
+            raise sync_datastores.PlainHashCollisionError()
+
+        self.store.set = set
+        self.assertRaises(URLError, lambda: self.run_async(
+            self.nurl.shorten('http://www.scielo.br')))
+        results = self.run_async(self.nurl.shorten_many(
+            ['http://www.scielo.br']))
+        self.assertEqual(results[0].error, 'hash_collision')
+
+    def test_shorten_many(self):
+        existing = self.run_async(self.nurl.shorten('http://www.scielo.br'))
+        results = self.run_async(self.nurl.shorten_many([
+            'http://www.scielo.br', 'http://blog.scielo.br', 'scielo',
+            'http://www.scielo.org', 'http://dead.org/']))
+
+        self.assertEqual(results[0].short_ref, existing)
+        self.assertEqual(self.run_async(self.store.get(results[1].short_ref)),
+                'http://blog.scielo.br')
+        self.assertEqual([result.error for result in results],
+                [None, None, 'invalid_url', 'hostname_not_allowed',
+                 'unreachable'])
+
+    def test_shorten_many_with_adaptive_ids(self):
+        idgen = idgenerators.AdaptiveIdGenerator(6, window=2)
+        self.nurl.idgen = idgen
+        results = self.run_async(self.nurl.shorten_many([
+            'http://www.scielo.br/%s' % i for i in range(30)]))
+        self.assertEqual({len(result.short_ref) for result in results}, {6})
+        self.assertEqual(idgen.stats()['collisions'], 0)
+        self.assertEqual(idgen.length, 6)
+
+    def test_resolve(self):
+        self.run_async(self.store.set('4kgjc', 'http://www.scielo.br'))
+        access = Access(utctime=datetime(2017, 5, 1, 10), referrer='')
+        self.assertEqual(self.run_async(self.nurl.resolve('4kgjc', access)),
+                'http://www.scielo.br')
+        self.assertEqual(self.run_async(self.tracker.get('4kgjc')), [access])
+        self.assertRaises(NotExists,
+                lambda: self.run_async(self.nurl.resolve('4kgjd')))
+
+    def test_resolve_many(self):
+        self.run_async(self.store.set('4kgjc', 'http://www.scielo.br'))
+        self.assertEqual(self.run_async(
+            self.nurl.resolve_many(['4kgjc', '4kgjd'])),
+            {'4kgjc': 'http://www.scielo.br'})
+        self.assertEqual(self.tracker.data, {})
+
+
+class ApplicationTests(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.store = datastores.AsyncInMemoryDataStore(
+                {'4kgjc': 'http://www.scielo.br/?q=a b'})
+        self.tracker = trackers.AsyncInMemoryTracker()
+        nurl = shortener.AsyncNurl(self.store,
+                lambda: base28.igenerate_id(6), tracker=self.tracker,
+                pinger=PingerStub())
+        settings = pyramid_nurl.parse_settings({'nurl.batch.max_size': 3})
+        self.app = aioapp.Application(settings, nurl=nurl)
+
+    def request(self, method, path, query_string=b'', body=b'',
+            headers=()):
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': body,
+                    'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'method': method, 'path': path,
+                 'query_string': query_string, 'scheme': 'http',
+                 'headers': [(b'host', b'ref.scielo.org')] + list(headers)}
+        self.run_async(self.app(scope, receive, send))
+        start, body = messages
+        return (start['status'], dict(start['headers']), body['body'])
+
+    def test_redirect(self):
+        status, headers, body = self.request('GET', '/4kgjc',
+                headers=[(b'referer', b'http://scielo.org')])
+        self.assertEqual(status, 301)
+        self.assertEqual(headers[b'location'], b'http://www.scielo.br/?q=a%20b')
+        self.assertEqual(headers[b'cache-control'], b'public, max-age=86400')
+        self.assertEqual(body, b'')
+        access = self.run_async(self.tracker.get('4kgjc'))[0]
+        self.assertEqual(access.referrer, 'http://scielo.org')
+
+    def test_unknown_short_ref(self):
+        status, _, _ = self.request('GET', '/4kgjd')
+        self.assertEqual(status, 404)
+
+    def test_unknown_route(self):
+        status, _, _ = self.request('GET', '/api/v2/shorten')
+        self.assertEqual(status, 404)
+
+    def test_metrics(self):
+        self.request('GET', '/4kgjc')
+        self.request('GET', '/api/v2/shorten')
+        status, headers, body = self.request('GET', '/api/v1/metrics')
+        self.assertEqual(status, 200)
+        self.assertTrue(headers[b'content-type'].startswith(b'text/plain'))
+        body = body.decode('utf-8')
+        self.assertIn('nurl_http_responses_total{route="shortened",'
+                'status="301"} 1', body)
+        self.assertIn('nurl_http_responses_total{route="notfound",'
+                'status="404"} 1', body)
+
+    def test_shorten(self):
+        status, headers, body = self.request('GET', '/api/v1/shorten',
+                b'url=http%3A%2F%2Fwww.scielo.org')
+        self.assertEqual(status, 200)
+        short_url = json.loads(body.decode('utf-8'))
+        self.assertTrue(short_url.startswith('http://ref.scielo.org/'))
+
+    def test_shorten_jsonp(self):
+        status, headers, body = self.request('GET', '/api/v1/shorten',
+                b'url=http%3A%2F%2Fwww.scielo.br%2F%3Fq%3Da+b&callback=done')
+        self.assertEqual(status, 200)
+        self.assertTrue(headers[b'content-type'].startswith(
+            b'application/javascript'))
+        self.assertEqual(body, b'/**/done("http://ref.scielo.org/4kgjc");')
+
+    def test_shorten_invalid_url(self):
+        status, _, _ = self.request('GET', '/api/v1/shorten', b'url=scielo')
+        self.assertEqual(status, 400)
+
+    def test_batch_shortener(self):
+        status, _, body = self.request('POST', '/api/v1/shorten/batch',
+                body=b'{"urls": ["http://www.scielo.org", "scielo"]}')
+        self.assertEqual(status, 200)
+        results = json.loads(body.decode('utf-8'))['results']
+        self.assertTrue(results[0]['short_url'].startswith(
+            'http://ref.scielo.org/'))
+        self.assertEqual(results[1], {'url': 'scielo', 'error': 'invalid_url'})
+
+    def test_batch_shortener_limits(self):
+        for body in [b'{"urls": "http://www.scielo.org"}', b'[',
+                     b'{"urls": ["a", "b", "c", "d"]}']:
+            status, _, _ = self.request('POST', '/api/v1/shorten/batch',
+                    body=body)
+            self.assertEqual(status, 400)
+
+        status, _, _ = self.request('GET', '/api/v1/shorten/batch')
+        self.assertEqual(status, 404)
+
+    def test_batch_resolver(self):
+        status, _, body = self.request('GET', '/api/v1/resolve',
+                b'ref=4kgjc&ref=4kgjd')
+        self.assertEqual(json.loads(body.decode('utf-8')),
+                {'urls': {'4kgjc': 'http://www.scielo.br/?q=a b'},
+                 'missing': ['4kgjd']})
+        self.assertEqual(self.tracker.data, {})
+
+        status, _, body = self.request('POST', '/api/v1/resolve',
+                body=b'{"refs": ["4kgjc"], "track": true}')
+        self.assertEqual(status, 200)
+        self.assertEqual(len(self.tracker.data['4kgjc']), 1)
+
+    def test_stats(self):
+        status, _, body = self.request('GET', '/api/v1/stats')
+        self.assertEqual(status, 200)
+        self.assertIn('collisions', json.loads(body.decode('utf-8'))[
+            'shortener'])
+
+    def test_home(self):
+        status, headers, body = self.request('GET', '/',
+                b'url=http%3A%2F%2Fwww.scielo.org')
+        self.assertEqual(status, 200)
+        self.assertIn(b'http://ref.scielo.org/', body)
+        self.assertIn(b'/static/scielo-140x148.png', body)
+
+    def test_static_files(self):
+        status, headers, body = self.request('GET', '/static/styles.css')
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b'cache-control'], b'max-age=3600')
+
+        status, _, _ = self.request('GET', '/static/../__init__.py')
+        self.assertEqual(status, 404)
+
+    def test_precompressed_static_files(self):
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch.object(aioapp, 'STATIC_DIR', tmpdir):
+            with open(os.path.join(tmpdir, 'bundle.min.css'), 'wb') as f:
+                f.write(b'body {}')
+            with open(os.path.join(tmpdir, 'bundle.min.css.gz'), 'wb') as f:
+                f.write(gzip.compress(b'body {}'))
+
+            status, headers, body = self.request('GET',
+                    '/static/bundle.min.css',
+                    headers=[(b'accept-encoding', b'br;q=1.0, gzip')])
+            self.assertEqual(headers[b'content-encoding'], b'gzip')
+            self.assertEqual(headers[b'vary'], b'Accept-Encoding')
+            self.assertEqual(headers[b'content-type'], b'text/css')
+            self.assertEqual(gzip.decompress(body), b'body {}')
+
+            status, headers, body = self.request('GET',
+                    '/static/bundle.min.css')
+            self.assertNotIn(b'content-encoding', headers)
+            self.assertEqual(body, b'body {}')
+
+    def test_head_request_omits_the_body(self):
+        status, headers, body = self.request('HEAD', '/static/styles.css')
+        self.assertEqual(status, 200)
+        self.assertNotEqual(headers[b'content-length'], b'0')
+        self.assertEqual(body, b'')
+
+
+class TemporaryRedirectApplicationTests(AsyncTestCase):
+    def test_redirect(self):
+        store = datastores.AsyncInMemoryDataStore(
+                {'4kgjc': 'http://www.scielo.br/'})
+        nurl = shortener.AsyncNurl(store, lambda: base28.igenerate_id(6),
+                pinger=PingerStub())
+        settings = pyramid_nurl.parse_settings({'nurl.redirect.status': 302})
+        app = aioapp.Application(settings, nurl=nurl)
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        self.run_async(app({'type': 'http', 'method': 'GET', 'path': '/4kgjc',
+                            'query_string': b'', 'headers': []},
+                           receive, send))
+        self.assertEqual(messages[0]['status'], 302)
+        self.assertIn((b'cache-control', b'no-cache'), messages[0]['headers'])
@@ -0,0 +1,98 @@
+import unittest
+from unittest import mock
+import itertools
+
+from nurl import base28
+
+
+class Base28Tests(unittest.TestCase):
+    def test_encode(self):
+        self.assertEqual(base28.encode(0, base28.BASE28), '2')
+        self.assertEqual(base28.encode(28, base28.BASE28), '32')
+        self.assertEqual(base28.encode(28 ** 2 - 1, base28.BASE28), 'zz')
+
+    def test_decode(self):
+        self.assertEqual(base28.decode('2'), 0)
+        self.assertEqual(base28.decode('32'), 28)
+        self.assertEqual(base28.decode('zz'), 28 ** 2 - 1)
+
+    def test_decode_is_the_inverse_of_encode(self):
+        for value in [0, 1, 27, 28, 12345, 28 ** 6 - 1]:
+            self.assertEqual(
+                    base28.decode(base28.encode(value, base28.BASE28)), value)
+
+    def test_decode_invalid_digits(self):
+        self.assertRaises(ValueError, lambda: base28.decode('foo'))
+
+    def test_generate_id(self):
+        shortid = base28.generate_id(6)
+        self.assertTrue(base28.is_valid_ref(shortid, 6))
+
+    def test_igenerate_id(self):
+        ids = list(itertools.islice(base28.igenerate_id(6), 100))
+        self.assertEqual(len(ids), 100)
+        self.assertTrue(all(base28.is_valid_ref(i, 6) for i in ids))
+
+    def test_is_valid_ref(self):
+        self.assertTrue(base28.is_valid_ref('4kgjc'))
+        self.assertTrue(base28.is_valid_ref('4kgjc', 5))
+        self.assertFalse(base28.is_valid_ref('4kgjc', 6))
+        self.assertFalse(base28.is_valid_ref('favicon.ico'))
+        self.assertFalse(base28.is_valid_ref('4kgj0'))
+        self.assertFalse(base28.is_valid_ref(''))
+
+    def test_pack_ref(self):
+        self.assertNotEqual(base28.pack_ref('2'), base28.pack_ref('22'))
+        for ref in ['2', '22', '4kgjc', 'zzzzzzzzzzzz']:
+            self.assertEqual(base28.unpack_ref(base28.pack_ref(ref)), ref)
+            self.assertLess(base28.pack_ref(ref), 2 ** 64)
+
+    def test_pack_invalid_ref(self):
+        self.assertRaises(ValueError, lambda: base28.pack_ref('foo'))
+        self.assertRaises(ValueError, lambda: base28.pack_ref(''))
+        self.assertRaises(ValueError, lambda: base28.pack_ref('z' * 13))
+
+
+class BatchTestsMixin:
+    def test_generate_ids(self):
+        ids = base28.generate_ids(1000, 6)
+        self.assertEqual(len(ids), 1000)
+        self.assertTrue(all(base28.is_valid_ref(i, 6) for i in ids))
+        self.assertGreater(len(set(ids)), 990)
+
+    def test_generate_no_ids(self):
+        self.assertEqual(base28.generate_ids(0, 6), [])
+
+    def test_encode_many(self):
+        self.assertEqual(base28.encode_many([0, 28, 28 ** 3 - 1], 3),
+                ['222', '232', 'zzz'])
+
+    def test_encode_many_out_of_range(self):
+        self.assertRaises(ValueError, lambda: base28.encode_many([28 ** 3], 3))
+
+    def test_decode_many(self):
+        self.assertEqual(base28.decode_many(['222', '232', 'zzz']),
+                [0, 28, 28 ** 3 - 1])
+
+    def test_decode_many_with_mixed_lengths(self):
+        self.assertEqual(base28.decode_many(['2', '32']), [0, 28])
+
+    def test_decode_many_invalid_digits(self):
+        self.assertRaises(ValueError, lambda: base28.decode_many(['foo']))
+        self.assertRaises(ValueError, lambda: base28.decode_many(['fçç']))
+
+    def test_roundtrip(self):
+        ids = base28.generate_ids(100, 6)
+        self.assertEqual(base28.encode_many(base28.decode_many(ids), 6), ids)
+
+
+@unittest.skipIf(base28.numpy is None, 'requires numpy')
+class NumpyBatchTests(BatchTestsMixin, unittest.TestCase):
+    pass
+
+
+class PurePythonBatchTests(BatchTestsMixin, unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(base28, 'numpy', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
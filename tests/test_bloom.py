@@ -0,0 +1,48 @@
+import os
+import unittest
+import tempfile
+
+from nurl import bloom
+
+
+class BloomFilterTests(unittest.TestCase):
+    def setUp(self):
+        self.bloom = bloom.BloomFilter(1000, error_rate=0.01)
+
+    def test_added_keys_are_members(self):
+        self.bloom.add('4kgjc')
+        self.assertIn('4kgjc', self.bloom)
+
+    def test_unknown_keys_are_not_members(self):
+        self.bloom.add('4kgjc')
+        self.assertNotIn('5fv7w', self.bloom)
+
+    def test_len_counts_added_keys(self):
+        self.bloom.update(['4kgjc', '5fv7w', '4kgjc'])
+        self.assertEqual(len(self.bloom), 2)
+
+    def test_false_positive_rate(self):
+        self.bloom.update('in-%s' % i for i in range(1000))
+        false_positives = sum('out-%s' % i in self.bloom for i in range(10000))
+        self.assertLess(false_positives / 10000, 0.03)
+
+    def test_save_and_load(self):
+        self.bloom.add('4kgjc')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'bloom.bin')
+            self.bloom.save(path)
+            loaded = bloom.BloomFilter.load(path)
+
+        self.assertIn('4kgjc', loaded)
+        self.assertNotIn('5fv7w', loaded)
+        self.assertEqual(len(loaded), 1)
+        self.assertEqual(loaded.capacity, 1000)
+
+    def test_load_invalid_file(self):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b'x' * 64)
+            f.flush()
+            self.assertRaises(ValueError, lambda: bloom.BloomFilter.load(f.name))
+
+    def test_invalid_capacity(self):
+        self.assertRaises(ValueError, lambda: bloom.BloomFilter(0))
@@ -1,8 +1,15 @@
 import os
 import unittest
 import operator
+import tempfile
+import threading
+import time
+from unittest import mock
+from datetime import datetime, timedelta
 
-from nurl import datastores
+import pymongo
+
+from nurl import datastores, bloom, manage, mongodb
 
 
 IS_RUNNING_ON_TRAVISCI = os.environ.get('TRAVIS', False)
@@ -39,6 +46,350 @@ class InMemoryTests(unittest.TestCase):
         self.store['foo'] = 'bar'
         self.assertRaises(KeyError, lambda: self.store.key('baz'))
 
+    def test_set_many(self):
+        failures = self.store.set_many({'foo': 'bar', 'baz': 'qux'})
+        self.assertEqual(failures, {})
+        self.assertEqual(self.store['baz'], 'qux')
+
+    def test_set_many_reports_duplicates(self):
+        self.store['foo'] = 'bar'
+        failures = self.store.set_many({'foo': 'baz', 'qux': 'bar',
+                                        'quux': 'corge'})
+        self.assertIsInstance(failures['foo'], datastores.DuplicatedKeyError)
+        self.assertIsInstance(failures['qux'], datastores.DuplicatedValueError)
+        self.assertNotIn('quux', failures)
+        self.assertEqual(self.store['quux'], 'corge')
+
+    def test_key_many(self):
+        self.store['foo'] = 'bar'
+        self.store['baz'] = 'qux'
+        self.assertEqual(self.store.key_many(['bar', 'qux', 'missing']),
+                {'bar': 'foo', 'qux': 'baz'})
+
+    def test_get_many(self):
+        self.store['foo'] = 'bar'
+        self.store['baz'] = 'qux'
+        self.assertEqual(self.store.get_many(['foo', 'baz', 'missing']),
+                {'foo': 'bar', 'baz': 'qux'})
+
+
+class CachingDataStoreTests(InMemoryTests):
+    def setUp(self):
+        self.backend = datastores.InMemoryDataStore()
+        self.store = datastores.CachingDataStore(self.backend, maxsize=2)
+
+    def test_get_is_served_from_cache(self):
+        self.store['foo'] = 'bar'
+        self.backend.data.clear()
+        self.assertEqual(self.store['foo'], 'bar')
+
+    def test_key_is_served_from_cache(self):
+        self.store['foo'] = 'bar'
+        self.backend.revdata.clear()
+        self.assertEqual(self.store.key('bar'), 'foo')
+
+    def test_misses_are_forwarded_to_the_backend(self):
+        self.backend['foo'] = 'bar'
+        self.assertEqual(self.store['foo'], 'bar')
+        self.assertEqual(self.store['foo'], 'bar')
+        stats = self.store.stats()['values']
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+
+    def test_get_many_is_served_from_cache(self):
+        self.store['foo'] = 'bar'
+        self.backend['baz'] = 'qux'
+        self.backend.data.pop('foo')
+        self.assertEqual(self.store.get_many(['foo', 'baz']),
+                {'foo': 'bar', 'baz': 'qux'})
+
+    def test_misses_are_not_cached(self):
+        self.assertRaises(KeyError, lambda: self.store['foo'])
+        self.backend['foo'] = 'bar'
+        self.assertEqual(self.store['foo'], 'bar')
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.store['k1'] = 'v1'
+        self.store['k2'] = 'v2'
+        self.store['k1']
+        self.store['k3'] = 'v3'
+        self.assertEqual(self.store.stats()['values']['evictions'], 1)
+        self.assertIn('k1', self.store.value_cache.data)
+        self.assertNotIn('k2', self.store.value_cache.data)
+
+    def test_entries_expire(self):
+        now = [0]
+        store = datastores.CachingDataStore(self.backend, ttl=10)
+        store.value_cache.clock = lambda: now[0]
+        store['foo'] = 'bar'
+        self.backend.data.clear()
+        self.assertEqual(store['foo'], 'bar')
+        now[0] = 11
+        self.assertRaises(KeyError, lambda: store['foo'])
+
+
+class StripedInMemoryTests(InMemoryTests):
+    def setUp(self):
+        self.store = datastores.StripedInMemoryDataStore(stripes=4)
+
+    def test_keys(self):
+        self.store['foo'] = 'bar'
+        self.store['baz'] = 'qux'
+        self.assertEqual(sorted(self.store.keys()), ['baz', 'foo'])
+
+    def test_values_are_unique_across_stripes(self):
+        keys = ['k%s' % i for i in range(64)]
+        winners = []
+        barrier = threading.Barrier(len(keys))
+
+        def store(key):
+            barrier.wait()
+            try:
+                self.store[key] = 'http://www.scielo.br/'
+            except datastores.DuplicatedValueError:
+                pass
+            else:
+                winners.append(key)
+
+        threads = [threading.Thread(target=store, args=(key,))
+                   for key in keys]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(winners), 1)
+        self.assertEqual(len(self.store), 1)
+        self.assertEqual(self.store.key('http://www.scielo.br/'), winners[0])
+
+    def test_stats(self):
+        self.store['foo'] = 'bar'
+        self.assertEqual(self.store.stats(),
+                {'stripes': 4, 'size': 1, 'contended': 0})
+
+
+class CompactInMemoryTests(InMemoryTests):
+    def setUp(self):
+        self.store = datastores.CompactInMemoryDataStore(merge_threshold=2)
+
+    def test_short_refs_are_packed(self):
+        self.store['4dp3'] = 'http://www.scielo.br/'
+        self.assertEqual(self.store.odd_keys, {})
+        self.assertEqual(self.store['4dp3'], 'http://www.scielo.br/')
+        self.assertEqual(self.store.key('http://www.scielo.br/'), '4dp3')
+
+    def test_refs_of_different_lengths(self):
+        self.store['2'] = 'http://a.org/'
+        self.store['22'] = 'http://b.org/'
+        self.assertEqual(self.store['2'], 'http://a.org/')
+        self.assertEqual(self.store['22'], 'http://b.org/')
+
+    def test_pending_entries_are_merged(self):
+        pairs = {'4dp%s' % d: 'http://a.org/%s' % d for d in 'bcdfghjk'}
+        for k, v in pairs.items():
+            self.store[k] = v
+        self.assertLess(len(self.store.pending_keys), 2)
+        self.assertGreater(len(self.store.index.keys), 0)
+        for k, v in pairs.items():
+            self.assertEqual(self.store[k], v)
+            self.assertEqual(self.store.key(v), k)
+        self.assertRaises(datastores.DuplicatedKeyError,
+                lambda: operator.setitem(self.store, '4dpb', 'http://b.org/'))
+        self.assertRaises(datastores.DuplicatedValueError,
+                lambda: operator.setitem(self.store, '4dpz', 'http://a.org/b'))
+
+    def test_keys(self):
+        self.store['foo'] = 'bar'
+        self.store['4dp3'] = 'baz'
+        self.assertEqual(sorted(self.store.keys()), ['4dp3', 'foo'])
+
+    def test_initial_data(self):
+        store = datastores.CompactInMemoryDataStore({'4dp3': 'bar'})
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store['4dp3'], 'bar')
+
+
+class PlainHashTests(unittest.TestCase):
+    def test_fits_in_a_signed_64_bit_integer(self):
+        for url in ('http://www.scielo.br/', 'http://a.org/ção', ''):
+            self.assertTrue(-2 ** 63 <= datastores.plain_hash(url) < 2 ** 63)
+
+    def test_is_stable(self):
+        self.assertEqual(datastores.plain_hash('http://www.scielo.br/'),
+                datastores.plain_hash('http://www.scielo.br/'))
+        self.assertNotEqual(datastores.plain_hash('http://www.scielo.br/'),
+                datastores.plain_hash('http://www.scielo.br'))
+
+
+class MongoDBBulkFailuresTests(unittest.TestCase):
+    def bulk_error(self, *errors):
+        return pymongo.errors.BulkWriteError({'writeErrors': list(errors)})
+
+    def test_classifies_duplicated_keys_and_values(self):
+        exc = self.bulk_error(
+                {'index': 0, 'code': 11000, 'errmsg': 'dup key: short_ref_1'},
+                {'index': 2, 'code': 11000, 'errmsg': 'dup key: plain_hash_1'})
+        failures, duplicated = datastores.mongodb_bulk_failures(exc,
+                ['k1', 'k2', 'k3'])
+        self.assertEqual(list(failures), ['k1'])
+        self.assertIsInstance(failures['k1'], datastores.DuplicatedKeyError)
+        self.assertEqual(duplicated, ['k3'])
+
+    def test_reraises_other_errors(self):
+        exc = self.bulk_error({'index': 0, 'code': 121, 'errmsg': 'invalid'})
+        self.assertRaises(type(exc),
+                datastores.mongodb_bulk_failures, exc, ['k1'])
+
+
+class SQLiteTests(InMemoryTests):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'nurl.sqlite3')
+        self.store = datastores.SQLiteDataStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def test_keys(self):
+        self.store['foo'] = 'bar'
+        self.store['baz'] = 'qux'
+        self.assertEqual(sorted(self.store.keys()), ['baz', 'foo'])
+
+    def test_keys_since(self):
+        self.store['foo'] = 'bar'
+        future = datetime.utcnow() + timedelta(minutes=1)
+        past = datetime.utcnow() - timedelta(minutes=1)
+        self.assertEqual(list(self.store.keys(since=future)), [])
+        self.assertEqual(list(self.store.keys(since=past)), ['foo'])
+
+    def test_data_is_persisted(self):
+        self.store['foo'] = 'bar'
+        store = datastores.SQLiteDataStore(self.path)
+        self.assertEqual(store['foo'], 'bar')
+        store.close()
+
+    def test_connections_are_per_thread(self):
+        connections = []
+        thread = threading.Thread(
+                target=lambda: connections.append(self.store.pool.connection))
+        thread.start()
+        thread.join()
+        self.assertIsNot(connections[0], self.store.pool.connection)
+
+    def test_wal_mode(self):
+        mode = self.store.pool.connection.execute(
+                'PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual(mode, 'wal')
+
+    def test_plain_hash_collision(self):
+        self.store['foo'] = 'bar'
+        with mock.patch.object(datastores, 'plain_hash', return_value=1):
+            self.store['baz'] = 'qux'
+            self.assertRaises(datastores.PlainHashCollisionError,
+                    lambda: operator.setitem(self.store, 'quux', 'corge'))
+            # a mesma URL não caracteriza uma colisão do resumo.
+            with self.assertRaises(datastores.DuplicatedValueError) as cm:
+                self.store['quux'] = 'qux'
+            self.assertNotIsInstance(cm.exception,
+                    datastores.PlainHashCollisionError)
+            failures = self.store.set_many({'quux': 'corge'})
+        self.assertIsInstance(failures['quux'],
+                datastores.PlainHashCollisionError)
+
+
+class BloomFilteredDataStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.backend = datastores.InMemoryDataStore({'4kgjc': 'bar'})
+        self.bloom = bloom.BloomFilter(100)
+        self.store = datastores.BloomFilteredDataStore(self.backend,
+                self.bloom, ref_lengths=[5])
+        self.store.refresh()
+
+    def test_existing_keys_are_resolved(self):
+        self.assertEqual(self.store['4kgjc'], 'bar')
+
+    def test_new_keys_are_added_to_the_filter(self):
+        self.store['5fv7w'] = 'baz'
+        self.assertIn('5fv7w', self.bloom)
+        self.assertEqual(self.store['5fv7w'], 'baz')
+
+    def test_unknown_keys_do_not_reach_the_backend(self):
+        with mock.patch.object(datastores.InMemoryDataStore, '__getitem__',
+                side_effect=AssertionError('the backend was queried')):
+            self.assertRaises(KeyError, lambda: self.store['5fv7w'])
+        self.assertEqual(self.store.stats()['filtered'], 1)
+
+    def test_keys_of_invalid_length_are_rejected(self):
+        self.assertRaises(KeyError, lambda: self.store['4kgjcx'])
+        self.assertEqual(self.store.stats()['rejected'], 1)
+
+    def test_keys_outside_the_alphabet_are_rejected(self):
+        self.assertRaises(KeyError, lambda: self.store['favic'])
+        self.assertEqual(self.store.stats()['rejected'], 1)
+
+    def test_filter_is_refreshed_on_misses(self):
+        self.backend.data['5fv7w'] = 'baz'  # armazenada por outro processo
+        self.assertEqual(self.store['5fv7w'], 'baz')
+
+    def test_keys_stored_right_after_a_refresh_are_found(self):
+        self.store['6gx8z'] = 'qux'  # uma atualização recente
+        self.assertEqual(self.store['6gx8z'], 'qux')
+        self.backend.data['5fv7w'] = 'baz'  # armazenada por outro processo
+        self.assertEqual(self.store['5fv7w'], 'baz')
+
+    def test_hits_do_not_refresh_the_filter(self):
+        refreshes = self.store.stats()['refreshes']
+        self.store['4kgjc']
+        self.assertEqual(self.store.stats()['refreshes'], refreshes)
+
+    def test_concurrent_misses_share_a_refresh(self):
+        refreshes = self.store.stats()['refreshes']
+        threads = [threading.Thread(target=lambda: self.assertRaises(
+                       KeyError, lambda: self.store['5fv7w']))
+                   for _ in range(4)]
+        with self.store.refresh_lock:
+            for thread in threads:
+                thread.start()
+            threading.Event().wait(0.05)
+            # simula uma atualização iniciada após as consultas.
+            self.store.refresh_started = time.monotonic()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.store.stats()['refreshes'], refreshes)
+        self.assertEqual(self.store.stats()['filtered'], 4)
+
+    def test_filter_is_populated_lazily(self):
+        keys = mock.MagicMock(side_effect=self.backend.keys)
+        self.backend.keys = keys
+        store = datastores.BloomFilteredDataStore(self.backend,
+                bloom.BloomFilter(100), ref_lengths=[5])
+        keys.assert_not_called()
+        self.assertEqual(store['4kgjc'], 'bar')
+        keys.assert_called_once_with(since=None)
+
+    def test_duplicated_keys_are_added_to_the_filter(self):
+        self.backend.data['5fv7w'] = 'baz'
+        self.assertRaises(datastores.DuplicatedKeyError,
+                lambda: operator.setitem(self.store, '5fv7w', 'qux'))
+        self.assertIn('5fv7w', self.bloom)
+
+    def test_get_key_for_value(self):
+        self.assertEqual(self.store.key('bar'), '4kgjc')
+
+    def test_get_many_filters_unknown_keys(self):
+        self.backend.data['5fv7w'] = 'baz'  # armazenada por outro processo
+        self.assertEqual(self.store.get_many(['4kgjc', '5fv7w', '6gx8z',
+                                              'favic']),
+                {'4kgjc': 'bar', '5fv7w': 'baz'})
+        self.assertEqual(self.store.stats()['filtered'], 1)
+
+    def test_set_many_adds_keys_to_the_filter(self):
+        failures = self.store.set_many({'5fv7w': 'baz', '6gx8z': 'bar'})
+        self.assertIn('5fv7w', self.bloom)
+        self.assertNotIn('6gx8z', self.bloom)
+        self.assertEqual(list(failures), ['6gx8z'])
+
 
 @unittest.skipUnless(IS_RUNNING_ON_TRAVISCI, 'requires travis-ci')
 class MongoDBTests(unittest.TestCase):
@@ -48,6 +399,7 @@ class MongoDBTests(unittest.TestCase):
         import pymongo
         self.client = pymongo.MongoClient('127.0.0.1', 27017)
         self.collection = self.client['nurl_tests']['urls']
+        manage.create_indexes([(self.collection, mongodb.DATA_INDEXES)])
         self.store = datastores.MongoDBDataStore(self.collection)
 
     def tearDown(self):
@@ -80,3 +432,58 @@ class MongoDBTests(unittest.TestCase):
         self.store['foo'] = 'bar'
         self.assertRaises(KeyError, lambda: self.store.key('baz'))
 
+    def test_set_many(self):
+        failures = self.store.set_many({'foo': 'bar', 'baz': 'qux'})
+        self.assertEqual(failures, {})
+        self.assertEqual(self.store['baz'], 'qux')
+
+    def test_set_many_reports_duplicates(self):
+        self.store['foo'] = 'bar'
+        failures = self.store.set_many({'foo': 'baz', 'qux': 'bar',
+                                        'quux': 'corge'})
+        self.assertIsInstance(failures['foo'], datastores.DuplicatedKeyError)
+        self.assertIsInstance(failures['qux'], datastores.DuplicatedValueError)
+        self.assertNotIn('quux', failures)
+        self.assertEqual(self.store['quux'], 'corge')
+
+    def test_key_many(self):
+        self.store['foo'] = 'bar'
+        self.store['baz'] = 'qux'
+        self.assertEqual(self.store.key_many(['bar', 'qux', 'missing']),
+                {'bar': 'foo', 'qux': 'baz'})
+
+    def test_get_many(self):
+        self.store['foo'] = 'bar'
+        self.store['baz'] = 'qux'
+        self.assertEqual(self.store.get_many(['foo', 'baz', 'missing']),
+                {'foo': 'bar', 'baz': 'qux'})
+
+    def test_keys(self):
+        self.store['foo'] = 'bar'
+        self.assertEqual(list(self.store.keys()), ['foo'])
+
+    def test_plain_hash_collision(self):
+        with mock.patch.object(datastores, 'plain_hash', return_value=1):
+            self.store['foo'] = 'bar'
+            self.assertRaises(datastores.PlainHashCollisionError,
+                    lambda: operator.setitem(self.store, 'baz', 'qux'))
+            failures = self.store.set_many({'baz': 'qux', 'quux': 'bar'})
+        self.assertIsInstance(failures['baz'],
+                datastores.PlainHashCollisionError)
+        self.assertNotIsInstance(failures['quux'],
+                datastores.PlainHashCollisionError)
+
+    def test_url_digest_is_stored(self):
+        self.store['foo'] = 'bar'
+        record = self.collection.find_one({'short_ref': 'foo'})
+        self.assertEqual(record['plain_hash'], datastores.plain_hash('bar'))
+
+    def test_backfill_plain_hash(self):
+        from nurl import manage
+        self.collection.insert_many([{'short_ref': 'k%s' % i, 'plain': 'v%s' % i}
+                                     for i in range(5)])
+        self.assertEqual(manage.backfill_plain_hash(self.collection,
+                                                    batch_size=2), 5)
+        self.assertEqual(self.store.key('v3'), 'k3')
+        self.assertRaises(datastores.DuplicatedValueError,
+                lambda: operator.setitem(self.store, 'baz', 'v3'))
@@ -0,0 +1,227 @@
+import os
+import unittest
+import itertools
+import tempfile
+from unittest import mock
+
+from nurl import idgenerators, datastores, base28
+from nurl.shortener import Nurl, URLChecker, URLError
+
+
+IS_RUNNING_ON_TRAVISCI = os.environ.get('TRAVIS', False)
+
+
+class FeistelPermutationTests(unittest.TestCase):
+    def test_is_a_bijection(self):
+        permutation = idgenerators.FeistelPermutation(28 ** 3, b'secret')
+        values = [permutation(v) for v in range(28 ** 3)]
+        self.assertEqual(sorted(values), list(range(28 ** 3)))
+
+    def test_depends_on_the_key(self):
+        p1 = idgenerators.FeistelPermutation(28 ** 3, b'secret')
+        p2 = idgenerators.FeistelPermutation(28 ** 3, b'other secret')
+        self.assertNotEqual([p1(v) for v in range(10)],
+                            [p2(v) for v in range(10)])
+
+    def test_is_not_sequential(self):
+        permutation = idgenerators.FeistelPermutation(28 ** 6, b'secret')
+        values = [permutation(v) for v in range(10)]
+        self.assertNotEqual(values, sorted(values))
+
+    def test_values_out_of_the_domain(self):
+        permutation = idgenerators.FeistelPermutation(100, b'secret')
+        self.assertRaises(ValueError, lambda: permutation(100))
+
+
+class InMemorySequenceTests(unittest.TestCase):
+    def test_lease_consecutive_blocks(self):
+        sequence = idgenerators.InMemorySequence()
+        self.assertEqual(sequence.lease('foo', 10), 0)
+        self.assertEqual(sequence.lease('foo', 10), 10)
+        self.assertEqual(sequence.lease('bar', 10), 0)
+
+
+class SQLiteSequenceTests(unittest.TestCase):
+    def test_lease_consecutive_blocks(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            sequence = idgenerators.SQLiteSequence(
+                    os.path.join(tmpdir, 'nurl.sqlite3'))
+            self.assertEqual(sequence.lease('foo', 10), 0)
+            self.assertEqual(sequence.lease('foo', 10), 10)
+            self.assertEqual(sequence.lease('bar', 10), 0)
+            sequence.pool.close()
+
+
+class LeasedIdGeneratorTests(unittest.TestCase):
+    def setUp(self):
+        self.sequence = idgenerators.InMemorySequence()
+        self.idgen = idgenerators.LeasedIdGenerator(self.sequence, 6,
+                b'secret', block_size=10)
+
+    def test_ids_have_the_given_length(self):
+        for shortid in itertools.islice(self.idgen(), 100):
+            self.assertEqual(len(shortid), 6)
+            self.assertTrue(set(shortid).issubset(base28.BASE28))
+
+    def test_ids_are_unique_across_calls(self):
+        ids = [next(self.idgen()) for _ in range(1000)]
+        self.assertEqual(len(set(ids)), 1000)
+
+    def test_blocks_are_leased_on_demand(self):
+        list(itertools.islice(self.idgen(), 15))
+        self.assertEqual(self.sequence.data, {'short_ref_6': 20})
+
+    def test_keyspace_exhaustion(self):
+        idgen = idgenerators.LeasedIdGenerator(self.sequence, 1, b'secret')
+        self.assertEqual(sorted(idgen()), sorted(base28.BASE28))
+
+    def test_shorten_on_keyspace_exhaustion(self):
+        idgen = idgenerators.LeasedIdGenerator(self.sequence, 1, b'secret',
+                block_size=len(base28.BASE28))
+        nurl = Nurl(datastores.InMemoryDataStore(), idgen)
+        with mock.patch.object(URLChecker, 'ping', return_value=True):
+            for i in range(len(base28.BASE28)):
+                nurl.shorten('http://www.scielo.br/%s' % i)
+            self.assertRaises(URLError,
+                    lambda: nurl.shorten('http://www.scielo.org'))
+            results = nurl.shorten_many(['http://www.scielo.org'])
+        self.assertEqual(results[0].error, 'no_available_id')
+
+    def test_key_is_required(self):
+        self.assertRaises(ValueError,
+                lambda: idgenerators.LeasedIdGenerator(self.sequence, 6, b''))
+
+    def test_shorten_succeeds_on_the_first_insert(self):
+        nurl = Nurl(datastores.InMemoryDataStore(), self.idgen)
+        with mock.patch.object(URLChecker, 'ping', return_value=True):
+            ids = [nurl.shorten('http://www.scielo.br/%s' % i)
+                   for i in range(50)]
+        self.assertEqual(len(set(ids)), 50)
+        self.assertEqual(self.idgen.next_value, 50)
+
+
+@unittest.skipUnless(IS_RUNNING_ON_TRAVISCI, 'requires travis-ci')
+class MongoDBSequenceTests(unittest.TestCase):
+    """Testes de integração executados apenas no Travis-CI.
+    """
+    def setUp(self):
+        import pymongo
+        self.client = pymongo.MongoClient('127.0.0.1', 27017)
+        self.collection = self.client['nurl_tests']['sequences']
+        self.sequence = idgenerators.MongoDBSequence(self.collection)
+
+    def tearDown(self):
+        self.client.drop_database('nurl_tests')
+
+    def test_lease_consecutive_blocks(self):
+        self.assertEqual(self.sequence.lease('foo', 10), 0)
+        self.assertEqual(self.sequence.lease('foo', 10), 10)
+        self.assertEqual(self.sequence.lease('bar', 10), 0)
+
+
+class AdaptiveIdGeneratorTests(unittest.TestCase):
+    def setUp(self):
+        self.idgen = idgenerators.AdaptiveIdGenerator(4, max_length=5,
+                max_collision_rate=0.4, max_consecutive_collisions=3,
+                window=4)
+
+    def test_ids_have_the_initial_length(self):
+        self.assertEqual(len(next(self.idgen())), 4)
+
+    def test_draws_are_not_collisions(self):
+        ids = list(itertools.islice(self.idgen(), 10))
+        self.assertEqual([len(i) for i in ids], [4] * 10)
+        self.assertEqual(self.idgen.stats()['collisions'], 0)
+
+    def test_falls_back_after_consecutive_collisions(self):
+        ids = self.idgen()
+        lengths = []
+        for _ in range(5):
+            lengths.append(len(next(ids)))
+            ids.record_collision()
+        self.assertEqual(lengths, [4, 4, 4, 5, 5])
+        self.assertEqual(self.idgen.stats()['fallbacks'], 1)
+
+    def test_success_resets_consecutive_collisions(self):
+        ids = self.idgen()
+        for _ in range(5):
+            next(ids)
+            ids.record_collision()
+            next(ids)
+            ids.record_success()
+        self.assertEqual(len(next(ids)), 4)
+
+    def test_fallback_respects_max_length(self):
+        idgen = idgenerators.AdaptiveIdGenerator(4, max_length=4,
+                max_consecutive_collisions=1)
+        ids = idgen()
+        lengths = []
+        for _ in range(3):
+            lengths.append(len(next(ids)))
+            ids.record_collision()
+        self.assertEqual(lengths, [4, 4, 4])
+
+    def test_grows_when_the_collision_rate_is_exceeded(self):
+        for _ in range(4):
+            ids = self.idgen()
+            next(ids)
+            ids.record_collision()
+            next(ids)
+            ids.record_success()
+        self.assertEqual(self.idgen.length, 5)
+        self.assertEqual(len(next(self.idgen())), 5)
+
+    def test_keeps_the_length_under_the_threshold(self):
+        for _ in range(8):
+            ids = self.idgen()
+            next(ids)
+            ids.record_success()
+        self.assertEqual(self.idgen.length, 4)
+        self.assertEqual(self.idgen.estimated_occupancy(), 0)
+
+    def test_estimated_occupancy(self):
+        self.idgen.collision_rate = 0.25
+        self.assertEqual(self.idgen.estimated_occupancy(),
+                len(base28.BASE28) ** 4 // 4)
+
+    def test_stats(self):
+        ids = self.idgen()
+        next(ids)
+        ids.record_collision()
+        next(ids)
+        ids.record_success()
+        stats = self.idgen.stats()
+        self.assertEqual(stats['calls'], 1)
+        self.assertEqual(stats['draws'], 2)
+        self.assertEqual(stats['stored'], 1)
+        self.assertEqual(stats['collisions'], 1)
+        self.assertEqual(stats['length'], 4)
+
+    def test_shorten_many_without_collisions(self):
+        idgen = idgenerators.AdaptiveIdGenerator(6, max_length=8,
+                max_consecutive_collisions=5, window=2)
+        nurl = Nurl(datastores.InMemoryDataStore(), idgen)
+        with mock.patch.object(URLChecker, 'ping', return_value=True):
+            for batch in range(2):
+                results = nurl.shorten_many(['http://www.scielo.br/%s/%s'
+                        % (batch, i) for i in range(30)])
+                self.assertEqual({len(r.short_ref) for r in results}, {6})
+            self.assertEqual(len(nurl.shorten('http://www.scielo.br')), 6)
+
+        stats = idgen.stats()
+        self.assertEqual(stats['length'], 6)
+        self.assertEqual(stats['collisions'], 0)
+        self.assertEqual(stats['fallbacks'], 0)
+        self.assertEqual(stats['stored'], 61)
+
+    def test_shorten_reports_collisions(self):
+        store = datastores.InMemoryDataStore()
+        nurl = Nurl(store, self.idgen)
+        with mock.patch.object(idgenerators, 'generate_id',
+                    side_effect=['4kgj', '4kgj', '5fv7']), \
+                mock.patch.object(URLChecker, 'ping', return_value=True):
+            nurl.shorten('http://www.scielo.br')
+            self.assertEqual(nurl.shorten('http://www.scielo.org'), '5fv7')
+        stats = self.idgen.stats()
+        self.assertEqual(stats['collisions'], 1)
+        self.assertEqual(stats['stored'], 2)
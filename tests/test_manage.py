@@ -0,0 +1,53 @@
+import unittest
+
+from nurl import manage, datastores, mongodb
+from nurl.shortener import URLCanonicalizer
+from .test_mongodb import CollectionStub
+
+
+class FindDuplicatesTests(unittest.TestCase):
+    def test_urls_with_the_same_canonical_form(self):
+        store = datastores.InMemoryDataStore({
+            '4kgjc': 'http://www.scielo.br/a',
+            '5fv7w': 'http://WWW.scielo.br:80/a',
+            '6gx8z': 'http://www.scielo.br/b',
+            '7hy9b': 'http://www.scielo.br/a?',
+            })
+        duplicates = list(manage.find_duplicates(store, URLCanonicalizer(),
+                batch_size=2))
+        self.assertEqual(duplicates, [
+            ('http://www.scielo.br/a', [('4kgjc', 'http://www.scielo.br/a'),
+                                        ('5fv7w', 'http://WWW.scielo.br:80/a'),
+                                        ('7hy9b', 'http://www.scielo.br/a?')]),
+            ])
+
+    def test_no_duplicates(self):
+        store = datastores.InMemoryDataStore({'4kgjc': 'http://www.scielo.br/a'})
+        self.assertEqual(list(manage.find_duplicates(store, URLCanonicalizer())),
+                [])
+
+
+class CreateIndexesTests(unittest.TestCase):
+    def setUp(self):
+        self.urls = CollectionStub('urls')
+        self.accesses = CollectionStub('accesses')
+        self.collections = [(self.urls, mongodb.DATA_INDEXES),
+                            (self.accesses, mongodb.TRACKER_INDEXES)]
+
+    def test_missing_indexes_are_created(self):
+        missing = manage.create_indexes(self.collections)
+        self.assertEqual(len(missing), 3)
+        self.assertEqual(len(self.urls.created), 2)
+        self.assertEqual(manage.create_indexes(self.collections), [])
+        self.assertEqual(len(self.urls.created), 2)
+
+    def test_verify_only(self):
+        missing = manage.create_indexes(self.collections, verify_only=True)
+        self.assertEqual(missing, [('urls', [('short_ref', 1)]),
+                                   ('urls', [('plain_hash', 1)]),
+                                   ('accesses', [('short_ref', 1)])])
+        self.assertEqual(self.urls.created, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
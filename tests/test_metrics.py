@@ -0,0 +1,146 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from nurl import metrics, datastores, trackers, pingers, shortener, base28
+
+
+class RegistryTests(unittest.TestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_counters(self):
+        counter = self.registry.counter('nurl_things_total', 'Things.',
+                ['kind'])
+        counter.labels('a').inc()
+        counter.labels('a').inc(2)
+        counter.labels('b').inc()
+        exposition = self.registry.exposition()
+        self.assertIn('# TYPE nurl_things_total counter', exposition)
+        self.assertIn('nurl_things_total{kind="a"} 3', exposition)
+        self.assertIn('nurl_things_total{kind="b"} 1', exposition)
+
+    def test_labels_are_required(self):
+        counter = self.registry.counter('nurl_things_total', 'Things.',
+                ['kind'])
+        self.assertRaises(ValueError, lambda: counter.labels())
+
+    def test_duplicated_metrics(self):
+        self.registry.counter('nurl_things_total', 'Things.')
+        self.assertRaises(ValueError,
+                lambda: self.registry.counter('nurl_things_total', 'Things.'))
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram('nurl_latency_seconds',
+                'Latency.', buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.labels().observe(value)
+        lines = self.registry.exposition().splitlines()
+        self.assertIn('nurl_latency_seconds_bucket{le="0.1"} 2', lines)
+        self.assertIn('nurl_latency_seconds_bucket{le="1"} 3', lines)
+        self.assertIn('nurl_latency_seconds_bucket{le="+Inf"} 4', lines)
+        self.assertIn('nurl_latency_seconds_sum 2.65', lines)
+        self.assertIn('nurl_latency_seconds_count 4', lines)
+
+    def test_label_values_are_escaped(self):
+        counter = self.registry.counter('nurl_things_total', 'Things.',
+                ['kind'])
+        counter.labels('a"b').inc()
+        self.assertIn(r'nurl_things_total{kind="a\"b"} 1',
+                self.registry.exposition())
+
+
+class MultiprocessRegistryTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_values_are_stored_in_the_directory(self):
+        registry = metrics.Registry(self.directory)
+        registry.counter('nurl_things_total', 'Things.').labels().inc(2)
+        self.assertEqual(os.listdir(self.directory),
+                ['nurl-%s.db' % os.getpid()])
+        self.assertIn('nurl_things_total 2', registry.exposition())
+
+    def test_values_of_all_processes_are_summed(self):
+        other = metrics.MmapValues(os.path.join(self.directory, 'nurl-1.db'))
+        registry = metrics.Registry(self.directory)
+        counter = registry.counter('nurl_things_total', 'Things.')
+        counter.labels().inc(2)
+        other.add(counter.labels().key, 3)
+        other.close()
+        self.assertIn('nurl_things_total 5', registry.exposition())
+
+    def test_files_grow_as_needed(self):
+        path = os.path.join(self.directory, 'nurl-1.db')
+        values = metrics.MmapValues(path)
+        for i in range(5000):
+            values.add('key-%s' % i, i)
+        values.close()
+        read = dict(metrics.read_values(path))
+        self.assertEqual(len(read), 5000)
+        self.assertEqual(read['key-4999'], 4999)
+
+    def test_existing_files_are_reopened(self):
+        path = os.path.join(self.directory, 'nurl-1.db')
+        values = metrics.MmapValues(path)
+        values.add('a', 1)
+        values.close()
+        values = metrics.MmapValues(path)
+        values.add('a', 1)
+        values.add('b', 1)
+        self.assertEqual(dict(values.items()), {'a': 2, 'b': 1})
+        values.close()
+
+
+class InstrumentedComponentsTests(unittest.TestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+        self.instrumentation = metrics.Instrumentation(self.registry)
+
+    def test_operation_durations(self):
+        store = metrics.InstrumentedDataStore(
+                datastores.InMemoryDataStore(), self.instrumentation)
+        store['4kgjc'] = 'http://www.scielo.br'
+        self.assertEqual(store['4kgjc'], 'http://www.scielo.br')
+        self.assertIn('nurl_operation_duration_seconds_count'
+                '{component="store",operation="get"} 1',
+                self.registry.exposition())
+
+    def test_exceptions_are_counted_and_reraised(self):
+        store = metrics.InstrumentedDataStore(
+                datastores.InMemoryDataStore(), self.instrumentation)
+        self.assertRaises(KeyError, lambda: store['4kgjc'])
+        self.assertIn('nurl_operation_exceptions_total{component="store",'
+                'operation="get",exception="KeyError"} 1',
+                self.registry.exposition())
+
+    def test_other_attributes_are_delegated(self):
+        tracker = metrics.InstrumentedTracker(trackers.InMemoryTracker(),
+                self.instrumentation)
+        self.assertEqual(tracker.data, {})
+
+    def test_pinger(self):
+        pinger = metrics.InstrumentedPinger(pingers.UrlopenPinger(),
+                self.instrumentation, component='pinger_backend')
+        self.assertFalse(pinger.ping('http://', 1))
+        self.assertIn('component="pinger_backend",operation="check"',
+                self.registry.exposition())
+
+    def test_shortener(self):
+        nurl = metrics.InstrumentedShortener(shortener.Nurl(
+                datastores.InMemoryDataStore({'4kgjc': 'http://www.scielo.br'}),
+                lambda: base28.igenerate_id(6)), self.instrumentation)
+        self.assertEqual(nurl.resolve('4kgjc'), 'http://www.scielo.br')
+        self.assertIn('collisions', nurl.stats())
+        self.assertIn('nurl_operation_duration_seconds_count'
+                '{component="shortener",operation="resolve"} 1',
+                self.registry.exposition())
+
+    def test_requests(self):
+        self.instrumentation.observe_request('shortened', 301, 0.002)
+        self.assertIn('nurl_http_responses_total{route="shortened",'
+                'status="301"} 1', self.registry.exposition())
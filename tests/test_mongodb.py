@@ -0,0 +1,95 @@
+import unittest
+from unittest import mock
+
+from nurl import mongodb, pyramid_nurl
+
+
+class CollectionStub:
+    def __init__(self, name, indexes=None):
+        self.name = name
+        self.indexes = indexes or {
+            '_id_': {'key': [('_id', 1)], 'v': 2},
+        }
+        self.created = []
+
+    def index_information(self):
+        return self.indexes
+
+    def create_index(self, keys, **options):
+        name = '_'.join('%s_%s' % key for key in keys)
+        self.created.append((keys, options))
+        self.indexes[name] = dict(options, key=keys)
+        return name
+
+
+class ClientStub(dict):
+    def __init__(self, uri, **options):
+        super().__init__()
+        self.uri = uri
+        self.options = options
+        self.closed = False
+
+    def __missing__(self, name):
+        database = self[name] = {}
+        return database
+
+    def close(self):
+        self.closed = True
+
+
+class LazyDatabaseTests(unittest.TestCase):
+    def setUp(self):
+        self.factory = mock.MagicMock(side_effect=ClientStub)
+        self.database = mongodb.LazyDatabase('mongodb://u:p@localhost/',
+                'nurl', {'maxPoolSize': 5}, client_factory=self.factory)
+
+    def test_client_is_created_on_first_use(self):
+        collection = self.database['urls']
+        self.factory.assert_not_called()
+        self.database.database['urls'] = CollectionStub('urls')
+        self.assertEqual(collection.index_information(),
+                {'_id_': {'key': [('_id', 1)], 'v': 2}})
+        self.factory.assert_called_once_with('mongodb://u:p@localhost/',
+                maxPoolSize=5)
+
+    def test_each_process_has_its_own_client(self):
+        parent = self.database.client
+        with mock.patch('os.getpid', return_value=-1):
+            child = self.database.client
+            self.assertIs(self.database.client, child)
+        self.assertIsNot(parent, child)
+        self.assertFalse(parent.closed)
+
+    def test_credentials_are_not_exposed(self):
+        self.assertNotIn('u:p', repr(self.database))
+
+
+class ClientOptionsTests(unittest.TestCase):
+    def test_defaults(self):
+        options = mongodb.get_client_options(pyramid_nurl.parse_settings({}))
+        self.assertFalse(options['connect'])
+        self.assertEqual(options['maxPoolSize'], 100)
+        self.assertIsNone(options['socketTimeoutMS'])
+        self.assertEqual(options['readPreference'], 'primary')
+
+    def test_unknown_read_preference(self):
+        settings = pyramid_nurl.parse_settings(
+                {'nurl.mongodb.read_preference': 'secondary_preferred'})
+        self.assertRaises(ValueError,
+                lambda: mongodb.get_client_options(settings))
+
+
+class MissingIndexesTests(unittest.TestCase):
+    def test_all_missing(self):
+        collection = CollectionStub('urls')
+        self.assertEqual(mongodb.missing_indexes(collection,
+                mongodb.DATA_INDEXES), mongodb.DATA_INDEXES)
+
+    def test_existing_indexes(self):
+        collection = CollectionStub('urls', {
+            'short_ref_1': {'key': [('short_ref', 1.0)], 'unique': True},
+            # sem a restrição de unicidade
+            'plain_hash_1': {'key': [('plain_hash', 1)]},
+            })
+        self.assertEqual(mongodb.missing_indexes(collection,
+                mongodb.DATA_INDEXES), mongodb.DATA_INDEXES[1:])
@@ -1,19 +1,54 @@
 import unittest
 from unittest import mock
 import itertools
+import os
+import tempfile
+
+import pymongo
 
 from nurl.shortener import (
         Nurl,
         NotExists,
+        URLError,
         URLChecker,
+        ShortenResult,
+        URLCanonicalizer,
+        TRACKING_PARAMS,
         DEFAULT_TIMEOUT,
         )
-from nurl import datastores
+from nurl import datastores, trackers
 
 
 DEFAULT_SHORTIDS = ['4kgjc', '5fv7w']
 
 
+class LegacyCollectionStub:
+    """Coleção do MongoDB em que a URL `plain` foi armazenada sem o campo
+    `plain_hash`, e cujo índice único sobre `plain` ainda existe.
+    """
+    def __init__(self, plain):
+        self.plain = plain
+
+    def insert_one(self, record):
+        if record['plain'] == self.plain:
+            raise pymongo.errors.DuplicateKeyError(
+                    'E11000 duplicate key error index: nurl.urls.$plain_1')
+
+    def insert_many(self, records, ordered=True):
+        errors = [{'index': i, 'code': 11000,
+                   'errmsg': 'E11000 duplicate key error index: plain_1'}
+                  for i, rec in enumerate(records)
+                  if rec['plain'] == self.plain]
+        if errors:
+            raise pymongo.errors.BulkWriteError({'writeErrors': errors})
+
+    def find_one(self, query, projection=None):
+        return None
+
+    def find(self, query, projection=None):
+        return []
+
+
 def cycling_idgen_stub(shortids=DEFAULT_SHORTIDS):
     for shortid in itertools.cycle(shortids):
         yield shortid
@@ -46,9 +81,239 @@ class NurlTests(unittest.TestCase):
 
         self.assertEqual(local_nurl.shorten('http://www.scielo.br'), '4kgjc')
 
+    def test_plain_hash_collision(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = datastores.SQLiteDataStore(os.path.join(tmpdir, 'nurl.db'))
+            store['4kgjc'] = 'http://www.scielo.br'
+            local_nurl = Nurl(store, lambda: cycling_idgen_stub(['5fv7w']))
+            with mock.patch.object(datastores, 'plain_hash', return_value=1), \
+                    mock.patch.object(URLChecker, 'ping', return_value=True):
+                store['6gx8z'] = 'http://www.scielo.org'
+                self.assertRaises(URLError,
+                        lambda: local_nurl.shorten('http://www.scielo.org/a'))
+                results = local_nurl.shorten_many(['http://www.scielo.org/a',
+                                                   'http://www.scielo.org'])
+            store.close()
+        self.assertEqual(results, [
+            ShortenResult('http://www.scielo.org/a', None, 'hash_collision'),
+            ShortenResult('http://www.scielo.org', '6gx8z', None),
+            ])
+
+    def test_duplicated_url_without_plain_hash(self):
+        store = datastores.MongoDBDataStore(
+                LegacyCollectionStub('http://www.scielo.br'))
+        local_nurl = Nurl(store, self.idgen)
+        with mock.patch.object(URLChecker, 'ping', return_value=True):
+            self.assertRaises(URLError,
+                    lambda: local_nurl.shorten('http://www.scielo.br'))
+            results = local_nurl.shorten_many(['http://www.scielo.br'])
+        self.assertEqual(results, [
+            ShortenResult('http://www.scielo.br', None, 'hash_collision')])
+
+    def test_shorten_existing_url_skips_ping(self):
+        store = datastores.InMemoryDataStore(initial={'4kgjc': 'http://www.scielo.br'})
+        local_nurl = Nurl(store, self.idgen)
+        with mock.patch.object(URLChecker, 'ping') as ping:
+            self.assertEqual(local_nurl.shorten('http://www.scielo.br'), '4kgjc')
+        ping.assert_not_called()
+
+    def test_shorten_existing_url_checks_whitelist(self):
+        store = datastores.InMemoryDataStore(initial={'4kgjc': 'http://www.scielo.br'})
+        local_nurl = Nurl(store, self.idgen, whitelist=['www.scielo.org'])
+        self.assertRaises(URLError,
+                lambda: local_nurl.shorten('http://www.scielo.br'))
+
+    def test_shorten_checks_wildcard_whitelist(self):
+        local_nurl = Nurl(self.store, self.idgen, whitelist=['*.scielo.br'])
+        with mock.patch.object(URLChecker, 'ping', return_value=True):
+            self.assertEqual(local_nurl.shorten('http://www.scielo.br'),
+                    '4kgjc')
+            self.assertRaises(URLError,
+                    lambda: local_nurl.shorten('http://www.scielo.org'))
+
+    def test_shorten_new_url_pings(self):
+        with mock.patch.object(URLChecker, 'ping', return_value=False) as ping:
+            self.assertRaises(URLError,
+                    lambda: self.nurl.shorten('http://www.scielo.br'))
+        ping.assert_called_once_with()
+
+    def test_shorten_many(self):
+        store = datastores.InMemoryDataStore(initial={'4kgjc': 'http://www.scielo.br'})
+        idgen = lambda: cycling_idgen_stub(['5fv7w', '6gx8z'])
+        local_nurl = Nurl(store, idgen, whitelist=['www.scielo.br',
+                                                   'www.scielo.org',
+                                                   'down.scielo.org'])
+
+        def ping(checker):
+            return checker.url != 'http://down.scielo.org'
+
+        with mock.patch.object(URLChecker, 'ping', autospec=True,
+                side_effect=ping):
+            results = local_nurl.shorten_many(['http://www.scielo.br',
+                                               'http://www.scielo.org',
+                                               'www.scielo.org',
+                                               'http://scielo.org',
+                                               'http://down.scielo.org',
+                                               'http://www.scielo.br/a'])
+        self.assertEqual(results, [
+            ShortenResult('http://www.scielo.br', '4kgjc', None),
+            ShortenResult('http://www.scielo.org', '5fv7w', None),
+            ShortenResult('www.scielo.org', None, 'invalid_url'),
+            ShortenResult('http://scielo.org', None, 'hostname_not_allowed'),
+            ShortenResult('http://down.scielo.org', None, 'unreachable'),
+            ShortenResult('http://www.scielo.br/a', '6gx8z', None),
+            ])
+
+    def test_shorten_many_retries_collided_keys(self):
+        store = datastores.InMemoryDataStore(initial={'4kgjc': 'http://www.scielo.br'})
+        idgen = lambda: cycling_idgen_stub(['4kgjc', '5fv7w', '4kgjc', '6gx8z'])
+        local_nurl = Nurl(store, idgen)
+        with mock.patch.object(URLChecker, 'ping', return_value=True):
+            results = local_nurl.shorten_many(['http://www.scielo.org',
+                                               'http://www.scielo.org/a'])
+        self.assertEqual([r.short_ref for r in results], ['6gx8z', '5fv7w'])
+        self.assertEqual(store['6gx8z'], 'http://www.scielo.org')
+
+    def test_shorten_many_with_duplicated_urls(self):
+        with mock.patch.object(URLChecker, 'ping', return_value=True) as ping:
+            results = self.nurl.shorten_many(['http://www.scielo.br',
+                                              'http://www.scielo.br'])
+        self.assertEqual([r.short_ref for r in results], ['4kgjc', '4kgjc'])
+        ping.assert_called_once_with()
+
+    def test_shorten_canonical_url(self):
+        store = datastores.InMemoryDataStore(initial={'4kgjc': 'http://www.scielo.br/a'})
+        local_nurl = Nurl(store, self.idgen, canonicalize=URLCanonicalizer())
+        with mock.patch.object(URLChecker, 'ping') as ping:
+            self.assertEqual(local_nurl.shorten('HTTP://WWW.scielo.br:80/a?'),
+                    '4kgjc')
+        ping.assert_not_called()
+
+    def test_whitelist_is_checked_against_canonical_url(self):
+        local_nurl = Nurl(self.store, self.idgen, whitelist=['www.scielo.br'],
+                canonicalize=URLCanonicalizer())
+        with mock.patch.object(URLChecker, 'ping', return_value=True):
+            self.assertEqual(local_nurl.shorten('http://WWW.SciELO.br/a'),
+                    '4kgjc')
+        self.assertEqual(self.store['4kgjc'], 'http://www.scielo.br/a')
+
+    def test_shorten_many_canonical_urls(self):
+        local_nurl = Nurl(self.store, self.idgen,
+                canonicalize=URLCanonicalizer())
+        with mock.patch.object(URLChecker, 'ping', return_value=True) as ping:
+            results = local_nurl.shorten_many(['http://www.scielo.br/a',
+                                               'http://WWW.scielo.br/a?'])
+        self.assertEqual(results, [
+            ShortenResult('http://www.scielo.br/a', '4kgjc', None),
+            ShortenResult('http://WWW.scielo.br/a?', '4kgjc', None),
+            ])
+        ping.assert_called_once_with()
+
+    def test_resolve_many(self):
+        store = datastores.InMemoryDataStore(initial={'4kgjc': 'http://www.scielo.br'})
+        tracker = trackers.InMemoryTracker()
+        local_nurl = Nurl(store, self.idgen, tracker=tracker)
+        self.assertEqual(local_nurl.resolve_many(['4kgjc', 'xxxxx']),
+                {'4kgjc': 'http://www.scielo.br'})
+        self.assertEqual(tracker.data, {})
+
+    def test_resolve_many_tracks_accesses(self):
+        store = datastores.InMemoryDataStore(initial={'4kgjc': 'http://www.scielo.br'})
+        tracker = trackers.InMemoryTracker()
+        local_nurl = Nurl(store, self.idgen, tracker=tracker)
+        access = trackers.Access(utctime=None, referrer=None)
+        local_nurl.resolve_many(['4kgjc', 'xxxxx'], access=access)
+        self.assertEqual(tracker.data, {'4kgjc': [access]})
+
+    def test_collision_stats(self):
+        store = datastores.InMemoryDataStore(initial={'4kgjc': 'http://www.scielo.br'})
+        local_nurl = Nurl(store, lambda: cycling_idgen_stub())
+        with mock.patch.object(URLChecker, 'ping', return_value=True):
+            local_nurl.shorten('http://www.scielo.org')
+        stats = local_nurl.stats()['collisions']
+        self.assertEqual(stats['stored'], 1)
+        self.assertEqual(stats['attempts'], 2)
+        self.assertEqual(stats['collisions'], 1)
+        self.assertEqual(stats['collision_rate'], 0.5)
+        self.assertNotIn('idgen', local_nurl.stats())
+
+    def test_collision_stats_of_batches(self):
+        store = datastores.InMemoryDataStore(initial={'4kgjc': 'http://www.scielo.br'})
+        local_nurl = Nurl(store, lambda: cycling_idgen_stub())
+        with mock.patch.object(URLChecker, 'ping', return_value=True):
+            local_nurl.shorten_many(['http://www.scielo.org'])
+        stats = local_nurl.stats()['collisions']
+        self.assertEqual(stats['stored'], 1)
+        self.assertEqual(stats['collisions'], 1)
+
     def test_resolve_unknown_id_raises_keyerror(self):
         self.assertRaises(NotExists, lambda: self.nurl.resolve('xxxxx'))
 
+    def test_resolve_unknown_id_is_not_tracked(self):
+        tracker = trackers.InMemoryTracker()
+        local_nurl = Nurl(self.store, self.idgen, tracker=tracker)
+        access = trackers.Access(utctime=None, referrer=None)
+        self.assertRaises(NotExists,
+                lambda: local_nurl.resolve('xxxxx', access=access))
+        self.assertEqual(tracker.data, {})
+
+    def test_resolve_tracks_accesses(self):
+        store = datastores.InMemoryDataStore(initial={'4kgjc': 'http://www.scielo.br'})
+        tracker = trackers.InMemoryTracker()
+        local_nurl = Nurl(store, self.idgen, tracker=tracker)
+        access = trackers.Access(utctime=None, referrer=None)
+        local_nurl.resolve('4kgjc', access=access)
+        self.assertEqual(list(tracker.get('4kgjc')), [access])
+
+
+class URLCanonicalizerTests(unittest.TestCase):
+    def setUp(self):
+        self.canonicalize = URLCanonicalizer()
+
+    def test_scheme_and_host_are_lowercased(self):
+        self.assertEqual(self.canonicalize('HTTP://Example.ORG/A'),
+                'http://example.org/A')
+
+    def test_default_ports_are_dropped(self):
+        self.assertEqual(self.canonicalize('http://example.org:80/a'),
+                'http://example.org/a')
+        self.assertEqual(self.canonicalize('https://example.org:443/a'),
+                'https://example.org/a')
+        self.assertEqual(self.canonicalize('http://example.org:443/a'),
+                'http://example.org:443/a')
+
+    def test_empty_query_and_fragment_are_dropped(self):
+        self.assertEqual(self.canonicalize('http://example.org/a?#'),
+                'http://example.org/a')
+
+    def test_userinfo_is_kept(self):
+        self.assertEqual(self.canonicalize('http://User@Example.org:80/'),
+                'http://User@example.org/')
+
+    def test_ipv6_hosts(self):
+        self.assertEqual(self.canonicalize('http://[::1]:80/'), 'http://[::1]/')
+
+    def test_query_is_kept_by_default(self):
+        self.assertEqual(self.canonicalize('http://example.org/?b=1&a=2'),
+                'http://example.org/?b=1&a=2')
+
+    def test_sort_query(self):
+        canonicalize = URLCanonicalizer(sort_query=True)
+        self.assertEqual(canonicalize('http://example.org/?b=1&a=%202&b=0'),
+                'http://example.org/?a=%202&b=1&b=0')
+
+    def test_strip_params(self):
+        canonicalize = URLCanonicalizer(strip_params=TRACKING_PARAMS)
+        self.assertEqual(canonicalize(
+                'http://example.org/?utm_source=x&a=1&UTM_Medium=y&gclid=z'),
+                'http://example.org/?a=1')
+        self.assertEqual(canonicalize('http://example.org/?utm_source=x'),
+                'http://example.org/')
+
+    def test_invalid_urls_are_kept(self):
+        self.assertEqual(self.canonicalize('www.scielo.br'), 'www.scielo.br')
+        self.assertEqual(self.canonicalize('http://a.org:x/'), 'http://a.org:x/')
+
 
 class URLCheckerTests(unittest.TestCase):
     def setUp(self):
@@ -89,6 +354,14 @@ class URLCheckerTests(unittest.TestCase):
         urlopen.assert_called_once_with('http://www.scielo.br', 
                 timeout=DEFAULT_TIMEOUT)
 
+    def test_ping_uses_the_given_pinger(self):
+        pinger = mock.MagicMock()
+        pinger.ping.return_value = True
+        nc = URLChecker('http://www.scielo.br', pinger=pinger)
+        self.assertTrue(nc.ping())
+        pinger.ping.assert_called_once_with('http://www.scielo.br',
+                DEFAULT_TIMEOUT)
+
     def test_httperror_exc_makes_ping_return_false(self):
         import urllib.error
         class MyHTTPError(urllib.error.HTTPError):
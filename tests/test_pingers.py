@@ -0,0 +1,176 @@
+import unittest
+import threading
+import http.server
+
+from nurl import pingers
+
+
+class OriginHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        self.server.requests.append(('HEAD', self.path))
+        if self.path == '/no-head':
+            self._respond(405)
+        elif self.path == '/missing':
+            self._respond(404)
+        elif self.path == '/moved':
+            self._respond(301, {'Location': '/ok'})
+        elif self.path == '/loop':
+            self._respond(302, {'Location': '/loop'})
+        else:
+            self._respond(200)
+
+    def do_GET(self):
+        self.server.requests.append(('GET', self.path,
+                                     self.headers.get('Range')))
+        self._respond(206, body=b'x')
+
+    def _respond(self, status, headers=None, body=b''):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class CountingServer(http.server.ThreadingHTTPServer
+                     if hasattr(http.server, 'ThreadingHTTPServer')
+                     else http.server.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests = []
+        self.connections = 0
+
+    def get_request(self):
+        self.connections += 1
+        return super().get_request()
+
+
+class HTTPPingerTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = CountingServer(('127.0.0.1', 0), OriginHandler)
+        cls.base_url = 'http://127.0.0.1:%s' % cls.server.server_address[1]
+        cls.thread = threading.Thread(target=cls.server.serve_forever,
+                daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.requests = []
+        self.server.connections = 0
+        self.pinger = pingers.HTTPPinger()
+
+    def tearDown(self):
+        self.pinger.close()
+
+    def test_head_request(self):
+        self.assertTrue(self.pinger.ping(self.base_url + '/ok', 2))
+        self.assertEqual(self.server.requests, [('HEAD', '/ok')])
+
+    def test_fallback_to_ranged_get(self):
+        self.assertTrue(self.pinger.ping(self.base_url + '/no-head', 2))
+        self.assertEqual(self.server.requests,
+                [('HEAD', '/no-head'), ('GET', '/no-head', 'bytes=0-0')])
+
+    def test_error_status(self):
+        result = self.pinger.check(self.base_url + '/missing', 2)
+        self.assertEqual(result, pingers.PingResult(alive=False, reachable=True))
+
+    def test_redirects_are_followed(self):
+        self.assertTrue(self.pinger.ping(self.base_url + '/moved', 2))
+        self.assertEqual(self.server.requests,
+                [('HEAD', '/moved'), ('HEAD', '/ok')])
+
+    def test_too_many_redirects(self):
+        self.assertFalse(self.pinger.ping(self.base_url + '/loop', 2))
+
+    def test_connections_are_reused(self):
+        for _ in range(3):
+            self.assertTrue(self.pinger.ping(self.base_url + '/ok', 2))
+        self.assertEqual(self.server.connections, 1)
+
+    def test_unreachable_host(self):
+        pinger = pingers.HTTPPinger()
+        with CountingServer(('127.0.0.1', 0), OriginHandler) as server:
+            url = 'http://127.0.0.1:%s/' % server.server_address[1]
+        result = pinger.check(url, 2)
+        self.assertEqual(result,
+                pingers.PingResult(alive=False, reachable=False))
+
+    def test_concurrency_limit_per_host(self):
+        pinger = pingers.HTTPPinger(max_per_host=1)
+        semaphore = pinger._semaphore(('http', '127.0.0.1',
+                                       self.server.server_address[1]))
+        semaphore.acquire()
+        try:
+            result = pinger.check(self.base_url + '/ok', 0.01)
+        finally:
+            semaphore.release()
+        self.assertEqual(result, pingers.PingResult(alive=False, reachable=None))
+
+
+class PingerStub(pingers.Pinger):
+    def __init__(self, results):
+        self.results = results
+        self.calls = []
+
+    def check(self, url, timeout):
+        self.calls.append(url)
+        return self.results[url]
+
+
+class CachingPingerTests(unittest.TestCase):
+    def setUp(self):
+        self.stub = PingerStub({
+            'http://a.org/ok': pingers.PingResult(True, True),
+            'http://a.org/missing': pingers.PingResult(False, True),
+            'http://b.org/1': pingers.PingResult(False, False),
+            'http://b.org/2': pingers.PingResult(True, True),
+            'http://c.org/busy': pingers.PingResult(False, None),
+            })
+        self.pinger = pingers.CachingPinger(self.stub)
+
+    def test_successes_are_cached(self):
+        self.assertTrue(self.pinger.ping('http://a.org/ok', 1))
+        self.assertTrue(self.pinger.ping('http://a.org/ok', 1))
+        self.assertEqual(self.stub.calls, ['http://a.org/ok'])
+
+    def test_failures_are_cached(self):
+        self.assertFalse(self.pinger.ping('http://a.org/missing', 1))
+        self.assertFalse(self.pinger.ping('http://a.org/missing', 1))
+        self.assertEqual(self.stub.calls, ['http://a.org/missing'])
+
+    def test_unreachable_hosts_are_cached(self):
+        self.assertFalse(self.pinger.ping('http://b.org/1', 1))
+        self.assertFalse(self.pinger.ping('http://b.org/2', 1))
+        self.assertEqual(self.stub.calls, ['http://b.org/1'])
+
+    def test_unknown_results_are_not_cached(self):
+        self.assertFalse(self.pinger.ping('http://c.org/busy', 1))
+        self.assertFalse(self.pinger.ping('http://c.org/busy', 1))
+        self.assertEqual(len(self.stub.calls), 2)
+
+    def test_entries_expire(self):
+        now = [0]
+        self.pinger.ok_urls.clock = lambda: now[0]
+        self.pinger.ping('http://a.org/ok', 1)
+        now[0] = 3601
+        self.pinger.ping('http://a.org/ok', 1)
+        self.assertEqual(len(self.stub.calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
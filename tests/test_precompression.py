@@ -0,0 +1,84 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from nurl import manage, precompression
+
+
+class PrecompressTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'bundle.min.css')
+        with open(self.path, 'wb') as f:
+            f.write(b'body { margin: 0 }' * 100)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_gzip_variant(self):
+        self.assertEqual(precompression.precompress(self.path, ['gzip']),
+                ['gzip'])
+        with gzip.open(self.path + '.gz') as f:
+            self.assertEqual(f.read(), b'body { margin: 0 }' * 100)
+
+    def test_up_to_date_variants_are_kept(self):
+        with open(self.path + '.gz', 'wb') as f:
+            f.write(b'previous')
+        self.assertEqual(precompression.precompress(self.path, ['gzip']),
+                ['gzip'])
+        with open(self.path + '.gz', 'rb') as f:
+            self.assertEqual(f.read(), b'previous')
+
+    def test_stale_variants_are_replaced(self):
+        with open(self.path + '.gz', 'wb') as f:
+            f.write(b'previous')
+        mtime = os.stat(self.path).st_mtime
+        os.utime(self.path + '.gz', (mtime - 10, mtime - 10))
+        precompression.precompress(self.path, ['gzip'])
+        with gzip.open(self.path + '.gz') as f:
+            self.assertEqual(f.read(), b'body { margin: 0 }' * 100)
+
+    def test_unavailable_encodings_are_skipped(self):
+        available = precompression.precompress(self.path, ['br', 'gzip'])
+        self.assertIn('gzip', available)
+        self.assertEqual('br' in available,
+                precompression.is_available('br'))
+
+    def test_directory(self):
+        os.mkdir(os.path.join(self.tmpdir.name, 'js'))
+        script = os.path.join(self.tmpdir.name, 'js', 'app.js')
+        image = os.path.join(self.tmpdir.name, 'logo.png')
+        for path in (script, image):
+            with open(path, 'wb') as f:
+                f.write(b'content')
+        self.assertEqual(
+                precompression.precompress_directory(self.tmpdir.name,
+                                                     ['gzip']),
+                [self.path, script])
+        self.assertTrue(os.path.isfile(script + '.gz'))
+        self.assertFalse(os.path.exists(image + '.gz'))
+
+    def test_manage_command(self):
+        manage.main(['precompress-assets', '--static-dir', self.tmpdir.name,
+                     '--encodings', 'gzip'])
+        with gzip.open(self.path + '.gz') as f:
+            self.assertEqual(f.read(), b'body { margin: 0 }' * 100)
+
+
+class EncodingsTests(unittest.TestCase):
+    def test_parse_encodings(self):
+        self.assertEqual(precompression.parse_encodings('br gzip'),
+                ['br', 'gzip'])
+        self.assertEqual(precompression.parse_encodings(''), [])
+        self.assertRaises(ValueError,
+                lambda: precompression.parse_encodings('deflate'))
+
+    def test_choose_encoding(self):
+        choose = precompression.choose_encoding
+        self.assertEqual(choose('gzip, deflate, br', ['br', 'gzip']), 'br')
+        self.assertEqual(choose('gzip, deflate, br', ['gzip']), 'gzip')
+        self.assertEqual(choose('br;q=0, gzip', ['br', 'gzip']), 'gzip')
+        self.assertEqual(choose('*', ['gzip']), 'gzip')
+        self.assertIsNone(choose('identity', ['br', 'gzip']))
+        self.assertIsNone(choose(None, ['gzip']))
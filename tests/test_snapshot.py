@@ -0,0 +1,113 @@
+import os
+import unittest
+import tempfile
+
+from nurl import snapshot, datastores
+
+
+class SnapshotTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'urls.snapshot')
+        self.pairs = {'4dp3': 'http://www.scielo.br/',
+                      '2': 'http://a.org/',
+                      '22': 'http://b.org/ção'}
+        snapshot.write_snapshot(self.pairs.items(), self.path)
+        self.snapshot = snapshot.Snapshot(self.path)
+
+    def tearDown(self):
+        self.snapshot.close()
+        self.tmpdir.cleanup()
+
+    def test_get(self):
+        for key, url in self.pairs.items():
+            self.assertEqual(self.snapshot.get(key), url)
+
+    def test_get_missing(self):
+        self.assertIsNone(self.snapshot.get('4dp4'))
+        self.assertIsNone(self.snapshot.get('foo'))
+
+    def test_key(self):
+        for key, url in self.pairs.items():
+            self.assertEqual(self.snapshot.key(url), key)
+
+    def test_key_missing(self):
+        self.assertIsNone(self.snapshot.key('http://c.org/'))
+
+    def test_len(self):
+        self.assertEqual(len(self.snapshot), 3)
+
+    def test_invalid_keys_are_skipped(self):
+        count = snapshot.write_snapshot([('foo', 'bar'), ('4dp3', 'baz')],
+                self.path)
+        self.assertEqual(count, 1)
+
+    def test_empty_snapshot(self):
+        snapshot.write_snapshot([], self.path)
+        empty = snapshot.Snapshot(self.path)
+        self.assertEqual(len(empty), 0)
+        self.assertIsNone(empty.get('4dp3'))
+        empty.close()
+
+    def test_truncated_file(self):
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        with open(self.path, 'wb') as f:
+            f.write(data[:-1])
+        self.assertRaises(ValueError, lambda: snapshot.Snapshot(self.path))
+
+    def test_export(self):
+        store = datastores.InMemoryDataStore({'4dp3': 'http://c.org/'})
+        self.assertEqual(snapshot.export(store, self.path), 1)
+        exported = snapshot.Snapshot(self.path)
+        self.assertEqual(exported.get('4dp3'), 'http://c.org/')
+        exported.close()
+
+
+class SnapshotDataStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmpdir.name, 'urls.snapshot')
+        self.backend = datastores.InMemoryDataStore(
+                {'4dp3': 'http://www.scielo.br/'})
+        snapshot.export(self.backend, path)
+        self.snapshot = snapshot.Snapshot(path)
+        self.store = datastores.SnapshotDataStore(self.backend, self.snapshot)
+
+    def tearDown(self):
+        self.snapshot.close()
+        self.tmpdir.cleanup()
+
+    def test_existing_keys_are_served_from_the_snapshot(self):
+        self.backend.data.clear()
+        self.assertEqual(self.store['4dp3'], 'http://www.scielo.br/')
+        self.assertEqual(self.store.stats()['hits'], 1)
+
+    def test_existing_urls_are_served_from_the_snapshot(self):
+        self.backend.revdata.clear()
+        self.assertEqual(self.store.key('http://www.scielo.br/'), '4dp3')
+
+    def test_new_keys_are_forwarded_to_the_backend(self):
+        self.store['5fv7'] = 'http://a.org/'
+        self.assertEqual(self.store['5fv7'], 'http://a.org/')
+        self.assertEqual(self.store.key('http://a.org/'), '5fv7')
+        self.assertEqual(self.store.stats()['misses'], 2)
+
+    def test_duplicates_are_detected_by_the_backend(self):
+        self.assertRaises(datastores.DuplicatedValueError,
+                lambda: self.store.__setitem__('5fv7', 'http://www.scielo.br/'))
+
+    def test_get_many(self):
+        self.store['5fv7'] = 'http://a.org/'
+        self.assertEqual(self.store.get_many(['4dp3', '5fv7', 'missing']),
+                {'4dp3': 'http://www.scielo.br/', '5fv7': 'http://a.org/'})
+
+    def test_key_many(self):
+        self.store['5fv7'] = 'http://a.org/'
+        self.assertEqual(
+                self.store.key_many(['http://www.scielo.br/', 'http://a.org/']),
+                {'http://www.scielo.br/': '4dp3', 'http://a.org/': '5fv7'})
+
+
+if __name__ == '__main__':
+    unittest.main()
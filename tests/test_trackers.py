@@ -1,9 +1,14 @@
 import os
 import unittest
+from unittest import mock
 import operator
+import tempfile
+import threading
+import weakref
+import gc
 from datetime import datetime
 
-from nurl import trackers
+from nurl import trackers, manage, mongodb
 
 
 IS_RUNNING_ON_TRAVISCI = os.environ.get('TRAVIS', False)
@@ -37,6 +42,197 @@ class InMemoryTests(unittest.TestCase):
         self.assertEqual(accesses, [])
 
 
+class SQLiteTests(InMemoryTests):
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.tracker = trackers.SQLiteTracker(
+                os.path.join(self.tmpdir.name, 'nurl.sqlite3'))
+
+    def tearDown(self):
+        self.tracker.close()
+        self.tmpdir.cleanup()
+
+    def test_add_many(self):
+        count = self.tracker.add_many([('foo', self.access_sample),
+                                       ('bar', self.access_sample)])
+        self.assertEqual(count, 2)
+        self.assertEqual(list(self.tracker.get('foo')), [self.access_sample])
+
+
+class BufferedTrackerTests(InMemoryTests):
+    def setUp(self):
+        super().setUp()
+        self.backend = trackers.InMemoryTracker()
+        self.tracker = trackers.BufferedTracker(self.backend, max_batch=2,
+                flush_interval=60, max_queued=3)
+
+    def tearDown(self):
+        self.tracker.close()
+
+    def test_accesses_are_queued(self):
+        self.tracker.add('foo', self.access_sample)
+        self.assertEqual(self.backend.data, {})
+        self.assertEqual(self.tracker.stats()['queued'], 1)
+
+    def test_flush_writes_queued_accesses(self):
+        self.tracker.add('foo', self.access_sample)
+        self.tracker.flush()
+        self.assertEqual(list(self.backend.get('foo')), [self.access_sample])
+        self.assertEqual(self.tracker.stats()['flushed'], 1)
+
+    def test_accesses_are_written_in_batches(self):
+        self.backend.add_many = mock.MagicMock(side_effect=lambda i: len(i))
+        for _ in range(3):
+            self.tracker.add('foo', self.access_sample)
+        self.tracker.flush()
+        sizes = [len(c[0][0]) for c in self.backend.add_many.call_args_list]
+        self.assertEqual(sorted(sizes), [1, 2])
+
+    def test_drop_new_overflow_policy(self):
+        self.tracker.pid = os.getpid()  # evita iniciar a thread
+        for i in range(4):
+            self.tracker.add('foo%s' % i, self.access_sample)
+        self.assertEqual(list(self.tracker.queue)[-1][0], 'foo2')
+        self.assertEqual(self.tracker.stats()['dropped'], 1)
+
+    def test_drop_oldest_overflow_policy(self):
+        tracker = trackers.BufferedTracker(self.backend, max_batch=10,
+                flush_interval=60, max_queued=3, overflow='drop_oldest')
+        tracker.pid = os.getpid()  # evita iniciar a thread
+        for i in range(4):
+            tracker.add('foo%s' % i, self.access_sample)
+        self.assertEqual([r for r, _ in tracker.queue],
+                ['foo1', 'foo2', 'foo3'])
+        self.assertEqual(tracker.stats()['dropped'], 1)
+        tracker.close()
+
+    def test_unknown_overflow_policy(self):
+        self.assertRaises(ValueError, lambda: trackers.BufferedTracker(
+                self.backend, overflow='block'))
+
+    def test_closed_trackers_are_not_closed_again_at_exit(self):
+        self.assertIn(self.tracker, trackers._OPEN_BUFFERED_TRACKERS)
+        self.tracker.close()
+        self.assertNotIn(self.tracker, trackers._OPEN_BUFFERED_TRACKERS)
+
+    def test_discarded_trackers_are_not_kept_alive(self):
+        tracker = trackers.BufferedTracker(self.backend)
+        ref = weakref.ref(tracker)
+        del tracker
+        gc.collect()
+        self.assertIsNone(ref())
+
+    def test_close_writes_pending_accesses(self):
+        self.tracker.add('foo', self.access_sample)
+        self.tracker.close()
+        self.assertEqual(list(self.backend.get('foo')), [self.access_sample])
+
+    def test_accesses_are_written_synchronously_after_close(self):
+        self.tracker.close()
+        self.tracker.add('foo', self.access_sample)
+        self.assertEqual(list(self.backend.get('foo')), [self.access_sample])
+
+    def test_background_flush_on_max_batch(self):
+        self.tracker.add('foo', self.access_sample)
+        self.tracker.add('foo', self.access_sample)
+        for _ in range(100):
+            if self.tracker.stats()['flushed'] == 2:
+                break
+            threading.Event().wait(0.01)
+        self.assertEqual(len(self.backend.data['foo']), 2)
+
+
+class InMemoryAggregatingTests(unittest.TestCase):
+    def setUp(self):
+        self.tracker = trackers.InMemoryAggregatingTracker(by_referrer=True)
+        self.access_sample = trackers.Access(
+                utctime=datetime(2017, 5, 19, 10, 30),
+                referrer='http://sample.com/page')
+
+    def test_totals(self):
+        self.tracker.add('foo', self.access_sample)
+        self.tracker.add('foo', self.access_sample)
+        self.assertEqual(self.tracker.totals('foo'),
+                {'total': 2, 'referrers': {'sample.com': 2}})
+
+    def test_totals_for_unknown_shortid(self):
+        self.assertEqual(self.tracker.totals('unknown'),
+                {'total': 0, 'referrers': {}})
+
+    def test_totals_without_referrers(self):
+        tracker = trackers.InMemoryAggregatingTracker()
+        tracker.add('foo', self.access_sample)
+        self.assertEqual(tracker.totals('foo'), {'total': 1, 'referrers': {}})
+
+    def test_hourly_series(self):
+        self.tracker.add('foo', self.access_sample)
+        self.tracker.add('foo', self.access_sample._replace(
+                utctime=datetime(2017, 5, 19, 11, 5), referrer=None))
+        self.assertEqual(self.tracker.series('foo', 'hour'),
+                [(datetime(2017, 5, 19, 10), 1),
+                 (datetime(2017, 5, 19, 11), 1)])
+
+    def test_daily_series_sums_referrers(self):
+        self.tracker.add('foo', self.access_sample)
+        self.tracker.add('foo', self.access_sample._replace(referrer=None))
+        self.assertEqual(self.tracker.series('foo', 'day'),
+                [(datetime(2017, 5, 19), 2)])
+
+    def test_series_range(self):
+        self.tracker.add('foo', self.access_sample)
+        self.tracker.add('foo', self.access_sample._replace(
+                utctime=datetime(2017, 5, 20, 9)))
+        self.assertEqual(self.tracker.series('foo', 'day',
+                start=datetime(2017, 5, 20)), [(datetime(2017, 5, 20), 1)])
+        self.assertEqual(self.tracker.series('foo', 'day',
+                end=datetime(2017, 5, 20)), [(datetime(2017, 5, 19), 1)])
+
+    def test_unknown_granularity(self):
+        self.assertRaises(ValueError,
+                lambda: self.tracker.series('foo', 'minute'))
+
+    def test_get_is_not_supported(self):
+        self.assertRaises(trackers.AccessesNotKept,
+                lambda: self.tracker.get('foo'))
+
+    def test_get_is_not_supported_when_buffered(self):
+        tracker = trackers.BufferedTracker(self.tracker)
+        self.assertRaises(trackers.AccessesNotKept,
+                lambda: tracker.get('foo'))
+        tracker.close()
+
+
+class BulkWriteCollectionStub:
+    """Coleção cuja atualização do contador de índice `failed_index` falha.
+    """
+    def __init__(self, failed_index):
+        self.failed_index = failed_index
+
+    def bulk_write(self, requests, ordered=True):
+        import pymongo
+        raise pymongo.errors.BulkWriteError({
+            'writeErrors': [{'index': self.failed_index, 'code': 2,
+                             'errmsg': 'failed'}],
+            'nUpserted': len(requests) - 1, 'nModified': 0})
+
+
+class MongoDBAggregatingPartialFailureTests(unittest.TestCase):
+    def setUp(self):
+        self.access_sample = trackers.Access(
+                utctime=datetime(2017, 5, 19, 10, 30), referrer=None)
+
+    def test_accesses_of_other_refs_are_counted(self):
+        # os contadores de `foo` são os três primeiros.
+        tracker = trackers.MongoDBAggregatingTracker(
+                BulkWriteCollectionStub(failed_index=1))
+        count = tracker.add_many([('foo', self.access_sample),
+                                  ('bar', self.access_sample),
+                                  ('bar', self.access_sample),
+                                  ('foo', self.access_sample)])
+        self.assertEqual(count, 2)
+
+
 @unittest.skipUnless(IS_RUNNING_ON_TRAVISCI, 'requires travis-ci')
 class MongoDBTests(unittest.TestCase):
     """Testes de integração executados apenas no Travis-CI.
@@ -45,6 +241,7 @@ class MongoDBTests(unittest.TestCase):
         import pymongo
         self.client = pymongo.MongoClient('127.0.0.1', 27017)
         self.collection = self.client['nurl_tests']['accesses']
+        manage.create_indexes([(self.collection, mongodb.TRACKER_INDEXES)])
         self.tracker = trackers.MongoDBTracker(self.collection)
         self.access_sample = trackers.Access(utctime='20170519',
                 referrer='sample.com')
@@ -73,3 +270,45 @@ class MongoDBTests(unittest.TestCase):
         accesses = list(self.tracker.get('unknown'))
         self.assertEqual(accesses, [])
 
+    def test_add_many(self):
+        count = self.tracker.add_many([('foo', self.access_sample),
+                                       ('bar', self.access_sample)])
+        self.assertEqual(count, 2)
+        self.assertEqual(list(self.tracker.get('foo')), [self.access_sample])
+
+
+@unittest.skipUnless(IS_RUNNING_ON_TRAVISCI, 'requires travis-ci')
+class MongoDBAggregatingTests(unittest.TestCase):
+    """Testes de integração executados apenas no Travis-CI.
+    """
+    def setUp(self):
+        import pymongo
+        self.client = pymongo.MongoClient('127.0.0.1', 27017)
+        self.collection = self.client['nurl_tests']['access_counters']
+        manage.create_indexes([(self.collection, mongodb.COUNTERS_INDEXES)])
+        self.tracker = trackers.MongoDBAggregatingTracker(self.collection,
+                by_referrer=True)
+        self.access_sample = trackers.Access(
+                utctime=datetime(2017, 5, 19, 10, 30),
+                referrer='http://sample.com/page')
+
+    def tearDown(self):
+        self.client.drop_database('nurl_tests')
+
+    def test_totals(self):
+        self.tracker.add('foo', self.access_sample)
+        self.tracker.add('foo', self.access_sample)
+        self.assertEqual(self.tracker.totals('foo'),
+                {'total': 2, 'referrers': {'sample.com': 2}})
+
+    def test_add_many(self):
+        count = self.tracker.add_many([('foo', self.access_sample),
+                                       ('bar', self.access_sample)])
+        self.assertEqual(count, 2)
+        self.assertEqual(self.tracker.totals('bar')['total'], 1)
+
+    def test_daily_series_sums_referrers(self):
+        self.tracker.add('foo', self.access_sample)
+        self.tracker.add('foo', self.access_sample._replace(referrer=None))
+        self.assertEqual(self.tracker.series('foo', 'day'),
+                [(datetime(2017, 5, 19), 2)])
@@ -1,19 +1,24 @@
 import unittest
+from unittest import mock
 
 from pyramid import testing
+from pyramid import httpexceptions
+from webob.multidict import MultiDict
 
 from nurl import (
         shortener,
         trackers,
         datastores,
         base28,
+        metrics,
         )
-from nurl.webapp import views
+from nurl.webapp import views, RedirectDispatcher, get_css_paths
 
 
 class WebassetsStub(object):
     def urls(self):
-        return ['/static/styles.css']
+        return ['http://example.com/static/bundle.min.css?650942cc',
+                'http://example.com/static/styles.css']
 
 
 class ViewTests(unittest.TestCase):
@@ -21,7 +26,6 @@ class ViewTests(unittest.TestCase):
     Tests the HTTP API
     """
     def setUp(self):
-        webassets_env = {'css':WebassetsStub()}
         tracker = trackers.InMemoryTracker()
         nurl = shortener.Nurl(datastores.InMemoryDataStore(), 
                               lambda: base28.igenerate_id(6),
@@ -29,11 +33,193 @@ class ViewTests(unittest.TestCase):
                               tracker=tracker)
         self.request = testing.DummyRequest(nurl=nurl,
                                             tracker=tracker,
-                                            webassets_env=webassets_env,
                                             referrer='',
                                             user_agent='')
-        self.config = testing.setUp(request=self.request)
+        self.config = testing.setUp(request=self.request,
+                settings={'nurl.batch.max_size': 3,
+                          'nurl.redirect.status': 301,
+                          'nurl.redirect.cache_control': 'public, max-age=60'})
+        self.config.add_route('shortened', '/{short_ref}')
 
     def tearDown(self):
         testing.tearDown()
 
+    def test_batch_shortener(self):
+        self.request.json_body = {'urls': ['http://www.scielo.br', 'scielo']}
+        with mock.patch.object(shortener.URLChecker, 'ping',
+                return_value=True):
+            response = views.batch_url_shortener(self.request)
+
+        results = response['results']
+        self.assertTrue(results[0]['short_url'].startswith('http://example.com/'))
+        self.assertEqual(results[0]['url'], 'http://www.scielo.br')
+        self.assertEqual(results[1], {'url': 'scielo', 'error': 'invalid_url'})
+
+    def test_batch_shortener_requires_a_list_of_urls(self):
+        self.request.json_body = {'urls': 'http://www.scielo.br'}
+        self.assertRaises(httpexceptions.HTTPBadRequest,
+                lambda: views.batch_url_shortener(self.request))
+
+    def test_batch_shortener_limits_the_batch_size(self):
+        self.request.json_body = {'urls': ['http://www.scielo.br'] * 4}
+        self.assertRaises(httpexceptions.HTTPBadRequest,
+                lambda: views.batch_url_shortener(self.request))
+
+    def test_batch_resolver_with_query_params(self):
+        self.request.nurl.store['4kgjc'] = 'http://www.scielo.br'
+        self.request.params = MultiDict([('ref', '4kgjc'), ('ref', 'xxxxx')])
+        response = views.batch_short_ref_resolver(self.request)
+        self.assertEqual(response, {'urls': {'4kgjc': 'http://www.scielo.br'},
+                                    'missing': ['xxxxx']})
+        self.assertEqual(self.request.tracker.data, {})
+
+    def test_batch_resolver_with_json_payload(self):
+        self.request.nurl.store['4kgjc'] = 'http://www.scielo.br'
+        self.request.method = 'POST'
+        self.request.json_body = {'refs': ['4kgjc'], 'track': True}
+        response = views.batch_short_ref_resolver(self.request)
+        self.assertEqual(response['urls'], {'4kgjc': 'http://www.scielo.br'})
+        self.assertEqual(len(self.request.tracker.data['4kgjc']), 1)
+
+    def test_batch_resolver_requires_refs(self):
+        self.request.params = MultiDict()
+        self.assertRaises(httpexceptions.HTTPBadRequest,
+                lambda: views.batch_short_ref_resolver(self.request))
+
+    def test_stats(self):
+        response = views.stats(self.request)
+        self.assertIn('collisions', response['shortener'])
+        self.assertNotIn('store', response)
+
+    def test_redirect(self):
+        self.request.nurl.store['4kgjc'] = 'http://www.scielo.br'
+        self.request.matchdict = {'short_ref': '4kgjc'}
+        with self.assertRaises(httpexceptions.HTTPMovedPermanently) as cm:
+            views.short_ref_resolver(self.request)
+        self.assertEqual(cm.exception.location, 'http://www.scielo.br')
+        self.assertEqual(cm.exception.headers['Cache-Control'],
+                'public, max-age=60')
+
+    def test_temporary_redirect(self):
+        self.request.nurl.store['4kgjc'] = 'http://www.scielo.br'
+        self.request.matchdict = {'short_ref': '4kgjc'}
+        self.config.registry.settings.update({'nurl.redirect.status': 302,
+            'nurl.redirect.cache_control': 'no-cache'})
+        with self.assertRaises(httpexceptions.HTTPFound) as cm:
+            views.short_ref_resolver(self.request)
+        self.assertEqual(cm.exception.headers['Cache-Control'], 'no-cache')
+
+    def test_metrics(self):
+        instrumentation = metrics.Instrumentation(metrics.Registry())
+        instrumentation.observe_request('home', 200, 0.01)
+        self.config.registry.settings['nurl.instrumentation'] = instrumentation
+        response = views.metrics_exposition(self.request)
+        self.assertEqual(response.content_type, 'text/plain')
+        self.assertIn('nurl_http_responses_total{route="home",status="200"} 1',
+                response.text)
+
+    def test_metrics_are_not_found_when_disabled(self):
+        self.assertRaises(httpexceptions.HTTPNotFound,
+                lambda: views.metrics_exposition(self.request))
+
+
+class RedirectDispatcherTests(unittest.TestCase):
+    def setUp(self):
+        self.tracker = trackers.InMemoryTracker()
+        self.nurl = shortener.Nurl(
+                datastores.InMemoryDataStore({'4kgjc': 'http://www.scielo.br/ç'}),
+                lambda: base28.igenerate_id(6), tracker=self.tracker)
+        self.app = mock.MagicMock(return_value=[b'pyramid'])
+        self.dispatcher = RedirectDispatcher(self.app, self.nurl)
+
+    def call(self, path, method='GET'):
+        environ = {'REQUEST_METHOD': method, 'PATH_INFO': path,
+                   'HTTP_REFERER': 'http://a.org/'}
+        start_response = mock.MagicMock()
+        body = self.dispatcher(environ, start_response)
+        return body, start_response
+
+    def test_existing_refs_are_redirected(self):
+        body, start_response = self.call('/4kgjc')
+        status, headers = start_response.call_args[0]
+        self.assertEqual(status, '301 Moved Permanently')
+        self.assertIn(('Location', 'http://www.scielo.br/%C3%A7'), headers)
+        self.app.assert_not_called()
+
+    def test_accesses_are_tracked(self):
+        self.call('/4kgjc')
+        accesses = list(self.tracker.get('4kgjc'))
+        self.assertEqual(len(accesses), 1)
+        self.assertEqual(accesses[0].referrer, 'http://a.org/')
+
+    def test_head_requests_are_redirected(self):
+        self.call('/4kgjc', method='HEAD')
+        self.app.assert_not_called()
+
+    def test_missing_refs_are_not_found(self):
+        body, start_response = self.call('/5fv7w')
+        status, headers = start_response.call_args[0]
+        self.assertEqual(status, '404 Not Found')
+        self.assertEqual(body, [b'404 Not Found'])
+        self.app.assert_not_called()
+
+    def test_missing_refs_are_looked_up_once(self):
+        lookups = []
+
+        class CountingStore(datastores.InMemoryDataStore):
+            def __getitem__(self, key):
+                lookups.append(key)
+                return super().__getitem__(key)
+
+        self.nurl.store = CountingStore()
+        self.call('/5fv7w')
+        self.assertEqual(lookups, ['5fv7w'])
+
+    def test_head_requests_to_missing_refs(self):
+        body, start_response = self.call('/5fv7w', method='HEAD')
+        self.assertEqual(start_response.call_args[0][0], '404 Not Found')
+        self.assertEqual(body, [b''])
+
+    def test_other_paths_are_passed_to_the_app(self):
+        for path in ('/', '/api/v1/shorten', '/static/styles.css',
+                     '/favicon.ico'):
+            body, _ = self.call(path)
+            self.assertEqual(body, [b'pyramid'])
+
+    def test_cache_control(self):
+        self.dispatcher = RedirectDispatcher(self.app, self.nurl,
+                cache_control='public, max-age=60, immutable')
+        _, start_response = self.call('/4kgjc')
+        status, headers = start_response.call_args[0]
+        self.assertIn(('Cache-Control', 'public, max-age=60, immutable'),
+                headers)
+
+    def test_temporary_redirects(self):
+        self.dispatcher = RedirectDispatcher(self.app, self.nurl, status=302,
+                cache_control='no-cache')
+        _, start_response = self.call('/4kgjc')
+        status, headers = start_response.call_args[0]
+        self.assertEqual(status, '302 Found')
+        self.assertIn(('Cache-Control', 'no-cache'), headers)
+
+    def test_other_methods_are_passed_to_the_app(self):
+        body, _ = self.call('/4kgjc', method='POST')
+        self.assertEqual(body, [b'pyramid'])
+
+    def test_redirects_are_measured(self):
+        instrumentation = metrics.Instrumentation(metrics.Registry())
+        self.dispatcher = RedirectDispatcher(self.app, self.nurl,
+                instrumentation=instrumentation)
+        self.call('/4kgjc')
+        self.call('/5fv7w')
+        exposition = instrumentation.registry.exposition()
+        self.assertIn('nurl_http_responses_total{route="shortened",'
+                'status="301"} 1', exposition)
+        self.assertIn('nurl_http_responses_total{route="shortened",'
+                'status="404"} 1', exposition)
+
+
+class CSSPathsTests(unittest.TestCase):
+    def test_paths_are_relative(self):
+        self.assertEqual(get_css_paths({'css': WebassetsStub()}),
+                ['/static/bundle.min.css?650942cc', '/static/styles.css'])
@@ -0,0 +1,99 @@
+import os
+import unittest
+import tempfile
+
+from nurl import whitelists
+
+
+class HostnameWhitelistTests(unittest.TestCase):
+    def setUp(self):
+        self.whitelist = whitelists.HostnameWhitelist(['www.scielo.br',
+                                                       '*.scielo.org',
+                                                       'scielo.org',
+                                                       'périódicos.br'])
+
+    def test_exact_rules(self):
+        self.assertIn('www.scielo.br', self.whitelist)
+        self.assertNotIn('scielo.br', self.whitelist)
+        self.assertNotIn('a.www.scielo.br', self.whitelist)
+
+    def test_wildcard_rules(self):
+        self.assertIn('www.scielo.org', self.whitelist)
+        self.assertIn('a.b.scielo.org', self.whitelist)
+        self.assertNotIn('scielo.org.ar', self.whitelist)
+        self.assertNotIn('notscielo.org', self.whitelist)
+
+    def test_wildcards_do_not_match_the_domain_itself(self):
+        whitelist = whitelists.HostnameWhitelist(['*.scielo.org'])
+        self.assertNotIn('scielo.org', whitelist)
+
+    def test_hostnames_are_normalized(self):
+        self.assertIn('WWW.SciELO.br.', self.whitelist)
+        self.assertIn('xn--pridicos-b1a6h.br', self.whitelist)
+        self.assertIn('PÉRIÓDICOS.br', self.whitelist)
+
+    def test_missing_hostname(self):
+        self.assertNotIn(None, self.whitelist)
+        self.assertNotIn('', self.whitelist)
+
+    def test_invalid_rule(self):
+        self.assertRaises(ValueError,
+                lambda: whitelists.HostnameWhitelist(['*.']))
+
+    def test_iter(self):
+        self.assertEqual(list(self.whitelist), ['*.scielo.org', 'scielo.org',
+                'www.scielo.br', 'xn--pridicos-b1a6h.br'])
+
+
+class ParseRulesTests(unittest.TestCase):
+    def test_auto_www(self):
+        rules = list(whitelists.parse_rules(['scielo.br\n', '\n',
+                                             '# comentário\n',
+                                             '*.scielo.org\n',
+                                             'www.scielo.cl  # chile\n'],
+                                            auto_www=True))
+        self.assertEqual(rules, ['scielo.br', 'www.scielo.br',
+                                 '*.scielo.org', 'www.scielo.cl'])
+
+
+class WhitelistFileTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'whitelist.txt')
+        self.write('scielo.br\n')
+        self.now = [0]
+        self.whitelist = whitelists.WhitelistFile(self.path, auto_www=True,
+                reload_interval=5, clock=lambda: self.now[0])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, content):
+        with open(self.path, 'w') as f:
+            f.write(content)
+
+    def test_rules_are_loaded(self):
+        self.assertIn('www.scielo.br', self.whitelist)
+        self.assertNotIn('www.scielo.org', self.whitelist)
+
+    def test_changes_are_reloaded(self):
+        self.write('scielo.br\n*.scielo.org\n')
+        self.assertNotIn('www.scielo.org', self.whitelist)
+        self.now[0] = 6
+        self.assertIn('www.scielo.org', self.whitelist)
+
+    def test_invalid_changes_are_ignored(self):
+        self.write('scielo.br\n*.\n')
+        self.now[0] = 6
+        self.assertIn('www.scielo.br', self.whitelist)
+
+    def test_reload_can_be_disabled(self):
+        whitelist = whitelists.WhitelistFile(self.path, reload_interval=0,
+                clock=lambda: self.now[0])
+        self.write('scielo.org\n')
+        self.now[0] = 60
+        self.assertIn('scielo.br', whitelist)
+
+
+if __name__ == '__main__':
+    unittest.main()